@@ -1,6 +1,10 @@
+import logging
 import os
+import threading
+from contextlib import contextmanager
 
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,8 +17,6 @@ conn_params_brno = {
     "password": os.getenv("POSTGRES_PASSWORD_BRNO")
 }
 
-CONN_BRNO = psycopg2.connect(**conn_params_brno)
-
 
 conn_params_jmk = {
     "host": 'localhost',
@@ -24,8 +26,6 @@ conn_params_jmk = {
     "password": os.getenv("POSTGRES_PASSWORD_JMK")
 }
 
-CONN_JMK = psycopg2.connect(**conn_params_jmk)
-
 
 conn_params_most = {
     "host": 'localhost',
@@ -35,8 +35,6 @@ conn_params_most = {
     "password": os.getenv("POSTGRES_PASSWORD_ORP_MOST")
 }
 
-CONN_ORP_MOST = psycopg2.connect(**conn_params_most)
-
 
 conn_params_central = {
     "host": 'localhost',
@@ -46,4 +44,196 @@ conn_params_central = {
     "password": os.getenv("POSTGRES_PASSWORD_CENTRAL")
 }
 
-CONN_CENTRAL = psycopg2.connect(**conn_params_central)
\ No newline at end of file
+# Nothing is connected at import time. Scripts get connections from the registry:
+#     with connection("brno") as conn: ...
+# Region databases are taken from the data_sources table of the central DB, the parameters
+# above are used for the central DB and as a fallback when it is not reachable.
+STATIC_PARAMS = {
+    "central": conn_params_central,
+    "brno": conn_params_brno,
+    "jmk": conn_params_jmk,
+    "orp_most": conn_params_most,
+}
+
+# "external" = scripts on the docker host (localhost + db_port_external),
+# "internal" = scripts inside the docker network (db_host + db_port_internal)
+DATA_SOURCES_NETWORK = os.getenv("DATA_SOURCES_NETWORK", "external")
+DATA_SOURCES_HOST = os.getenv("DATA_SOURCES_HOST", "localhost")
+
+DATA_SOURCES_TIMEOUT = 5
+
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 4
+
+GET_DATA_SOURCES = """
+    SELECT name, db_host, db_port_external, db_port_internal, db_name, db_user, db_password
+    FROM data_sources
+    WHERE active = TRUE
+    ORDER BY id;
+"""
+
+# Old module level connections, opened on first access (see __getattr__)
+LEGACY_CONNECTIONS = {
+    "CONN_CENTRAL": "central",
+    "CONN_BRNO": "brno",
+    "CONN_JMK": "jmk",
+    "CONN_ORP_MOST": "orp_most",
+}
+
+
+def is_healthy(conn):
+    """
+    Checks that a pooled connection still works (e.g. the DB container was not restarted).
+    """
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+
+class ConnectionRegistry:
+    """
+    Lazily created connection pools, one per database name (data_sources.name or "central").
+    """
+
+    def __init__(self, static_params=None, min_conn=POOL_MIN_CONN, max_conn=POOL_MAX_CONN):
+        self.static_params = dict(STATIC_PARAMS if static_params is None else static_params)
+        self.min_conn = min_conn
+        self.max_conn = max_conn
+        self.sources = None
+        self.pools = {}
+        self.legacy = {}
+        self.lock = threading.Lock()
+
+    def load_data_sources(self):
+        """
+        Reads region databases from data_sources in the central DB.
+
+        @return: dictionary name -> connection parameters
+        """
+        conn = psycopg2.connect(**self.static_params["central"], connect_timeout=DATA_SOURCES_TIMEOUT)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(GET_DATA_SOURCES)
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+
+        sources = {}
+        for name, db_host, port_external, port_internal, db_name, db_user, db_password in rows:
+            internal = DATA_SOURCES_NETWORK == "internal"
+            sources[name] = {
+                "host": db_host if internal else DATA_SOURCES_HOST,
+                "port": port_internal if internal else port_external,
+                "dbname": db_name,
+                "user": db_user,
+                "password": db_password,
+            }
+        return sources
+
+    def refresh(self):
+        """
+        Forgets the loaded data_sources, they are read again on the next request (existing pools stay).
+        """
+        with self.lock:
+            self.sources = None
+
+    def region_names(self):
+        """
+        @return: names of all known region databases (without "central")
+        """
+        return [name for name in self.params_by_name() if name != "central"]
+
+    def params_by_name(self):
+        with self.lock:
+            if self.sources is None:
+                try:
+                    self.sources = self.load_data_sources()
+                except psycopg2.Error as e:
+                    logging.warning(f"data_sources not available ({e}), using static connection parameters")
+                    self.sources = {}
+            params = dict(self.static_params)
+            params.update(self.sources)
+            params["central"] = self.static_params["central"]
+            return params
+
+    def params(self, name):
+        params = self.params_by_name()
+        if name not in params:
+            raise KeyError(f"Unknown database '{name}', known: {', '.join(params)}")
+        return params[name]
+
+    def pool(self, name):
+        params = self.params(name)
+        with self.lock:
+            if name not in self.pools:
+                self.pools[name] = ThreadedConnectionPool(self.min_conn, self.max_conn, **params)
+            return self.pools[name]
+
+    @contextmanager
+    def connection(self, name):
+        """
+        Lends a checked connection of the pool, broken connections are replaced by new ones.
+
+        On an exception the transaction is rolled back (a connection broken by a DB restart is
+        dropped from the pool) and the exception is re-raised.
+        """
+        pool = self.pool(name)
+        conn = pool.getconn()
+        for _ in range(self.max_conn):
+            if is_healthy(conn):
+                break
+            logging.warning(f"Connection to '{name}' is broken, reconnecting")
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+                broken = False
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+            pool.putconn(conn, close=broken or bool(conn.closed))
+            raise
+        else:
+            pool.putconn(conn)
+
+    def legacy_connection(self, name):
+        with self.lock:
+            conn = self.legacy.get(name)
+            if conn is None or conn.closed:
+                conn = self.legacy[name] = psycopg2.connect(**self.static_params[name])
+            return conn
+
+    def close_all(self):
+        with self.lock:
+            for pool in self.pools.values():
+                pool.closeall()
+            self.pools.clear()
+            for conn in self.legacy.values():
+                conn.close()
+            self.legacy.clear()
+
+
+registry = ConnectionRegistry()
+
+
+def connection(name):
+    """
+    with connection("brno") as conn: ...
+    """
+    return registry.connection(name)
+
+
+def __getattr__(attr):
+    # CONN_BRNO, CONN_JMK, ... used by the older scripts are connected only when imported
+    if attr in LEGACY_CONNECTIONS:
+        return registry.legacy_connection(LEGACY_CONNECTIONS[attr])
+    raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
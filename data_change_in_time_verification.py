@@ -2,9 +2,21 @@ import json
 import glob
 import os
 
+from snapshot_archive import iter_archive, TIMESTAMP_FORMAT
+from snapshot_delta import iter_delta_archive
+
 # Folder where JSON files are located
 json_folder = "./data_JMK/"  # <-- change to your folder
 
+# Or read from a compressed archive written by `downloader.py --archive` (set to None to use json_folder)
+archive_folder = None  # e.g. "./archive/"
+# Or replay a delta archive written by `downloader.py --delta` (set to None to use json_folder)
+delta_archive_folder = None  # e.g. "./archive_delta/"
+archive_key = "JMK"
+# Optional time range for the archive, e.g. datetime(2025, 3, 19, 18, 0)
+time_from = None
+time_to = None
+
 # Attributes to track
 tracked_alert_fields = [
     "country", "city", "reportRating", "confidence", "reliability",
@@ -20,15 +32,34 @@ tracked_jam_fields = [
 previous_alerts = {}
 previous_jams = {}
 
-# Get files in order (assuming file names include time info or order properly)
-json_files = sorted(glob.glob(os.path.join(json_folder, "*.json")))
 
-for file_path in json_files:
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def iter_json_files(folder):
+    # Get files in order (assuming file names include time info or order properly)
+    for file_path in sorted(glob.glob(os.path.join(folder, "*.json"))):
+        with open(file_path, "r", encoding="utf-8") as f:
+            yield os.path.basename(file_path), json.load(f)
+
+
+def iter_archived(folder, key, start, end):
+    # only the snapshots in [start, end] are decompressed
+    for ts, data in iter_archive(folder, key, start, end):
+        yield ts.strftime(TIMESTAMP_FORMAT), data
+
+
+def iter_delta_archived(folder, key, start, end):
+    # snapshots are rebuilt from the last keyframe before `start`
+    for ts, data in iter_delta_archive(folder, key, start, end):
+        yield ts.strftime(TIMESTAMP_FORMAT), data
+
 
-    timestamp = os.path.basename(file_path)
+if delta_archive_folder:
+    snapshots = iter_delta_archived(delta_archive_folder, archive_key, time_from, time_to)
+elif archive_folder:
+    snapshots = iter_archived(archive_folder, archive_key, time_from, time_to)
+else:
+    snapshots = iter_json_files(json_folder)
 
+for timestamp, data in snapshots:
     # ---- Alerts ----
     for alert in data.get("alerts", []):
         uuid = alert["uuid"]
@@ -0,0 +1,132 @@
+"""
+Benchmark: size and query time of the jams hypertable before and after native compression.
+
+A synthetic jams table (by default 90 days of ~10 000 jams per day, as in JMK) is generated by
+the DB into a scratch schema, measured, compressed with the settings of storage_policies.py
+and measured again. The scratch schema is dropped at the end, production data is never touched.
+
+Usage (project root on PYTHONPATH):
+    python benchmark_compression.py --db brno --days 90 --rows-per-day 10000
+"""
+import argparse
+import statistics
+import time
+
+from connection_to_db import connection
+from storage_policies import STORAGE_POLICIES, COMPRESS_AFTER, DEFAULT_CHUNK_INTERVAL
+
+SCHEMA = "bench_compression"
+REPEATS = 5
+STREETS = 500
+
+FILL_JAMS = """
+INSERT INTO jams (id, uuid, city, street, road_type, jam_level_max, jam_level_avg, speed_kmh_min, speed_kmh_avg,
+                  jam_length_max, jam_length_avg, speed_max, speed_avg, delay_max, delay_avg, update_count,
+                  jam_line, published_at, last_updated, active)
+SELECT i, i, 'Brno', 'Ulica ' || (i %% %(streets)s), 1 + i %% 7,
+       1 + i %% 5, 1 + (i %% 5) * random(),
+       (random() * 30)::INTEGER, 10 + random() * 30,
+       (random() * 2000)::INTEGER, random() * 2000,
+       random() * 15, random() * 10,
+       (random() * 600)::INTEGER, random() * 600,
+       1 + (random() * 20)::INTEGER,
+       ST_MakeLine(ST_MakePoint(16.5 + random() * 0.2, 49.1 + random() * 0.2),
+                   ST_MakePoint(16.5 + random() * 0.2, 49.1 + random() * 0.2))::geography,
+       t, t + random() * INTERVAL '1 hour', FALSE
+FROM generate_series(1, %(rows)s) AS i,
+     LATERAL (SELECT now() - %(days)s * INTERVAL '1 day' + i * (%(days)s * INTERVAL '1 day' / %(rows)s) AS t) ts
+"""
+
+# Typické dotazy dashboardu nad raw jamami
+QUERIES = {
+    "ulice_30_dni": """
+        SELECT street, count(*), avg(speed_kmh_avg), max(jam_level_max)
+        FROM jams WHERE published_at >= now() - INTERVAL '30 days'
+        GROUP BY street
+    """,
+    "jedna_ulica_60_dni": """
+        SELECT published_at, jam_level_max, delay_max
+        FROM jams WHERE street = 'Ulica 42' AND published_at >= now() - INTERVAL '60 days'
+    """,
+    "denne_spolu": """
+        SELECT time_bucket(INTERVAL '1 day', published_at), count(*), avg(delay_avg)
+        FROM jams GROUP BY 1
+    """,
+}
+
+
+def create_scratch_table(cur, days, rows_per_day):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"CREATE TABLE {SCHEMA}.jams (LIKE public.jams INCLUDING ALL)")
+    cur.execute(f"SET search_path TO {SCHEMA}, public")
+    cur.execute("SELECT create_hypertable('jams', 'published_at', chunk_time_interval => %s)",
+                (DEFAULT_CHUNK_INTERVAL,))
+    cur.execute(FILL_JAMS, {"rows": days * rows_per_day, "days": days, "streets": STREETS})
+    cur.execute("ANALYZE jams")
+
+
+def measure(cur):
+    """
+    @return: (size in bytes, dictionary query -> median time in ms)
+    """
+    cur.execute("SELECT hypertable_size('jams')")
+    size = cur.fetchone()[0]
+    timings = {}
+    for name, query in QUERIES.items():
+        runs = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            cur.execute(query)
+            cur.fetchall()
+            runs.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(runs)
+    return size, timings
+
+
+def compress(cur):
+    policy = STORAGE_POLICIES["jams"]
+    cur.execute(f"ALTER TABLE jams SET (timescaledb.compress, "
+                f"timescaledb.compress_segmentby = '{policy['segment_by']}', "
+                f"timescaledb.compress_orderby = '{policy['order_by']}')")
+    cur.execute("SELECT count(compress_chunk(c)) FROM show_chunks('jams', older_than => %s) c", (COMPRESS_AFTER,))
+    compressed = cur.fetchone()[0]
+    cur.execute("SELECT count(*) FROM show_chunks('jams')")
+    return compressed, cur.fetchone()[0]
+
+
+def main(db, days, rows_per_day):
+    with connection(db) as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                start = time.perf_counter()
+                create_scratch_table(cur, days, rows_per_day)
+                print(f"{days * rows_per_day} syntetických jamov ({days} dní) za {time.perf_counter() - start:.1f}s")
+
+                size_before, before = measure(cur)
+                start = time.perf_counter()
+                compressed, chunks = compress(cur)
+                print(f"skomprimovaných {compressed}/{chunks} chunkov za {time.perf_counter() - start:.1f}s")
+                size_after, after = measure(cur)
+
+                cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+                cur.execute("SET search_path TO public")
+        finally:
+            conn.autocommit = False
+
+    print(f"{'':<24}{'pred':>12}{'po':>12}{'pomer':>10}")
+    print(f"{'veľkosť':<24}{size_before / 1024 ** 2:>10.1f}MB{size_after / 1024 ** 2:>10.1f}MB"
+          f"{size_before / size_after:>9.1f}x")
+    for name in QUERIES:
+        print(f"{name:<24}{before[name]:>10.1f}ms{after[name]:>10.1f}ms{before[name] / after[name]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Veľkosť a rýchlosť dotazov jams pred a po kompresii")
+    parser.add_argument("--db", default="brno")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--rows-per-day", type=int, default=10000)
+    args = parser.parse_args()
+
+    main(args.db, args.days, args.rows_per_day)
@@ -0,0 +1,187 @@
+"""
+Benchmark: p50 / p95 latency of the dashboard queries over jams and alerts before and after the
+query indexes of migrate_query_indexes.sql.
+
+Synthetic jams and alerts are generated by the DB into a scratch schema with only the indexes the
+tables had before (primary key, GIST, partial indexes on active), every query is run REPEATS times,
+then the migration is applied to the scratch tables and the queries are run again. The scratch
+schema is dropped at the end, production data is never touched.
+
+Usage (project root on PYTHONPATH):
+    python benchmark_queries.py --db brno --days 30 --rows-per-day 10000
+"""
+import argparse
+import os
+import statistics
+import time
+
+from connection_to_db import connection
+from storage_policies import DEFAULT_CHUNK_INTERVAL
+
+SCHEMA = "bench_queries"
+REPEATS = 30
+STREETS = 500
+MIGRATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrate_query_indexes.sql")
+
+# Indexy tabuliek pred migráciou (init.sql bez indexov dashboardu)
+BASELINE_INDEXES = [
+    "ALTER TABLE jams ADD PRIMARY KEY (uuid, published_at)",
+    "ALTER TABLE alerts ADD PRIMARY KEY (uuid, published_at)",
+    "CREATE INDEX idx_jams_jam_line ON jams USING GIST(jam_line)",
+    "CREATE INDEX idx_alerts_location ON alerts USING GIST(location)",
+    "CREATE INDEX idx_jams_active ON jams (last_updated, uuid) WHERE active",
+    "CREATE INDEX idx_alerts_active ON alerts (last_updated, uuid) WHERE active",
+]
+
+# Jamy sú rovnomerne rozložené v čase, aktívne sú iba tie z poslednej hodiny
+FILL_JAMS = """
+INSERT INTO jams (id, uuid, city, street, road_type, jam_level_max, jam_level_avg, speed_kmh_min, speed_kmh_avg,
+                  jam_length_max, jam_length_avg, delay_max, delay_avg, update_count,
+                  jam_line, published_at, last_updated, active)
+SELECT i, i, 'Brno', 'Ulica ' || (i %% %(streets)s), 1 + i %% 7,
+       1 + i %% 5, 1 + (i %% 5) * random(),
+       (random() * 30)::INTEGER, 10 + random() * 30,
+       (random() * 2000)::INTEGER, random() * 2000,
+       (random() * 600)::INTEGER, random() * 600,
+       1 + (random() * 20)::INTEGER,
+       ST_MakeLine(ST_MakePoint(16.5 + random() * 0.2, 49.1 + random() * 0.2),
+                   ST_MakePoint(16.5 + random() * 0.2, 49.1 + random() * 0.2))::geography,
+       t, t + random() * INTERVAL '1 hour', t >= now() - INTERVAL '1 hour'
+FROM generate_series(1, %(rows)s) AS i,
+     LATERAL (SELECT now() - %(days)s * INTERVAL '1 day' + i * (%(days)s * INTERVAL '1 day' / %(rows)s) AS t) ts
+"""
+
+FILL_ALERTS = """
+INSERT INTO alerts (uuid, country, city, type, subtype, street, road_type, reliability, confidence,
+                    location, published_at, last_updated, active)
+SELECT md5(i::TEXT)::UUID, 'EZ', 'Brno', (ARRAY['JAM', 'HAZARD', 'ACCIDENT', 'ROAD_CLOSED'])[1 + i %% 4],
+       (ARRAY['', 'HAZARD_ON_ROAD', 'ROAD_CLOSED_EVENT'])[1 + (i / 4) %% 3],
+       'Ulica ' || (i %% %(streets)s), 1 + i %% 7, (random() * 10)::INTEGER, (random() * 5)::INTEGER,
+       ST_MakePoint(16.5 + random() * 0.2, 49.1 + random() * 0.2)::geography,
+       t, t + random() * INTERVAL '1 hour', t >= now() - INTERVAL '1 hour'
+FROM generate_series(1, %(rows)s) AS i,
+     LATERAL (SELECT now() - %(days)s * INTERVAL '1 day' + i * (%(days)s * INTERVAL '1 day' / %(rows)s) AS t) ts
+"""
+
+# Typické dotazy dashboardu
+QUERIES = {
+    "jamy_ulica_tyzden": """
+        SELECT published_at, jam_level_max, delay_max
+        FROM jams WHERE street = 'Ulica 42' AND published_at >= now() - INTERVAL '7 days'
+    """,
+    "alerty_ulica_tyzden": """
+        SELECT published_at, type, subtype
+        FROM alerts WHERE street = 'Ulica 42' AND published_at >= now() - INTERVAL '7 days'
+    """,
+    "uzavierky_oblast_dnes": """
+        SELECT uuid, street, published_at
+        FROM alerts
+        WHERE type = 'ROAD_CLOSED' AND published_at >= date_trunc('day', now())
+          AND ST_Intersects(location, ST_MakeEnvelope(16.55, 49.15, 16.6, 49.2, 4326)::geography)
+    """,
+    "aktivne_jamy": """
+        SELECT uuid, street, jam_level_max, delay_max FROM jams WHERE active
+    """,
+    "aktivne_alerty_typy": """
+        SELECT type, count(*) FROM alerts WHERE active GROUP BY type
+    """,
+    "jamy_zmenene_hodina": """
+        SELECT count(*), avg(speed_kmh_avg) FROM jams WHERE last_updated >= now() - INTERVAL '1 hour'
+    """,
+}
+
+
+def migration_statements(path=MIGRATION):
+    """
+    @return: SQL statements of the migration (CREATE INDEX ... transaction_per_chunk must run one by one)
+    """
+    with open(path, encoding="utf-8") as f:
+        sql = "".join(line for line in f if not line.lstrip().startswith("--"))
+    return [statement.strip() for statement in sql.split(";") if statement.strip()]
+
+
+def create_scratch_tables(cur, days, rows_per_day, alerts_per_day):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}, public")
+    for table in ("jams", "alerts"):
+        cur.execute(f"CREATE TABLE {table} (LIKE public.{table} INCLUDING DEFAULTS)")
+        cur.execute("SELECT create_hypertable(%s, 'published_at', chunk_time_interval => %s)",
+                    (table, DEFAULT_CHUNK_INTERVAL))
+    cur.execute(FILL_JAMS, {"rows": days * rows_per_day, "days": days, "streets": STREETS})
+    cur.execute(FILL_ALERTS, {"rows": days * alerts_per_day, "days": days, "streets": STREETS})
+    for statement in BASELINE_INDEXES:
+        cur.execute(statement)
+    cur.execute("ANALYZE jams")
+    cur.execute("ANALYZE alerts")
+
+
+def percentiles(runs):
+    """
+    @return: (p50, p95) of the run times
+    """
+    return statistics.median(runs), statistics.quantiles(runs, n=20, method="inclusive")[18]
+
+
+def measure(cur, repeats):
+    """
+    @return: (index size in bytes, dictionary query -> (p50, p95) in ms)
+    """
+    cur.execute("SELECT sum((hypertable_detailed_size(t)).index_bytes) "
+                "FROM unnest(ARRAY['jams', 'alerts']::REGCLASS[]) t")
+    index_size = cur.fetchone()[0]
+    timings = {}
+    for name, query in QUERIES.items():
+        # prvé spustenie iba zahreje cache
+        cur.execute(query)
+        cur.fetchall()
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            cur.execute(query)
+            cur.fetchall()
+            runs.append((time.perf_counter() - start) * 1000)
+        timings[name] = percentiles(runs)
+    return index_size, timings
+
+
+def main(db, days, rows_per_day, alerts_per_day, repeats):
+    with connection(db) as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                start = time.perf_counter()
+                create_scratch_tables(cur, days, rows_per_day, alerts_per_day)
+                print(f"{days * rows_per_day} jamov a {days * alerts_per_day} alertov ({days} dní) "
+                      f"za {time.perf_counter() - start:.1f}s")
+
+                size_before, before = measure(cur, repeats)
+                start = time.perf_counter()
+                for statement in migration_statements():
+                    cur.execute(statement)
+                print(f"migrácia indexov za {time.perf_counter() - start:.1f}s")
+                size_after, after = measure(cur, repeats)
+
+                cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+                cur.execute("SET search_path TO public")
+        finally:
+            conn.autocommit = False
+
+    print(f"indexy: {size_before / 1024 ** 2:.1f} MB -> {size_after / 1024 ** 2:.1f} MB")
+    print(f"{'':<24}{'p50 pred':>12}{'p95 pred':>12}{'p50 po':>12}{'p95 po':>12}{'p50 pomer':>11}")
+    for name in QUERIES:
+        (p50_before, p95_before), (p50_after, p95_after) = before[name], after[name]
+        print(f"{name:<24}{p50_before:>10.1f}ms{p95_before:>10.1f}ms{p50_after:>10.1f}ms{p95_after:>10.1f}ms"
+              f"{p50_before / p50_after:>10.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="p50 / p95 dotazov dashboardu pred a po indexoch")
+    parser.add_argument("--db", default="brno")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--rows-per-day", type=int, default=10000, help="jamy za deň")
+    parser.add_argument("--alerts-per-day", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    main(args.db, args.days, args.rows_per_day, args.alerts_per_day, args.repeats)
@@ -0,0 +1,135 @@
+import csv
+import os
+import time
+from itertools import islice
+
+from pg_copy import copy_rows
+
+# Počet riadkov CSV v jednej dávke (jeden COPY + jeden commit)
+CHUNK_SIZE = 50000
+
+CREATE_LOAD_PROGRESS = """
+CREATE TABLE IF NOT EXISTS load_progress (
+    source TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    rows_done BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (source, table_name)
+)
+"""
+
+GET_LOAD_PROGRESS = """
+SELECT rows_done FROM load_progress WHERE source = %s AND table_name = %s
+"""
+
+SET_LOAD_PROGRESS = """
+INSERT INTO load_progress (source, table_name, rows_done, updated_at)
+VALUES (%s, %s, %s, now())
+ON CONFLICT (source, table_name) DO UPDATE SET
+    rows_done = EXCLUDED.rows_done,
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def get_rows_done(conn, source, table):
+    with conn.cursor() as cur:
+        cur.execute(CREATE_LOAD_PROGRESS)
+        cur.execute(GET_LOAD_PROGRESS, (source, table))
+        row = cur.fetchone()
+    conn.commit()
+    return row[0] if row else 0
+
+
+def convert_chunk(rows, convert_row, skip_invalid=False):
+    """
+    @param skip_invalid: skip (and report) rows that cannot be converted instead of failing
+    @return: (converted records, number of skipped rows)
+    """
+    if not skip_invalid:
+        return [convert_row(row) for row in rows], 0
+
+    records = []
+    for row in rows:
+        try:
+            records.append(convert_row(row))
+        except Exception as e:
+            print(f"Chyba pri spracovaní riadku:\n{row}\n{e}")
+    return records, len(rows) - len(records)
+
+
+def copy_csv_to_table(csv_path, conn, table, columns, convert_row, conflict_columns,
+                      chunk_size=CHUNK_SIZE, staging_table=None, skip_invalid=False):
+    """
+    Streams a CSV file into a table with COPY FROM STDIN, chunk by chunk.
+
+    Every chunk is COPY-ed into an unlogged staging table and moved to the target table with
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING. The number of processed CSV rows is stored in
+    `load_progress` in the same transaction, so after a crash the load resumes from the last
+    committed chunk.
+
+    A row that cannot be converted fails the load (the chunk is not committed, so the load resumes
+    at it after the CSV is fixed), unless skip_invalid is set; skipped rows are then counted.
+
+    @param csv_path: path to the CSV file (with header)
+    @param conn: psycopg2 connection
+    @param table: target table
+    @param columns: target columns in the order returned by convert_row
+    @param convert_row: function csv.DictReader row -> tuple
+    @param conflict_columns: columns of the ON CONFLICT target
+    @param chunk_size: CSV rows per COPY / commit
+    @param staging_table: name of the unlogged staging table (default <table>_staging)
+    @param skip_invalid: skip rows that cannot be converted instead of raising
+    @return: number of rows inserted into the target table
+    """
+    source = os.path.abspath(csv_path)
+    staging_table = staging_table or f"{table}_staging"
+    column_list = ", ".join(columns)
+    conflict_list = ", ".join(conflict_columns)
+
+    rows_done = get_rows_done(conn, source, table)
+    if rows_done:
+        print(f"Pokračujem v načítaní {csv_path} od riadku {rows_done}")
+
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {staging_table} (LIKE {table} INCLUDING DEFAULTS)")
+    conn.commit()
+
+    inserted_total = 0
+    skipped_total = 0
+    processed = 0
+    start = time.perf_counter()
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for _ in islice(reader, rows_done):
+            pass
+
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                break
+
+            records, skipped = convert_chunk(rows, convert_row, skip_invalid)
+            skipped_total += skipped
+            with conn.cursor() as cur:
+                cur.execute(f"TRUNCATE {staging_table}")
+                copy_rows(cur, staging_table, columns, records)
+                cur.execute(f"""
+                    INSERT INTO {table} ({column_list})
+                    SELECT {column_list} FROM {staging_table}
+                    ON CONFLICT ({conflict_list}) DO NOTHING
+                """)
+                inserted_total += cur.rowcount
+                rows_done += len(rows)
+                processed += len(rows)
+                cur.execute(SET_LOAD_PROGRESS, (source, table, rows_done))
+            conn.commit()
+            print(f"{table}: spracovaných {rows_done} riadkov ({processed / (time.perf_counter() - start):.0f} riadkov/s)")
+
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    conn.commit()
+
+    print(f"{inserted_total} záznamov vložených do '{table}' zo súboru {csv_path}")
+    if skipped_total:
+        print(f"POZOR: {skipped_total} chybných riadkov preskočených")
+    return inserted_total
@@ -84,8 +84,8 @@ CREATE TABLE IF NOT EXISTS segments (
 
 CREATE TABLE IF NOT EXISTS sum_statistics (
     stat_time TIMESTAMPTZ PRIMARY KEY,  -- Rounded to the hour
-    total_active_jams INTEGER,
-    total_active_alerts INTEGER,
+    total_active_jams INTEGER,  -- Jams active at any time during the hour
+    total_active_alerts INTEGER,  -- Alerts active at any time during the hour
     avg_speed_kmh FLOAT,
     avg_jam_length FLOAT,
     avg_delay FLOAT,
@@ -148,7 +148,399 @@ CREATE TABLE IF NOT EXISTS nehody (
 
 SELECT create_hypertable('nehody', 'p2a', if_not_exists => TRUE);
 
+-- Čiastočné indexy iba nad aktívnymi riadkami: deaktivácia (časová aj podľa chýbajúcich ID)
+-- prechádza iba živé udalosti, nie celú históriu všetkých chunkov
+CREATE INDEX IF NOT EXISTS idx_jams_active ON jams (last_updated, uuid) WHERE active;
+CREATE INDEX IF NOT EXISTS idx_alerts_active ON alerts (last_updated, uuid) WHERE active;
+
+-- Každý segment jamu je uložený iba raz (ingester vkladá cez ON CONFLICT DO NOTHING), unikátny
+-- index začína jam_id, takže slúži aj na vyhľadanie segmentov jamu; do existujúcej DB s duplicitami
+-- sa najskôr spustí migrate_segments_unique.sql.
+-- Uzly môžu byť NULL a NULL hodnoty sa v unikátnom indexe nerovnajú (NULLS NOT DISTINCT je až od PG15),
+-- preto index obsahuje COALESCE(..., -1); ON CONFLICT v ingesteri uvádza rovnaké výrazy
+CREATE UNIQUE INDEX IF NOT EXISTS idx_segments_unique
+    ON segments (jam_id, segment_id, COALESCE(from_node, -1), COALESCE(to_node, -1));
+CREATE INDEX IF NOT EXISTS idx_segments_segment_id ON segments (segment_id);
+
+-- Doprava na úsekoch cesty (segment_id + smer) po hodinách, plní ju ingester z každého snapshotu
+-- (ingest_data_waze_live/segment_traffic.py). samples = počet (snapshot, jam) pokrytí segmentu,
+-- priemery sú *_sum / samples, podiel času v zápche = samples / traffic_snapshots.snapshots.
+CREATE TABLE IF NOT EXISTS segment_traffic (
+    segment_id BIGINT NOT NULL,
+    is_forward BOOLEAN NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    samples INTEGER NOT NULL,
+    jam_level_sum FLOAT NOT NULL,
+    speed_kmh_sum FLOAT NOT NULL,
+    delay_sum FLOAT NOT NULL,
+    jam_level_max INTEGER,
+    PRIMARY KEY (segment_id, is_forward, bucket)
+);
+
+SELECT create_hypertable('segment_traffic', 'bucket', chunk_time_interval => INTERVAL '7 days', if_not_exists => TRUE);
+
+-- Počet snapshotov regiónu v každej hodine (aj tých bez zápch)
+CREATE TABLE IF NOT EXISTS traffic_snapshots (
+    bucket TIMESTAMPTZ PRIMARY KEY,
+    snapshots INTEGER NOT NULL
+);
+
+-- Týždenný profil segmentu: deň v týždni (1 = pondelok) a hodina v miestnom čase, za celú históriu;
+-- "ako je segment zapchatý v pondelok o 8:00" je jedno vyhľadanie podľa primárneho kľúča
+CREATE TABLE IF NOT EXISTS segment_weekly_profile (
+    segment_id BIGINT NOT NULL,
+    is_forward BOOLEAN NOT NULL,
+    dow SMALLINT NOT NULL,
+    hour SMALLINT NOT NULL,
+    samples BIGINT NOT NULL,
+    jam_level_sum FLOAT NOT NULL,
+    speed_kmh_sum FLOAT NOT NULL,
+    delay_sum FLOAT NOT NULL,
+    PRIMARY KEY (segment_id, is_forward, dow, hour)
+);
+
+CREATE TABLE IF NOT EXISTS traffic_weekly_snapshots (
+    dow SMALLINT NOT NULL,
+    hour SMALLINT NOT NULL,
+    snapshots BIGINT NOT NULL,
+    PRIMARY KEY (dow, hour)
+);
+
+-- Indexy pre časté dotazy dashboardu (ulica / typ alertu za obdobie, nedávno zmenené udalosti),
+-- do existujúcej DB sa doplnia cez migrate_query_indexes.sql
+CREATE INDEX IF NOT EXISTS idx_jams_street_published ON jams (street, published_at DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_street_published ON alerts (street, published_at DESC);
+CREATE INDEX IF NOT EXISTS idx_alerts_type_published ON alerts (type, subtype, published_at DESC);
+CREATE INDEX IF NOT EXISTS idx_jams_last_updated_brin ON jams USING BRIN (last_updated) WITH (pages_per_range = 32);
+CREATE INDEX IF NOT EXISTS idx_alerts_last_updated_brin ON alerts USING BRIN (last_updated) WITH (pages_per_range = 32);
+
 CREATE INDEX IF NOT EXISTS idx_jams_jam_line ON jams USING GIST(jam_line);
 CREATE INDEX IF NOT EXISTS idx_alerts_location ON alerts USING GIST(location);
 CREATE INDEX IF NOT EXISTS idx_accidents_geom ON nehody USING GIST(geom);
 CREATE INDEX IF NOT EXISTS idx_accidents_geog ON nehody USING GIST(geog);
+
+-- Hodinové a denné súhrny pre dashboardy (continuous aggregates), každá DB je jeden región.
+-- Jam sa počíta do hodiny, v ktorej vznikol (published_at); priemery sú vážené počtom snapshotov,
+-- dashboard ich počíta ako *_sum / update_count, takže sa dajú ďalej sčítať (napr. cez ulice).
+-- Ingest (nový jam aj UPDATE živého jamu) zneplatní iba hodinu published_at daného riadku,
+-- politika potom prepočíta iba zneplatnené hodiny v okne start_offset, nie celú históriu.
+CREATE MATERIALIZED VIEW IF NOT EXISTS jams_hourly
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', published_at) AS bucket,
+       street,
+       road_type,
+       count(*) AS jam_count,
+       sum(update_count) AS update_count,
+       sum(speed_kmh_avg * update_count) AS speed_kmh_sum,
+       sum(jam_length_avg * update_count) AS jam_length_sum,
+       sum(delay_avg * update_count) AS delay_sum,
+       sum(jam_level_avg * update_count) AS jam_level_sum,
+       max(jam_level_max) AS jam_level_max,
+       max(delay_max) AS delay_max
+FROM jams
+GROUP BY bucket, street, road_type
+WITH NO DATA;
+
+-- Denný súhrn sa skladá z hodinového (hierarchický continuous aggregate), nie z raw jamov
+CREATE MATERIALIZED VIEW IF NOT EXISTS jams_daily
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 day', bucket) AS bucket,
+       street,
+       road_type,
+       sum(jam_count) AS jam_count,
+       sum(update_count) AS update_count,
+       sum(speed_kmh_sum) AS speed_kmh_sum,
+       sum(jam_length_sum) AS jam_length_sum,
+       sum(delay_sum) AS delay_sum,
+       sum(jam_level_sum) AS jam_level_sum,
+       max(jam_level_max) AS jam_level_max,
+       max(delay_max) AS delay_max
+FROM jams_hourly
+GROUP BY time_bucket(INTERVAL '1 day', bucket), street, road_type
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS alerts_hourly
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 hour', published_at) AS bucket,
+       street,
+       road_type,
+       type,
+       count(*) AS alert_count
+FROM alerts
+GROUP BY bucket, street, road_type, type
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS alerts_daily
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT time_bucket(INTERVAL '1 day', bucket) AS bucket,
+       street,
+       road_type,
+       type,
+       sum(alert_count) AS alert_count
+FROM alerts_hourly
+GROUP BY time_bucket(INTERVAL '1 day', bucket), street, road_type, type
+WITH NO DATA;
+
+-- Živý jam sa aktualizuje aj niekoľko hodín po vzniku, preto sa kontroluje posledný týždeň;
+-- najnovšia hodina ešte nie je materializovaná, dotazy ju dopočítajú z raw dát (real-time aggregate)
+SELECT add_continuous_aggregate_policy('jams_hourly', start_offset => INTERVAL '7 days',
+    end_offset => INTERVAL '1 hour', schedule_interval => INTERVAL '15 minutes', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('alerts_hourly', start_offset => INTERVAL '7 days',
+    end_offset => INTERVAL '1 hour', schedule_interval => INTERVAL '15 minutes', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('jams_daily', start_offset => INTERVAL '8 days',
+    end_offset => INTERVAL '1 day', schedule_interval => INTERVAL '1 hour', if_not_exists => TRUE);
+SELECT add_continuous_aggregate_policy('alerts_daily', start_offset => INTERVAL '8 days',
+    end_offset => INTERVAL '1 day', schedule_interval => INTERVAL '1 hour', if_not_exists => TRUE);
+
+-- sum_statistics = súhrn celého regiónu po hodinách, priemery sa plnia z hodinových súhrnov (nie z raw jamov)
+-- iba za okno, v ktorom ich ingest ešte môže zmeniť. total_active_jams / total_active_alerts sú udalosti
+-- aktívne počas hodiny (published_at < koniec hodiny a last_updated >= začiatok hodiny), nie iba vzniknuté
+-- v nej, preto sa počítajú z raw tabuliek: každá udalosť sa rozvinie na hodiny, ktoré trvala. Udalosť dlhšia
+-- ako max_event_duration (predvolene 1 deň) sa pred začiatkom okna nehľadá, aby sa prešli iba chunky okna.
+CREATE OR REPLACE PROCEDURE refresh_sum_statistics(job_id INTEGER, config JSONB)
+LANGUAGE plpgsql AS $$
+DECLARE
+    since TIMESTAMPTZ := now() - COALESCE(config->>'lookback', '7 days')::INTERVAL;
+    max_duration INTERVAL := COALESCE(config->>'max_event_duration', '1 day')::INTERVAL;
+BEGIN
+    INSERT INTO sum_statistics (stat_time, total_active_jams, total_active_alerts, avg_speed_kmh,
+                                avg_jam_length, avg_delay, avg_jam_level)
+    SELECT COALESCE(j.bucket, aj.bucket, aa.bucket),
+           COALESCE(aj.active_count, 0),
+           COALESCE(aa.active_count, 0),
+           j.speed_kmh_sum / NULLIF(j.update_count, 0),
+           j.jam_length_sum / NULLIF(j.update_count, 0),
+           j.delay_sum / NULLIF(j.update_count, 0),
+           j.jam_level_sum / NULLIF(j.update_count, 0)
+    FROM (
+        SELECT bucket, sum(update_count) AS update_count,
+               sum(speed_kmh_sum) AS speed_kmh_sum, sum(jam_length_sum) AS jam_length_sum,
+               sum(delay_sum) AS delay_sum, sum(jam_level_sum) AS jam_level_sum
+        FROM jams_hourly
+        WHERE bucket >= since
+        GROUP BY bucket
+    ) j
+    FULL JOIN (
+        SELECT hour AS bucket, count(*) AS active_count
+        FROM jams,
+             generate_series(time_bucket(INTERVAL '1 hour', published_at), COALESCE(last_updated, published_at),
+                             INTERVAL '1 hour') AS hour
+        WHERE published_at >= since - max_duration
+          AND COALESCE(last_updated, published_at) >= since
+          AND hour >= since
+        GROUP BY hour
+    ) aj ON aj.bucket = j.bucket
+    FULL JOIN (
+        SELECT hour AS bucket, count(*) AS active_count
+        FROM alerts,
+             generate_series(time_bucket(INTERVAL '1 hour', published_at), COALESCE(last_updated, published_at),
+                             INTERVAL '1 hour') AS hour
+        WHERE published_at >= since - max_duration
+          AND COALESCE(last_updated, published_at) >= since
+          AND hour >= since
+        GROUP BY hour
+    ) aa ON aa.bucket = COALESCE(j.bucket, aj.bucket)
+    ON CONFLICT (stat_time) DO UPDATE SET
+        total_active_jams = EXCLUDED.total_active_jams,
+        total_active_alerts = EXCLUDED.total_active_alerts,
+        avg_speed_kmh = EXCLUDED.avg_speed_kmh,
+        avg_jam_length = EXCLUDED.avg_jam_length,
+        avg_delay = EXCLUDED.avg_delay,
+        avg_jam_level = EXCLUDED.avg_jam_level;
+END
+$$;
+
+SELECT add_job('refresh_sum_statistics', INTERVAL '15 minutes', config => '{"lookback": "7 days"}')
+WHERE NOT EXISTS (SELECT 1 FROM timescaledb_information.jobs WHERE proc_name = 'refresh_sum_statistics');
+
+-- Väzby nehôd (nehody) na jamy a alerty v ich okolí: vzdialenosť do jam_distance_m / alert_distance_m
+-- a udalosť trvala v okne <čas nehody - before, čas nehody + after>. Počítajú sa vopred po dňoch nehôd,
+-- takže join používa GIST indexy (jam_line, location) iba nad chunkmi okolo daného dňa.
+CREATE TABLE IF NOT EXISTS nehody_jams (
+    p1 BIGINT NOT NULL,
+    jam_uuid INTEGER NOT NULL,
+    jam_published_at TIMESTAMPTZ NOT NULL,
+    distance_m FLOAT,
+    time_offset INTERVAL,  -- vznik jamu - čas nehody
+    PRIMARY KEY (p1, jam_uuid, jam_published_at)
+);
+CREATE INDEX IF NOT EXISTS idx_nehody_jams_jam ON nehody_jams (jam_uuid, jam_published_at);
+
+CREATE TABLE IF NOT EXISTS nehody_alerts (
+    p1 BIGINT NOT NULL,
+    alert_uuid UUID NOT NULL,
+    alert_published_at TIMESTAMPTZ NOT NULL,
+    distance_m FLOAT,
+    time_offset INTERVAL,  -- vznik alertu - čas nehody
+    PRIMARY KEY (p1, alert_uuid, alert_published_at)
+);
+CREATE INDEX IF NOT EXISTS idx_nehody_alerts_alert ON nehody_alerts (alert_uuid, alert_published_at);
+
+-- Nehody, ktoré už boli prepojené (nové nehody sa prepoja pri najbližšom behu jobu)
+CREATE TABLE IF NOT EXISTS nehody_links_done (
+    p1 BIGINT PRIMARY KEY,
+    linked_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE VIEW nehody_links AS
+SELECT p1, 'jam' AS event_type, jam_uuid::TEXT AS event_uuid, jam_published_at AS published_at, distance_m, time_offset
+FROM nehody_jams
+UNION ALL
+SELECT p1, 'alert', alert_uuid::TEXT, alert_published_at, distance_m, time_offset
+FROM nehody_alerts;
+
+-- p2b je čas nehody HHMM, 2560 = neznámy čas
+CREATE OR REPLACE FUNCTION nehoda_time_known(p2b INTEGER) RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT COALESCE(p2b < 2400 AND p2b % 100 < 60, FALSE)
+$$;
+
+-- Čas nehody (pri neznámom čase začiatok dňa) v časovej zóne polície
+CREATE OR REPLACE FUNCTION nehoda_time(p2a DATE, p2b INTEGER) RETURNS TIMESTAMPTZ
+LANGUAGE sql STABLE AS $$
+    SELECT (p2a + CASE WHEN nehoda_time_known(p2b) THEN make_interval(hours => p2b / 100, mins => p2b % 100)
+                       ELSE INTERVAL '0' END) AT TIME ZONE 'Europe/Prague'
+$$;
+
+-- Nehody jedného dňa s časom a oknom <čas - window_before, čas + window_after>, pri neznámom čase
+-- pokrýva okno celý deň
+CREATE OR REPLACE FUNCTION nehody_windows(accident_day DATE, p1s BIGINT[], window_before INTERVAL,
+                                          window_after INTERVAL)
+RETURNS TABLE (p1 BIGINT, geog GEOGRAPHY, happened_at TIMESTAMPTZ, window_start TIMESTAMPTZ, window_end TIMESTAMPTZ)
+LANGUAGE sql STABLE AS $$
+    SELECT n.p1, n.geog, t.happened_at, t.happened_at - window_before,
+           t.happened_at + window_after
+               + CASE WHEN nehoda_time_known(n.p2b) THEN INTERVAL '0' ELSE INTERVAL '1 day' END
+    FROM nehody n, LATERAL (SELECT nehoda_time(n.p2a, n.p2b) AS happened_at) t
+    WHERE n.p2a = accident_day AND n.p1 = ANY(p1s) AND n.geog IS NOT NULL
+$$;
+
+-- Prepojí zadané nehody (NULL = všetky ešte neprepojené) s jamami a alertmi, staré väzby týchto nehôd
+-- nahradí. Spracúva sa po dňoch, časové ohraničenie dňa sú konštanty, podľa ktorých sa vylúčia chunky.
+-- Vráti počet vytvorených väzieb.
+CREATE OR REPLACE FUNCTION link_nehody(p1s BIGINT[] DEFAULT NULL, config JSONB DEFAULT '{}')
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    jam_distance FLOAT := COALESCE((config->>'jam_distance_m')::FLOAT, 100);
+    alert_distance FLOAT := COALESCE((config->>'alert_distance_m')::FLOAT, 100);
+    window_before INTERVAL := COALESCE(config->>'before', '1 hour')::INTERVAL;
+    window_after INTERVAL := COALESCE(config->>'after', '3 hours')::INTERVAL;
+    -- najdlhšie trvanie udalosti, udalosti vzniknuté skôr sa nehľadajú
+    max_duration INTERVAL := COALESCE(config->>'max_event_duration', '1 day')::INTERVAL;
+    accident_day DATE;
+    day_p1s BIGINT[];
+    day_from TIMESTAMPTZ;
+    day_to TIMESTAMPTZ;
+    linked INTEGER := 0;
+    added INTEGER;
+BEGIN
+    FOR accident_day, day_p1s IN
+        SELECT n.p2a, array_agg(n.p1)
+        FROM nehody n
+        WHERE n.geog IS NOT NULL
+          AND CASE WHEN p1s IS NULL THEN NOT EXISTS (SELECT 1 FROM nehody_links_done d WHERE d.p1 = n.p1)
+                   ELSE n.p1 = ANY(p1s) END
+        GROUP BY n.p2a
+        ORDER BY n.p2a
+    LOOP
+        day_from := nehoda_time(accident_day, NULL) - window_before - max_duration;
+        day_to := nehoda_time(accident_day + 1, NULL) + window_after;
+
+        DELETE FROM nehody_jams WHERE p1 = ANY(day_p1s);
+        DELETE FROM nehody_alerts WHERE p1 = ANY(day_p1s);
+
+        INSERT INTO nehody_jams (p1, jam_uuid, jam_published_at, distance_m, time_offset)
+        SELECT n.p1, j.uuid, j.published_at, ST_Distance(j.jam_line, n.geog), j.published_at - n.happened_at
+        FROM nehody_windows(accident_day, day_p1s, window_before, window_after) n
+        JOIN jams j ON j.published_at >= day_from AND j.published_at < day_to
+                   AND j.published_at >= n.window_start - max_duration AND j.published_at <= n.window_end
+                   AND j.last_updated >= n.window_start
+                   AND ST_DWithin(j.jam_line, n.geog, jam_distance)
+        ON CONFLICT DO NOTHING;
+        GET DIAGNOSTICS added = ROW_COUNT;
+        linked := linked + added;
+
+        INSERT INTO nehody_alerts (p1, alert_uuid, alert_published_at, distance_m, time_offset)
+        SELECT n.p1, a.uuid, a.published_at, ST_Distance(a.location, n.geog), a.published_at - n.happened_at
+        FROM nehody_windows(accident_day, day_p1s, window_before, window_after) n
+        JOIN alerts a ON a.published_at >= day_from AND a.published_at < day_to
+                     AND a.published_at >= n.window_start - max_duration AND a.published_at <= n.window_end
+                     AND a.last_updated >= n.window_start
+                     AND ST_DWithin(a.location, n.geog, alert_distance)
+        ON CONFLICT DO NOTHING;
+        GET DIAGNOSTICS added = ROW_COUNT;
+        linked := linked + added;
+
+        INSERT INTO nehody_links_done (p1)
+        SELECT unnest(day_p1s)
+        ON CONFLICT (p1) DO UPDATE SET linked_at = now();
+    END LOOP;
+    RETURN linked;
+END
+$$;
+
+-- Prepojí nanovo nehody z dní <date_from, date_to> (napr. po načítaní starších jamov z CSV)
+CREATE OR REPLACE FUNCTION link_nehody_between(date_from DATE, date_to DATE, config JSONB DEFAULT '{}')
+RETURNS INTEGER
+LANGUAGE sql AS $$
+    SELECT link_nehody(COALESCE(array_agg(p1), '{}'), config)
+    FROM nehody
+    WHERE p2a BETWEEN date_from AND date_to
+$$;
+
+-- Job: nové nehody + nehody posledných dní, ku ktorým live ingester ešte pridáva a mení jamy a alerty
+CREATE OR REPLACE PROCEDURE refresh_nehody_links(job_id INTEGER, config JSONB)
+LANGUAGE plpgsql AS $$
+DECLARE
+    since DATE := (now() - COALESCE(config->>'lookback', '2 days')::INTERVAL)::DATE;
+BEGIN
+    PERFORM link_nehody(NULL, config);
+    PERFORM link_nehody_between(since, now()::DATE, config);
+END
+$$;
+
+SELECT add_job('refresh_nehody_links', INTERVAL '1 hour', config => '{"lookback": "2 days"}')
+WHERE NOT EXISTS (SELECT 1 FROM timescaledb_information.jobs WHERE proc_name = 'refresh_nehody_links');
+
+-- Kompresia chunkov jamov a alertov (job pridáva storage_policies.py namiesto add_compression_policy).
+-- Skomprimovaný chunk už nemá GIST, BRIN ani čiastočné indexy a UPDATE podľa active / uuid by ho musel
+-- dekomprimovať, preto sa chunk skomprimuje, až keď:
+-- - je starší ako compress_after (predvolene 30 dní, viac ako okná súhrnov, sum_statistics a väzieb nehôd),
+-- - nemá aktívne riadky; riadok bez aktualizácie dlhšie ako stale_after (živé udalosti ingester zapisuje
+--   aspoň každých ~10 minút) sa najskôr deaktivuje, chunk so živou udalosťou (dlhá uzávierka) sa preskočí,
+-- - sú prepojené všetky nehody, ktoré už sú v DB (link_nehody nad neskomprimovanými chunkmi s indexmi).
+CREATE OR REPLACE PROCEDURE compress_closed_chunks(job_id INTEGER, config JSONB)
+LANGUAGE plpgsql AS $$
+DECLARE
+    hypertable REGCLASS := (config->>'hypertable')::REGCLASS;
+    compress_after INTERVAL := COALESCE(config->>'compress_after', '30 days')::INTERVAL;
+    stale_after INTERVAL := COALESCE(config->>'stale_after', '1 day')::INTERVAL;
+    chunk RECORD;
+    live BOOLEAN;
+    linked BOOLEAN := FALSE;
+BEGIN
+    FOR chunk IN
+        SELECT format('%I.%I', c.chunk_schema, c.chunk_name)::REGCLASS AS chunk_id
+        FROM timescaledb_information.chunks c
+        WHERE format('%I.%I', c.hypertable_schema, c.hypertable_name)::REGCLASS = hypertable
+          AND NOT c.is_compressed
+          AND c.range_end < now() - compress_after
+        ORDER BY c.range_start
+    LOOP
+        EXECUTE format('UPDATE %s SET active = FALSE WHERE active AND COALESCE(last_updated, published_at) < $1',
+                       chunk.chunk_id) USING now() - stale_after;
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s WHERE active)', chunk.chunk_id) INTO live;
+        IF live THEN
+            COMMIT;
+            CONTINUE;
+        END IF;
+        IF NOT linked THEN
+            PERFORM link_nehody(NULL, config);
+            linked := TRUE;
+        END IF;
+        PERFORM compress_chunk(chunk.chunk_id);
+        COMMIT;
+    END LOOP;
+END
+$$;
@@ -3,6 +3,50 @@ import pandas as pd
 from psycopg2.extras import execute_values
 
 from connection_to_db import CONN_BRNO
+from copy_loader import copy_csv_to_table, CHUNK_SIZE
+
+
+ALERT_COLUMNS = [
+    "uuid", "country", "city", "type", "subtype", "street",
+    "report_rating", "confidence", "reliability",
+    "road_type", "magvar", "report_by_municipality_user",
+    "report_description", "location",
+    "published_at", "last_updated", "active"
+]
+
+INSERT_ALERTS = """
+INSERT INTO alerts (
+    uuid, country, city, type, subtype, street,
+    report_rating, confidence, reliability,
+    road_type, magvar, report_by_municipality_user,
+    report_description, location,
+    published_at, last_updated, active
+)
+VALUES %s
+ON CONFLICT (uuid, published_at) DO NOTHING
+"""
+
+
+def alert_record(row):
+    return (
+        row['uuid'],
+        row['country'],
+        row['city'],
+        row['type'],
+        row['subtype'],
+        row['street'],
+        int(row['report_rating']) if row['report_rating'] else None,
+        int(row['confidence']) if row['confidence'] else None,
+        int(row['reliability']) if row['reliability'] else None,
+        int(row['road_type']) if row['road_type'] else None,
+        int(row['magvar']) if row['magvar'] else None,
+        row['report_by_municipality_user'].lower() == 'true' if row['report_by_municipality_user'] else None,
+        row['report_description'] if row['report_description'] else None,
+        row['location'],  # HEX WKB bod ako string
+        row['published_at'],
+        row['last_updated'] if row['last_updated'] else None,
+        row['active'].lower() == 'true' if row['active'] else False
+    )
 
 
 def insert_alerts_from_csv(csv_path, conn):
@@ -12,46 +56,21 @@ def insert_alerts_from_csv(csv_path, conn):
 
         for row in reader:
             try:
-                record = (
-                    row['uuid'],
-                    row['country'],
-                    row['city'],
-                    row['type'],
-                    row['subtype'],
-                    row['street'],
-                    int(row['report_rating']) if row['report_rating'] else None,
-                    int(row['confidence']) if row['confidence'] else None,
-                    int(row['reliability']) if row['reliability'] else None,
-                    int(row['road_type']) if row['road_type'] else None,
-                    int(row['magvar']) if row['magvar'] else None,
-                    row['report_by_municipality_user'].lower() == 'true' if row['report_by_municipality_user'] else None,
-                    row['report_description'] if row['report_description'] else None,
-                    row['location'],  # HEX WKB bod ako string
-                    row['published_at'],
-                    row['last_updated'] if row['last_updated'] else None,
-                    row['active'].lower() == 'true' if row['active'] else False
-                )
-                records.append(record)
+                records.append(alert_record(row))
             except Exception as e:
                 print(f"Chyba pri spracovaní riadku: {row}\n{e}")
 
     with conn.cursor() as cur:
-        sql = """
-        INSERT INTO alerts (
-            uuid, country, city, type, subtype, street,
-            report_rating, confidence, reliability,
-            road_type, magvar, report_by_municipality_user,
-            report_description, location,
-            published_at, last_updated, active
-        )
-        VALUES %s
-        ON CONFLICT (uuid, published_at) DO NOTHING
-        """
-
-        execute_values(cur, sql, records)
+        execute_values(cur, INSERT_ALERTS, records)
         conn.commit()
         print(f"{len(records)} alertov vložených zo súboru {csv_path}")
 
 
+def copy_alerts_from_csv(csv_path, conn, chunk_size=CHUNK_SIZE):
+    """Streaming COPY variant of insert_alerts_from_csv (resumable, constant memory)."""
+    return copy_csv_to_table(csv_path, conn, "alerts", ALERT_COLUMNS, alert_record,
+                             ["uuid", "published_at"], chunk_size=chunk_size, skip_invalid=True)
+
+
 if __name__ == '__main__':
-    insert_alerts_from_csv("../data/brno_alerts.csv", CONN_BRNO)
\ No newline at end of file
+    copy_alerts_from_csv("../data/brno_alerts.csv", CONN_BRNO)
\ No newline at end of file
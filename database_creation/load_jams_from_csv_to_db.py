@@ -3,6 +3,7 @@ import csv
 import pandas as pd
 from psycopg2.extras import execute_values
 from connection_to_db import CONN_BRNO
+from copy_loader import copy_csv_to_table, CHUNK_SIZE
 
 
 def calculate_update_count(row):
@@ -13,70 +14,121 @@ def calculate_update_count(row):
         return 1
 
 
+JAM_COLUMNS = [
+    "id", "uuid", "country", "city", "turn_type", "street",
+    "end_node", "start_node", "road_type", "blocking_alert_uuid",
+    "jam_level_max", "jam_level_avg",
+    "speed_kmh_min", "speed_kmh_avg",
+    "jam_length_max", "jam_length_avg",
+    "speed_max", "speed_avg",
+    "delay_max", "delay_avg",
+    "update_count", "jam_line",
+    "published_at", "last_updated", "active"
+]
+
+INSERT_JAMS = """
+INSERT INTO jams (
+    id, uuid, country, city, turn_type, street,
+    end_node, start_node, road_type, blocking_alert_uuid,
+    jam_level_max, jam_level_avg,
+    speed_kmh_min, speed_kmh_avg,
+    jam_length_max, jam_length_avg,
+    speed_max, speed_avg,
+    delay_max, delay_avg,
+    update_count, jam_line,
+    published_at, last_updated, active
+)
+VALUES %s
+ON CONFLICT (uuid, published_at) DO NOTHING
+"""
+
+
+def jam_record(row):
+    update_count = calculate_update_count(row)
+
+    # Pripravenie dát pre INSERT
+    return (
+        int(float(row['id'])) if row['id'] else None,
+        int(row['uuid']),
+        row['country'],
+        row['city'],
+        row['turn_type'],
+        row['street'],
+        row['end_node'] if row['end_node'] else None,
+        row['start_node'] if row['start_node'] else None,
+        int(row['road_type']) if row['road_type'] else None,
+        row['blocking_alert_uuid'] if row['blocking_alert_uuid'] else None,
+
+        int(row['jam_level_max']) if row['jam_level_max'] else None,
+        float(row['jam_level_avg']) if row['jam_level_avg'] else None,
+
+        int(row['speed_kmh_min']) if row['speed_kmh_min'] else None,
+        float(row['speed_kmh_avg']) if row['speed_kmh_avg'] else None,
+
+        int(row['jam_length_max']) if row['jam_length_max'] else None,
+        float(row['jam_length_avg']) if row['jam_length_avg'] else None,
+
+        float(row['speed_max']) if row['speed_max'] else None,
+        float(row['speed_avg']) if row['speed_avg'] else None,
+
+        int(row['delay_max']) if row['delay_max'] else None,
+        float(row['delay_avg']) if row['delay_avg'] else None,
+
+        update_count,
+
+        row['jam_line'],  # WKT alebo hex WKB ako string
+
+        row['published_at'],
+        row['last_updated'] if row['last_updated'] else None,
+        row['active'].lower() == 'true'
+    )
+
+
+def jam_simplified_record(row):
+    return (
+        int(float(row['id'])) if row['id'] else None,
+        int(row['uuid']),
+        row['country'],
+        row['city'],
+        row['turn_type'] if row['turn_type'] else None,
+        row['street'],
+        row['end_node'] if row['end_node'] else None,
+        row['start_node'] if row['start_node'] else None,
+        int(row['road_type']) if row['road_type'] else None,
+        row['blocking_alert_uuid'] if row['blocking_alert_uuid'] else None,
+
+        int(row['jam_level']) if row['jam_level'] else None,
+        float(row['jam_level']) if row['jam_level'] else None,
+
+        int(row['speed_kmh']) if row['speed_kmh'] else None,
+        float(row['speed_kmh']) if row['speed_kmh'] else None,
+
+        int(row['jam_length']) if row['jam_length'] else None,
+        float(row['jam_length']) if row['jam_length'] else None,
+
+        float(row['speed']) if row['speed'] else None,
+        float(row['speed']) if row['speed'] else None,
+
+        int(row['delay']) if row['delay'] else None,
+        float(row['delay']) if row['delay'] else None,
+
+        1,  # update_count default
+
+        row['jam_line'],
+
+        row['published_at'],
+        row['last_updated'] if row['last_updated'] else None,
+        row['active'].lower() == 'true'
+    )
+
+
 def insert_jams_from_csv(csv_path, conn):
     with open(csv_path, newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
-        records = []
-
-        for row in reader:
-            update_count = calculate_update_count(row)
-
-            # Pripravenie dát pre INSERT
-            record = (
-                int(float(row['id'])) if row['id'] else None,
-                int(row['uuid']),
-                row['country'],
-                row['city'],
-                row['turn_type'],
-                row['street'],
-                row['end_node'] if row['end_node'] else None,
-                row['start_node'] if row['start_node'] else None,
-                int(row['road_type']) if row['road_type'] else None,
-                row['blocking_alert_uuid'] if row['blocking_alert_uuid'] else None,
-
-                int(row['jam_level_max']) if row['jam_level_max'] else None,
-                float(row['jam_level_avg']) if row['jam_level_avg'] else None,
-
-                int(row['speed_kmh_min']) if row['speed_kmh_min'] else None,
-                float(row['speed_kmh_avg']) if row['speed_kmh_avg'] else None,
-
-                int(row['jam_length_max']) if row['jam_length_max'] else None,
-                float(row['jam_length_avg']) if row['jam_length_avg'] else None,
-
-                float(row['speed_max']) if row['speed_max'] else None,
-                float(row['speed_avg']) if row['speed_avg'] else None,
-
-                int(row['delay_max']) if row['delay_max'] else None,
-                float(row['delay_avg']) if row['delay_avg'] else None,
-
-                update_count,
-
-                row['jam_line'],  # WKT alebo hex WKB ako string
-
-                row['published_at'],
-                row['last_updated'] if row['last_updated'] else None,
-                row['active'].lower() == 'true'
-            )
-            records.append(record)
+        records = [jam_record(row) for row in reader]
 
     with conn.cursor() as cur:
-        sql = """
-        INSERT INTO jams (
-            id, uuid, country, city, turn_type, street,
-            end_node, start_node, road_type, blocking_alert_uuid,
-            jam_level_max, jam_level_avg,
-            speed_kmh_min, speed_kmh_avg,
-            jam_length_max, jam_length_avg,
-            speed_max, speed_avg,
-            delay_max, delay_avg,
-            update_count, jam_line,
-            published_at, last_updated, active
-        )
-        VALUES %s
-        ON CONFLICT (uuid, published_at) DO NOTHING
-        """
-
-        execute_values(cur, sql, records)
+        execute_values(cur, INSERT_JAMS, records)
         conn.commit()
         print(f"{len(records)} záznamov vložených do 'jams'")
 
@@ -84,67 +136,25 @@ def insert_jams_from_csv(csv_path, conn):
 def insert_jams_simplified(csv_path, conn):
     with open(csv_path, newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
-        records = []
+        records = [jam_simplified_record(row) for row in reader]
 
-        for row in reader:
-            record = (
-                int(float(row['id'])) if row['id'] else None,
-                int(row['uuid']),
-                row['country'],
-                row['city'],
-                row['turn_type'] if row['turn_type'] else None,
-                row['street'],
-                row['end_node'] if row['end_node'] else None,
-                row['start_node'] if row['start_node'] else None,
-                int(row['road_type']) if row['road_type'] else None,
-                row['blocking_alert_uuid'] if row['blocking_alert_uuid'] else None,
-
-                int(row['jam_level']) if row['jam_level'] else None,
-                float(row['jam_level']) if row['jam_level'] else None,
-
-                int(row['speed_kmh']) if row['speed_kmh'] else None,
-                float(row['speed_kmh']) if row['speed_kmh'] else None,
-
-                int(row['jam_length']) if row['jam_length'] else None,
-                float(row['jam_length']) if row['jam_length'] else None,
-
-                float(row['speed']) if row['speed'] else None,
-                float(row['speed']) if row['speed'] else None,
-
-                int(row['delay']) if row['delay'] else None,
-                float(row['delay']) if row['delay'] else None,
+    with conn.cursor() as cur:
+        execute_values(cur, INSERT_JAMS, records)
+        conn.commit()
+        print(f"{len(records)} záznamov vložených zo súboru {csv_path}")
 
-                1,  # update_count default
 
-                row['jam_line'],
+def copy_jams_from_csv(csv_path, conn, chunk_size=CHUNK_SIZE):
+    """Streaming COPY variant of insert_jams_from_csv (resumable, constant memory)."""
+    return copy_csv_to_table(csv_path, conn, "jams", JAM_COLUMNS, jam_record,
+                             ["uuid", "published_at"], chunk_size=chunk_size)
 
-                row['published_at'],
-                row['last_updated'] if row['last_updated'] else None,
-                row['active'].lower() == 'true'
-            )
-            records.append(record)
 
-    with conn.cursor() as cur:
-        sql = """
-        INSERT INTO jams (
-            id, uuid, country, city, turn_type, street,
-            end_node, start_node, road_type, blocking_alert_uuid,
-            jam_level_max, jam_level_avg,
-            speed_kmh_min, speed_kmh_avg,
-            jam_length_max, jam_length_avg,
-            speed_max, speed_avg,
-            delay_max, delay_avg,
-            update_count, jam_line,
-            published_at, last_updated, active
-        )
-        VALUES %s
-        ON CONFLICT (uuid, published_at) DO NOTHING
-        """
-
-        execute_values(cur, sql, records)
-        conn.commit()
-        print(f"{len(records)} záznamov vložených zo súboru {csv_path}")
+def copy_jams_simplified(csv_path, conn, chunk_size=CHUNK_SIZE):
+    """Streaming COPY variant of insert_jams_simplified (resumable, constant memory)."""
+    return copy_csv_to_table(csv_path, conn, "jams", JAM_COLUMNS, jam_simplified_record,
+                             ["uuid", "published_at"], chunk_size=chunk_size)
 
 
 if __name__ == '__main__':
-    insert_jams_simplified("../data/brno_jams.csv", CONN_BRNO)
\ No newline at end of file
+    copy_jams_simplified("../data/brno_jams.csv", CONN_BRNO)
\ No newline at end of file
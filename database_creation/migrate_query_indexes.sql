@@ -0,0 +1,28 @@
+-- Jednorazová migrácia existujúcej DB: indexy pre časté dotazy dashboardu (rovnaké ako v init.sql).
+-- Index sa vytvára po chunkoch (transaction_per_chunk), zámok drží vždy iba jeden chunk,
+-- takže live ingester počas migrácie nečaká na celú hypertable.
+
+-- "jamy / alerty na ulici X za posledný týždeň"
+CREATE INDEX IF NOT EXISTS idx_jams_street_published ON jams (street, published_at DESC)
+    WITH (timescaledb.transaction_per_chunk);
+CREATE INDEX IF NOT EXISTS idx_alerts_street_published ON alerts (street, published_at DESC)
+    WITH (timescaledb.transaction_per_chunk);
+
+-- "alerty typu ROAD_CLOSED v oblasti dnes" (v kombinácii s GIST indexom idx_alerts_location)
+CREATE INDEX IF NOT EXISTS idx_alerts_type_published ON alerts (type, subtype, published_at DESC)
+    WITH (timescaledb.transaction_per_chunk);
+
+-- last_updated nie je partičný stĺpec, rastie však spolu s published_at, BRIN je malý a stačí na rozsahy
+CREATE INDEX IF NOT EXISTS idx_jams_last_updated_brin ON jams USING BRIN (last_updated)
+    WITH (pages_per_range = 32, timescaledb.transaction_per_chunk);
+CREATE INDEX IF NOT EXISTS idx_alerts_last_updated_brin ON alerts USING BRIN (last_updated)
+    WITH (pages_per_range = 32, timescaledb.transaction_per_chunk);
+
+-- "aktívne jamy teraz" (DB, ktoré vznikli pred zavedením čiastočných indexov)
+CREATE INDEX IF NOT EXISTS idx_jams_active ON jams (last_updated, uuid)
+    WITH (timescaledb.transaction_per_chunk) WHERE active;
+CREATE INDEX IF NOT EXISTS idx_alerts_active ON alerts (last_updated, uuid)
+    WITH (timescaledb.transaction_per_chunk) WHERE active;
+
+ANALYZE jams;
+ANALYZE alerts;
@@ -0,0 +1,24 @@
+-- Jednorazová migrácia existujúcej DB: odstránenie duplicitných segmentov a doplnenie indexov.
+-- Pôvodný ingester vkladal segmenty jamu pri každom snapshote, z každej skupiny rovnakých
+-- (jam_id, segment_id, from_node, to_node) ostane iba najstarší riadok; chýbajúci uzol (NULL) sa
+-- porovnáva rovnako ako v unikátnom indexe, cez COALESCE(..., -1).
+DELETE FROM segments
+WHERE id IN (
+    SELECT id
+    FROM (
+        SELECT id,
+               row_number() OVER (PARTITION BY jam_id, segment_id, COALESCE(from_node, -1), COALESCE(to_node, -1)
+                                  ORDER BY id) AS rn
+        FROM segments
+    ) ranked
+    WHERE rn > 1
+);
+
+-- Tabuľka sa zmenší rádovo, miesto sa vráti systému
+VACUUM (FULL, ANALYZE) segments;
+
+-- Skoršia verzia indexu bola nad samotnými stĺpcami uzlov a riadky s NULL uzlom nededuplikovala
+DROP INDEX IF EXISTS idx_segments_unique;
+CREATE UNIQUE INDEX idx_segments_unique
+    ON segments (jam_id, segment_id, COALESCE(from_node, -1), COALESCE(to_node, -1));
+CREATE INDEX IF NOT EXISTS idx_segments_segment_id ON segments (segment_id);
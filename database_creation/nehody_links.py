@@ -0,0 +1,92 @@
+"""
+Links of accidents (nehody) to the jams and alerts near them in space and time.
+
+The links are precomputed in the DB (tables nehody_jams / nehody_alerts, functions link_nehody and
+link_nehody_between from init.sql) and kept up to date by the job refresh_nehody_links: new accidents
+are linked on its next run, accidents of the last days are relinked while the live ingester still
+adds jams. This module calls the same functions from Python and reads the links back, e.g. after
+loading older jams from CSV or for analyses.
+
+Usage (project root on PYTHONPATH):
+    python nehody_links.py --db brno
+    python nehody_links.py --db brno --from 2024-01-01 --to 2024-12-31 --jam-distance 50
+"""
+import argparse
+from collections import defaultdict
+from datetime import date
+
+from psycopg2.extras import Json
+
+from connection_to_db import connection
+
+LINK_NEW = "SELECT link_nehody(NULL, %s)"
+LINK_BETWEEN = "SELECT link_nehody_between(%s, %s, %s)"
+LINK_GIVEN = "SELECT link_nehody(%s::BIGINT[], %s)"
+
+GET_LINKS = """
+SELECT p1, event_type, event_uuid, published_at, distance_m, time_offset
+FROM nehody_links
+WHERE p1 = ANY(%s::BIGINT[])
+ORDER BY p1, distance_m
+"""
+
+
+def link_config(jam_distance=None, alert_distance=None, before=None, after=None):
+    """
+    @return: config of link_nehody, unset values keep the defaults of the SQL function
+    """
+    config = {"jam_distance_m": jam_distance, "alert_distance_m": alert_distance, "before": before, "after": after}
+    return {key: value for key, value in config.items() if value is not None}
+
+
+def link_accidents(conn, p1s=None, date_from=None, date_to=None, config=None):
+    """
+    Links accidents to jams and alerts, existing links of these accidents are replaced.
+
+    @param p1s: accident ids (p1) to link
+    @param date_from, date_to: link all accidents of these days instead (both inclusive)
+    @param config: see link_config (default the values from init.sql)
+    @return: number of links created
+    Without p1s and dates only accidents not linked yet are processed.
+    """
+    config = Json(config or {})
+    with conn.cursor() as cur:
+        if p1s is not None:
+            cur.execute(LINK_GIVEN, (list(p1s), config))
+        elif date_from is not None or date_to is not None:
+            cur.execute(LINK_BETWEEN, (date_from or date.min, date_to or date.today(), config))
+        else:
+            cur.execute(LINK_NEW, (config,))
+        linked = cur.fetchone()[0]
+    conn.commit()
+    return linked
+
+
+def accident_links(conn, p1s):
+    """
+    @return: dictionary p1 -> list of linked events (event_type, event_uuid, published_at, distance_m,
+             time_offset), nearest first
+    """
+    links = defaultdict(list)
+    with conn.cursor() as cur:
+        cur.execute(GET_LINKS, (list(p1s),))
+        for p1, *event in cur.fetchall():
+            links[p1].append(tuple(event))
+    return dict(links)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepojenie nehôd s jamami a alertmi v okolí")
+    parser.add_argument("--db", default="brno")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat, help="prepojiť nanovo nehody od dňa")
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat, help="prepojiť nanovo nehody do dňa")
+    parser.add_argument("--jam-distance", type=float, help="vzdialenosť jamu od nehody v metroch (100)")
+    parser.add_argument("--alert-distance", type=float, help="vzdialenosť alertu od nehody v metroch (100)")
+    parser.add_argument("--before", help='udalosť skončila najskôr takto pred nehodou, napr. "1 hour"')
+    parser.add_argument("--after", help='udalosť vznikla najneskôr takto po nehode, napr. "3 hours"')
+    args = parser.parse_args()
+
+    with connection(args.db) as conn:
+        created = link_accidents(conn, date_from=args.date_from, date_to=args.date_to,
+                                 config=link_config(args.jam_distance, args.alert_distance, args.before, args.after))
+    print(f"vytvorených {created} väzieb nehôd na jamy a alerty")
@@ -0,0 +1,259 @@
+"""
+Parallel, partition-aware CSV restore into the jams / alerts / nehody hypertables.
+
+The input CSV is first split into part files by the time ranges of the hypertable chunks, so every
+part lands in exactly one chunk. Ranges of existing chunks are read from
+timescaledb_information.chunks (their interval may differ from the current one, storage_policies.py
+changes it with the ingest rate); beyond them new chunks are aligned to multiples of the current
+interval since the Unix epoch and cut at a neighbouring chunk, like TimescaleDB creates them.
+The parts are then loaded by a pool of worker processes, each with its own DB connection, using
+the streaming COPY loader from copy_loader.py. Progress is kept per part file in `load_progress`,
+so a crashed restore can simply be started again.
+
+Usage (project root on PYTHONPATH):
+    python parallel_restore.py jams_simplified ../data/brno_jams.csv --db jmk --workers 8
+"""
+import argparse
+import csv
+import os
+import re
+import time
+from bisect import bisect_right
+from datetime import datetime, timezone, timedelta
+from multiprocessing import Pool
+
+import psycopg2
+
+from connection_to_db import conn_params_brno, conn_params_jmk, conn_params_most
+from copy_loader import copy_csv_to_table, CHUNK_SIZE
+from load_alerts_from_csv_to_db import ALERT_COLUMNS, alert_record
+from load_jams_from_csv_to_db import JAM_COLUMNS, jam_record, jam_simplified_record
+from load_nehody_from_csv_to_db import NEHODY_COLUMNS, nehoda_record
+
+DB_PARAMS = {
+    "brno": conn_params_brno,
+    "jmk": conn_params_jmk,
+    "orp_most": conn_params_most,
+}
+
+# Čo sa dá obnoviť: cieľová tabuľka, časový stĺpec hypertable, stĺpce, konverzia riadku, ON CONFLICT
+# a či sa chybné riadky preskočia (ako v pôvodných loaderoch: jamy zlyhajú, alerty a nehody preskočia)
+RESTORE_SPECS = {
+    "jams": {
+        "table": "jams", "time_column": "published_at",
+        "columns": JAM_COLUMNS, "convert_row": jam_record, "conflict": ["uuid", "published_at"],
+        "skip_invalid": False,
+    },
+    "jams_simplified": {
+        "table": "jams", "time_column": "published_at",
+        "columns": JAM_COLUMNS, "convert_row": jam_simplified_record, "conflict": ["uuid", "published_at"],
+        "skip_invalid": False,
+    },
+    "alerts": {
+        "table": "alerts", "time_column": "published_at",
+        "columns": ALERT_COLUMNS, "convert_row": alert_record, "conflict": ["uuid", "published_at"],
+        "skip_invalid": True,
+    },
+    "nehody": {
+        "table": "nehody", "time_column": "p2a",
+        "columns": NEHODY_COLUMNS, "convert_row": nehoda_record, "conflict": ["p1"],
+        "skip_invalid": True,
+    },
+}
+
+GET_CHUNK_INTERVAL = """
+SELECT time_interval FROM timescaledb_information.dimensions
+WHERE hypertable_name = %s AND dimension_type = 'Time'
+"""
+
+GET_CHUNK_RANGES = """
+SELECT range_start, range_end FROM timescaledb_information.chunks
+WHERE hypertable_name = %s AND range_start IS NOT NULL
+ORDER BY range_start
+"""
+
+DEFAULT_CHUNK_INTERVAL = timedelta(days=7)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+SPLIT_DONE_MARKER = "_SPLIT_DONE"
+# Ochrana pred vyčerpaním file deskriptorov pri mnohoročných dumpoch
+MAX_OPEN_PARTS = 256
+
+_TZ_SHORT = re.compile(r"([+-]\d{2})$")
+_FRACTION = re.compile(r"\.(\d+)")
+
+# Spojenie workera (jedno na proces, otvára sa v init_worker)
+_worker_conn = None
+
+
+def parse_time(value):
+    """
+    Parses a timestamp/date as exported by psql COPY (e.g. '2025-03-19 18:18:47.12+00').
+
+    @param value: timestamp string
+    @return: timezone aware datetime (UTC if the value has no offset)
+    """
+    value = _FRACTION.sub(lambda m: "." + m.group(1).ljust(6, "0")[:6], value.strip())
+    parsed = datetime.fromisoformat(_TZ_SHORT.sub(r"\1:00", value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def get_chunk_interval(conn, table):
+    with conn.cursor() as cur:
+        cur.execute(GET_CHUNK_INTERVAL, (table,))
+        row = cur.fetchone()
+    conn.commit()
+    return row[0] if row and row[0] else DEFAULT_CHUNK_INTERVAL
+
+
+def get_chunk_ranges(conn, table):
+    """
+    @return: sorted list of (range_start, range_end) of the existing chunks
+    """
+    with conn.cursor() as cur:
+        cur.execute(GET_CHUNK_RANGES, (table,))
+        ranges = cur.fetchall()
+    conn.commit()
+    return ranges
+
+
+def chunk_start(value, interval, ranges=(), starts=None):
+    """
+    @param ranges: sorted (range_start, range_end) of the existing chunks
+    @param starts: range_start values of `ranges` (precomputed for bisect)
+    @return: start of the chunk that holds `value`
+    """
+    if starts is None:
+        starts = [start for start, _ in ranges]
+    i = bisect_right(starts, value) - 1
+    if i >= 0 and value < ranges[i][1]:
+        return ranges[i][0]
+    aligned = EPOCH + ((value - EPOCH) // interval) * interval
+    # a new chunk does not overlap the previous one, it starts where that one ends
+    return max(aligned, ranges[i][1]) if i >= 0 else aligned
+
+
+def split_csv_by_chunk(csv_path, time_column, interval, parts_dir, ranges=()):
+    """
+    Splits a CSV into one part file per hypertable chunk range.
+
+    @param csv_path: input CSV (with header)
+    @param time_column: partitioning column of the hypertable
+    @param interval: current chunk interval (timedelta), used beyond the existing chunks
+    @param parts_dir: output directory for the part files
+    @param ranges: sorted (range_start, range_end) of the existing chunks
+    @return: sorted list of part file paths
+    """
+    marker = os.path.join(parts_dir, SPLIT_DONE_MARKER)
+    if os.path.exists(marker):
+        print(f"Používam už rozdelené súbory v {parts_dir}")
+        return sorted(os.path.join(parts_dir, f) for f in os.listdir(parts_dir) if f.endswith(".csv"))
+
+    os.makedirs(parts_dir, exist_ok=True)
+    open_parts = {}
+    part_paths = set()
+    starts = [start for start, _ in ranges]
+
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            start = chunk_start(parse_time(row[time_column]), interval, ranges, starts)
+            part_path = os.path.join(parts_dir, f"{start.strftime('%Y%m%dT%H%M%S')}.csv")
+
+            if part_path not in open_parts:
+                if len(open_parts) >= MAX_OPEN_PARTS:
+                    for f, _ in open_parts.values():
+                        f.close()
+                    open_parts.clear()
+                new_part = part_path not in part_paths
+                f = open(part_path, "w" if new_part else "a", newline='', encoding='utf-8')
+                writer = csv.DictWriter(f, fieldnames=reader.fieldnames)
+                if new_part:
+                    writer.writeheader()
+                open_parts[part_path] = (f, writer)
+                part_paths.add(part_path)
+
+            open_parts[part_path][1].writerow(row)
+
+    for f, _ in open_parts.values():
+        f.close()
+    open(marker, "w").close()
+    return sorted(part_paths)
+
+
+def init_worker(conn_params):
+    global _worker_conn
+    _worker_conn = psycopg2.connect(**conn_params)
+
+
+def load_part(args):
+    part_path, spec_name, chunk_size = args
+    spec = RESTORE_SPECS[spec_name]
+    staging_table = f"{spec['table']}_staging_{os.path.splitext(os.path.basename(part_path))[0].lower()}"
+
+    start = time.perf_counter()
+    inserted = copy_csv_to_table(part_path, _worker_conn, spec["table"], spec["columns"], spec["convert_row"],
+                                 spec["conflict"], chunk_size=chunk_size, staging_table=staging_table,
+                                 skip_invalid=spec["skip_invalid"])
+    return os.getpid(), part_path, inserted, time.perf_counter() - start
+
+
+def parallel_restore(spec_name, csv_path, db, workers=os.cpu_count(), chunk_size=CHUNK_SIZE, parts_dir=None):
+    """
+    Restores a CSV dump into a hypertable with one worker process and connection per time range.
+
+    @param spec_name: key of RESTORE_SPECS (jams, jams_simplified, alerts, nehody)
+    @param csv_path: CSV dump exported with psql \\COPY
+    @param db: target database key of DB_PARAMS
+    @param workers: number of worker processes
+    @param chunk_size: CSV rows per COPY / commit inside a worker
+    @param parts_dir: directory for the part files (default <csv_path>.parts)
+    """
+    spec = RESTORE_SPECS[spec_name]
+    conn_params = DB_PARAMS[db]
+    parts_dir = parts_dir or f"{csv_path}.parts"
+
+    conn = psycopg2.connect(**conn_params)
+    try:
+        interval = get_chunk_interval(conn, spec["table"])
+        ranges = get_chunk_ranges(conn, spec["table"])
+    finally:
+        conn.close()
+
+    split_start = time.perf_counter()
+    parts = split_csv_by_chunk(csv_path, spec["time_column"], interval, parts_dir, ranges)
+    print(f"{len(parts)} časových rozsahov ({len(ranges)} existujúcich chunkov, nové po {interval}) "
+          f"rozdelených za {time.perf_counter() - split_start:.1f}s")
+
+    load_start = time.perf_counter()
+    per_worker = {}
+    with Pool(workers, initializer=init_worker, initargs=(conn_params,)) as pool:
+        tasks = [(part, spec_name, chunk_size) for part in parts]
+        for pid, part_path, inserted, seconds in pool.imap_unordered(load_part, tasks):
+            stats = per_worker.setdefault(pid, {"rows": 0, "seconds": 0.0, "parts": 0})
+            stats["rows"] += inserted
+            stats["seconds"] += seconds
+            stats["parts"] += 1
+            print(f"[worker {pid}] {os.path.basename(part_path)}: {inserted} riadkov za {seconds:.1f}s")
+    wall = time.perf_counter() - load_start
+
+    print("=" * 75)
+    total = 0
+    for pid, stats in sorted(per_worker.items()):
+        total += stats["rows"]
+        rate = stats["rows"] / stats["seconds"] if stats["seconds"] else 0
+        print(f"worker {pid}: {stats['parts']} rozsahov, {stats['rows']} riadkov, {rate:.0f} riadkov/s")
+    print(f"SPOLU: {total} riadkov do '{spec['table']}' za {wall:.1f}s ({total / wall if wall else 0:.0f} riadkov/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paralelné načítanie CSV dumpu do hypertable po chunkoch")
+    parser.add_argument("spec", choices=sorted(RESTORE_SPECS))
+    parser.add_argument("csv_path")
+    parser.add_argument("--db", choices=sorted(DB_PARAMS), default="brno")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    parallel_restore(args.spec, args.csv_path, args.db, workers=args.workers, chunk_size=args.chunk_size)
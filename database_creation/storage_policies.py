@@ -0,0 +1,206 @@
+"""
+Chunk interval, native compression and optional retention of the jams / alerts / nehody /
+segment_traffic hypertables.
+
+- chunk interval of jams and alerts follows the measured ingest rate (rows per day over the last
+  week), so a chunk holds about TARGET_CHUNK_ROWS rows; nehody are loaded once a year and
+  segment_traffic has one row per segment and hour, both get a fixed interval; a new interval
+  applies only to chunks created from now on
+- closed chunks are compressed, segmented by street / road_type and ordered by published_at;
+  chunks inside the window that the live ingester and the continuous aggregates still update
+  (COMPRESS_AFTER) stay uncompressed
+- a compressed chunk of jams / alerts has none of the row indexes of init.sql (GIST on jam_line /
+  location, street / published_at, BRIN on last_updated, the partial `active` indexes) and an UPDATE
+  filtering on active / uuid (not segmentby columns) has to decompress it. Therefore:
+  - COMPRESS_AFTER (30 days) is longer than every window that still reads or changes rows by these
+    columns: continuous aggregates (8 days), refresh_sum_statistics (7 days + 1 day of event duration),
+    refresh_nehody_links (2 days) and the dashboard queries of the last day / week
+  - jams and alerts are compressed by the job compress_closed_chunks (init.sql) instead of
+    add_compression_policy: it deactivates rows not updated for a day, skips chunks that still have
+    an active row (e.g. a road closure lasting months) and links all accidents in the DB
+    (link_nehody) before it compresses anything, so the links are computed with the indexes
+  - the live ingester limits its deactivation UPDATEs to published_at >= now() - COMPRESS_AFTER
+    (ACTIVE_WINDOW in ingest_jams_alerts_from_waze_live.py), so they never touch compressed chunks;
+    an older event still active is deactivated by the compression job once it stops being updated
+  - accidents loaded later (the yearly nehody import) are linked by refresh_nehody_links over
+    compressed chunks too; that is correct, only slower, as every accident day decompresses the
+    batches of its time range
+- raw data can be dropped after a retention period, but only for a table whose rollups
+  (jams_hourly, alerts_hourly from init.sql) exist and only beyond their refresh window
+
+Usage (project root on PYTHONPATH):
+    python storage_policies.py --db brno
+    python storage_policies.py --db brno --retention "730 days"
+"""
+import argparse
+import json
+from datetime import timedelta
+
+from connection_to_db import connection
+
+# ~10 000 jams per day in JMK (2-minute snapshots) => a chunk of jams covers about 3 weeks
+TARGET_CHUNK_ROWS = 200_000
+MIN_CHUNK_INTERVAL = timedelta(days=1)
+MAX_CHUNK_INTERVAL = timedelta(days=28)
+DEFAULT_CHUNK_INTERVAL = timedelta(days=7)
+
+# Must stay longer than every window that updates or looks up rows by non-segmentby columns
+# (see the module docstring) and equal to ACTIVE_WINDOW of the live ingester
+COMPRESS_AFTER = timedelta(days=30)
+
+# Columns of a unique index must be among segmentby/orderby columns, hence the uuid
+STORAGE_POLICIES = {
+    "jams": {
+        "time_column": "published_at", "chunk_interval": None,
+        "segment_by": "street, road_type", "order_by": "published_at DESC, uuid",
+        "rollups": ["jams_hourly"], "events": True,
+    },
+    "alerts": {
+        "time_column": "published_at", "chunk_interval": None,
+        "segment_by": "street, road_type", "order_by": "published_at DESC, uuid",
+        "rollups": ["alerts_hourly"], "events": True,
+    },
+    "nehody": {
+        "time_column": "p2a", "chunk_interval": timedelta(days=365),
+        "segment_by": "p36", "order_by": "p2a DESC, p1",
+        "rollups": [], "events": False,
+    },
+    "segment_traffic": {
+        "time_column": "bucket", "chunk_interval": timedelta(days=7),
+        "segment_by": "segment_id, is_forward", "order_by": "bucket DESC",
+        "rollups": [], "events": False,
+    },
+}
+
+# Retention must not drop chunks the continuous aggregates still refresh (start_offset 7 days)
+MIN_RETENTION = timedelta(days=8)
+
+GET_HYPERTABLE = """
+SELECT 1 FROM timescaledb_information.hypertables WHERE hypertable_name = %s
+"""
+
+GET_COMPRESSION_ENABLED = """
+SELECT compression_enabled FROM timescaledb_information.hypertables WHERE hypertable_name = %s
+"""
+
+GET_ROLLUPS = """
+SELECT view_name FROM timescaledb_information.continuous_aggregates WHERE hypertable_name = %s
+"""
+
+GET_COMPRESSION_JOB = """
+SELECT job_id FROM timescaledb_information.jobs
+WHERE proc_name = 'compress_closed_chunks' AND config->>'hypertable' = %s
+"""
+
+# Chunky s udalosťami (active, last_updated) sa kontrolujú raz denne
+COMPRESSION_JOB_INTERVAL = timedelta(days=1)
+
+GET_HYPERTABLE_SIZE = """
+SELECT hypertable_size(%s::regclass)
+"""
+
+
+def estimate_chunk_interval(cur, table, time_column):
+    """
+    @return: chunk interval holding about TARGET_CHUNK_ROWS rows at the ingest rate of the last week
+    """
+    cur.execute(f"SELECT count(*) FROM {table} WHERE {time_column} >= now() - INTERVAL '7 days'")
+    rows_per_day = cur.fetchone()[0] / 7
+    if not rows_per_day:
+        return DEFAULT_CHUNK_INTERVAL
+    interval = timedelta(days=round(TARGET_CHUNK_ROWS / rows_per_day) or 1)
+    return min(max(interval, MIN_CHUNK_INTERVAL), MAX_CHUNK_INTERVAL)
+
+
+def enable_compression(cur, table, policy, compress_after=COMPRESS_AFTER):
+    """
+    Turns on native compression (only once, the settings cannot change while chunks are compressed)
+    and schedules compression of chunks older than compress_after: the compress_closed_chunks job
+    for jams / alerts (see the module docstring), the plain compression policy for the other tables.
+    """
+    cur.execute(GET_COMPRESSION_ENABLED, (table,))
+    if not cur.fetchone()[0]:
+        cur.execute(f"ALTER TABLE {table} SET (timescaledb.compress, "
+                    f"timescaledb.compress_segmentby = '{policy['segment_by']}', "
+                    f"timescaledb.compress_orderby = '{policy['order_by']}')")
+    if not policy["events"]:
+        # added again, so a changed compress_after applies
+        cur.execute("SELECT remove_compression_policy(%s, if_exists => TRUE)", (table,))
+        cur.execute("SELECT add_compression_policy(%s, compress_after => %s)", (table, compress_after))
+        return
+
+    # a policy from an earlier version would compress chunks with live rows
+    cur.execute("SELECT remove_compression_policy(%s, if_exists => TRUE)", (table,))
+    config = json.dumps({"hypertable": table, "compress_after": f"{compress_after.days} days"})
+    cur.execute(GET_COMPRESSION_JOB, (table,))
+    row = cur.fetchone()
+    if row:
+        cur.execute("SELECT alter_job(%s, config => %s::JSONB)", (row[0], config))
+    else:
+        cur.execute("SELECT add_job('compress_closed_chunks', %s, config => %s::JSONB)",
+                    (COMPRESSION_JOB_INTERVAL, config))
+
+
+def add_retention(cur, table, policy, retention):
+    """
+    Drops raw chunks older than `retention`, only when the table has its rollups.
+    """
+    if retention < MIN_RETENTION:
+        raise ValueError(f"Retention {retention} is inside the refresh window of the rollups ({MIN_RETENTION})")
+    cur.execute(GET_ROLLUPS, (table,))
+    existing = {row[0] for row in cur.fetchall()}
+    missing = [view for view in policy["rollups"] if view not in existing]
+    if not policy["rollups"] or missing:
+        print(f"{table}: retencia sa nenastavila, "
+              f"chýbajú súhrny {', '.join(missing) or '(žiadne nie sú definované)'}")
+        return False
+    cur.execute("SELECT add_retention_policy(%s, drop_after => %s, if_not_exists => TRUE)", (table, retention))
+    return True
+
+
+def apply_storage_policies(db, retention=None, tables=None):
+    """
+    @param db: database name (data_sources.name or a key of connection_to_db.STATIC_PARAMS)
+    @param retention: timedelta after which raw data are dropped (None = keep everything)
+    @param tables: subset of STORAGE_POLICIES (default all)
+
+    Every table is committed on its own. A table that is not a hypertable is skipped and reported,
+    e.g. nehody: its primary key p1 does not contain p2a, so create_hypertable in init.sql fails.
+    """
+    with connection(db) as conn:
+        for table in tables or STORAGE_POLICIES:
+            policy = STORAGE_POLICIES[table]
+            with conn.cursor() as cur:
+                cur.execute(GET_HYPERTABLE, (table,))
+                if cur.fetchone() is None:
+                    conn.rollback()
+                    print(f"{table}: nie je hypertable, preskočená")
+                    continue
+                interval = policy["chunk_interval"] or estimate_chunk_interval(cur, table, policy["time_column"])
+                cur.execute("SELECT set_chunk_time_interval(%s, %s)", (table, interval))
+                enable_compression(cur, table, policy)
+                kept = "bez retencie"
+                if retention is not None and add_retention(cur, table, policy, retention):
+                    kept = f"retencia {retention}"
+                cur.execute(GET_HYPERTABLE_SIZE, (table,))
+                size = cur.fetchone()[0] or 0
+            conn.commit()
+            print(f"{table}: chunk {interval}, kompresia po {COMPRESS_AFTER}, {kept}, "
+                  f"veľkosť {size / 1024 ** 2:.1f} MB")
+
+
+def parse_days(value):
+    """
+    "730 days" / "730" -> timedelta(days=730)
+    """
+    return timedelta(days=int(value.split()[0]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nastavenie chunkov, kompresie a retencie hypertables")
+    parser.add_argument("--db", default="brno")
+    parser.add_argument("--table", action="append", choices=sorted(STORAGE_POLICIES))
+    parser.add_argument("--retention", type=parse_days, help='napr. "730 days", raw dáta staršie sa zmažú')
+    args = parser.parse_args()
+
+    apply_storage_policies(args.db, args.retention, args.table)
@@ -1,55 +1,86 @@
 import json
-import time
-import requests
-from datetime import datetime
+import asyncio
+import argparse
 import os
 
+from feed_fetcher import poll_feeds, parse_pairs, POLL_INTERVAL, LATENCY_LOG
+from snapshot_archive import append_snapshot
+from snapshot_delta import DeltaArchiveWriter
+
 keys = ["JMK", "ORP_MOST"]
 
 output_directories_dict = {"JMK": "./data_JMK/",
                            "ORP_MOST": "./data_ORP_MOST/"}
 
+# Archive mode: snapshots are appended to per-day compressed containers (see snapshot_archive.py)
+ARCHIVE_DIR = "./archive/"
+# Delta mode: keyframes plus changes between consecutive snapshots (see snapshot_delta.py)
+DELTA_ARCHIVE_DIR = "./archive_delta/"
+
 ## Add link to Waze for cities endpoints
 urls_json_dict = {"JMK": "data_jmk",
                   "ORP_MOST": "data_orp_most"}
 
 
-def download_json(key):
-    try:
-        response = requests.get(urls_json_dict[key])
-        response.raise_for_status()
+def save_snapshot(key, now, json_data, archive=False, delta_writer=None):
+    """
+    Stores one downloaded snapshot (called by the feed poller for every region and cycle).
 
-        # Parse the JSON content to ensure it's valid
-        json_data = response.json()
+    @param key: region key
+    @param now: time the download started (datetime)
+    @param json_data: parsed snapshot
+    @param archive: append to the compressed archive instead of a separate file
+    @param delta_writer: DeltaArchiveWriter of the region for the delta archive (None = not used)
+    """
+    if delta_writer is not None:
+        kind = delta_writer.append(now, json_data)
+        print(f"Snapshot archived: {key} {now.strftime('%Y-%m-%d_%H-%M-%S')} ({kind})")
+        return
 
-        # Generate a timestamped filename
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename = f"data_{key}_{timestamp}.json"
+    if archive:
+        offset = append_snapshot(ARCHIVE_DIR, key, now, json_data)
+        print(f"Snapshot archived: {key} {now.strftime('%Y-%m-%d_%H-%M-%S')} (offset {offset})")
+        return
 
-        # Ensure the output directory exists
-        if not os.path.exists(output_directories_dict[key]):
-            os.makedirs(output_directories_dict[key])
+    # Generate a timestamped filename
+    timestamp = now.strftime("%Y-%m-%d_%H-%M-%S")
+    filename = f"data_{key}_{timestamp}.json"
 
-        # Save the JSON content as a file
-        with open(os.path.join(output_directories_dict[key], filename), "w", encoding="utf-8") as file:
-            json.dump(json_data, file, indent=4)  # Save JSON with indentation for readability
+    # Ensure the output directory exists
+    if not os.path.exists(output_directories_dict[key]):
+        os.makedirs(output_directories_dict[key])
 
-        print(f"File saved: {filename}")
-    except requests.RequestException as e:
-        print(f"Failed to download the JSON file: {e}")
-    except json.JSONDecodeError as e:
-        print(f"Failed to parse JSON content: {e}")
+    # Save the JSON content as a file
+    with open(os.path.join(output_directories_dict[key], filename), "w", encoding="utf-8") as file:
+        json.dump(json_data, file, indent=4)  # Save JSON with indentation for readability
+
+    print(f"File saved: {filename}")
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Downloads Waze for Cities snapshots every 2 minutes")
+    parser.add_argument("--archive", action="store_true",
+                        help=f"append snapshots to per-day compressed containers in {ARCHIVE_DIR}")
+    parser.add_argument("--delta", action="store_true",
+                        help=f"store keyframes and deltas between consecutive snapshots in {DELTA_ARCHIVE_DIR}")
+    parser.add_argument("--url", action="append", metavar="KEY=URL",
+                        help="override the feed URL of a region, e.g. a local feed_stand_in.py")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="seconds between two snapshots")
+    parser.add_argument("--latency-log", default=LATENCY_LOG, help="CSV file with fetch latencies")
+    args = parser.parse_args()
+
+    urls_json_dict.update(parse_pairs(args.url))
+    delta_writers = {key: DeltaArchiveWriter(DELTA_ARCHIVE_DIR, key) if args.delta else None for key in keys}
     for key in keys:
-        if not os.path.exists(output_directories_dict[key]):
+        if not args.archive and not args.delta and not os.path.exists(output_directories_dict[key]):
             os.makedirs(output_directories_dict[key])
 
+    def handle(key, now, json_data):
+        save_snapshot(key, now, json_data, archive=args.archive, delta_writer=delta_writers[key])
+
     try:
-        while True:
-            download_json(keys[0])
-            download_json(keys[1])
-            time.sleep(120)  # Wait for 2 minutes (120 seconds)
+        # all regions are downloaded concurrently, each on a fixed 2-minute grid
+        asyncio.run(poll_feeds({key: urls_json_dict[key] for key in keys}, handle,
+                               interval=args.interval, latency_log=args.latency_log))
     except KeyboardInterrupt:
         print("Program terminated by user.")
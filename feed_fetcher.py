@@ -0,0 +1,140 @@
+"""
+Asynchronous polling of the Waze for Cities feeds (used by downloader.py and the live ingester).
+
+All regions share one aiohttp session (keep-alive connections are reused between cycles) and
+every region is polled by its own task on a drift-free schedule: the n-th fetch starts at
+start + n * interval no matter how long the previous download and processing took, so a slow
+endpoint delays neither the other regions nor the next snapshot of its own region. If a region
+misses whole ticks (a fetch with retries took longer than the interval), they are skipped.
+
+Every fetch is appended to a CSV latency log: started, key, latency_s, attempts, status.
+
+For local testing run feed_stand_in.py and point the feeds to it.
+"""
+import asyncio
+import csv
+import os
+from datetime import datetime
+
+import aiohttp
+
+# Waze updates the feeds every 2 minutes
+POLL_INTERVAL = 120
+# Per-region limit for one request, the retries are on top of it
+REQUEST_TIMEOUT = 30
+MAX_RETRIES = 3
+# Waits 2, 4, 8 ... seconds between attempts
+BACKOFF_BASE = 2
+LATENCY_LOG = "fetch_latency.csv"
+
+
+async def fetch_json(session, url, timeout=REQUEST_TIMEOUT, retries=MAX_RETRIES, backoff=BACKOFF_BASE):
+    """
+    Downloads and parses one feed, failed attempts are retried with exponential backoff.
+
+    @param session: shared aiohttp.ClientSession
+    @param url: feed URL
+    @param timeout: limit for one attempt in seconds
+    @param retries: number of retries after the first attempt
+    @param backoff: base of the exponential backoff in seconds
+    @return: (parsed JSON, number of attempts)
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None), attempt
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            if attempt > retries:
+                raise
+            delay = backoff ** attempt
+            print(f"[{datetime.now()}] Fetch {url} failed ({type(e).__name__}: {e}), "
+                  f"retry {attempt}/{retries} in {delay} s")
+            await asyncio.sleep(delay)
+
+
+def record_latency(path, started, key, latency, attempts, status):
+    """
+    Appends one fetch to the CSV latency log (the header is written into a new file).
+    """
+    if not path:
+        return
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(["started", "key", "latency_s", "attempts", "status"])
+        writer.writerow([started.isoformat(timespec="seconds"), key, f"{latency:.3f}", attempts, status])
+
+
+def parse_pairs(values, convert=str):
+    """
+    @param values: list of "KEY=VALUE" strings from the command line
+    @return: dictionary key -> converted value
+    """
+    pairs = {}
+    for value in values or []:
+        key, _, item = value.partition("=")
+        pairs[key] = convert(item)
+    return pairs
+
+
+async def poll_region(session, key, url, handler, start, interval=POLL_INTERVAL, timeout=REQUEST_TIMEOUT,
+                      retries=MAX_RETRIES, backoff=BACKOFF_BASE, latency_log=LATENCY_LOG, cycles=None):
+    """
+    Polls one region on the schedule start + n * interval and passes every snapshot to `handler`.
+
+    @param session: shared aiohttp.ClientSession
+    @param key: region key, e.g. "JMK"
+    @param url: feed URL of the region
+    @param handler: function(key, timestamp, data), runs in a worker thread so blocking I/O
+                    (files, database) does not stop the other regions
+    @param start: event loop time of the first fetch
+    @param interval: seconds between two fetches
+    @param latency_log: CSV file for fetch latencies (None = do not record)
+    @param cycles: stop after this many ticks (None = forever)
+    """
+    loop = asyncio.get_running_loop()
+    tick = 0
+    while cycles is None or tick < cycles:
+        await asyncio.sleep(max(0.0, start + tick * interval - loop.time()))
+        started = datetime.now()
+        t0 = loop.time()
+        try:
+            data, attempts = await fetch_json(session, url, timeout, retries, backoff)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            record_latency(latency_log, started, key, loop.time() - t0, retries + 1, "failed")
+            print(f"[{datetime.now()}] Fetch {key} failed, snapshot skipped: {type(e).__name__}: {e}")
+        else:
+            record_latency(latency_log, started, key, loop.time() - t0, attempts, "ok")
+            try:
+                await asyncio.to_thread(handler, key, started, data)
+            except Exception as e:
+                print(f"[{datetime.now()}] Processing {key} snapshot {started} failed: {type(e).__name__}: {e}")
+
+        # next tick on the fixed grid, ticks that already passed are skipped
+        tick += 1
+        missed = int((loop.time() - start) // interval) + 1 - tick
+        if missed > 0:
+            print(f"[{datetime.now()}] {key}: cycle overran, skipping {missed} snapshot(s)")
+            tick += missed
+
+
+async def poll_feeds(feeds, handler, interval=POLL_INTERVAL, timeout=REQUEST_TIMEOUT, retries=MAX_RETRIES,
+                     backoff=BACKOFF_BASE, latency_log=LATENCY_LOG, cycles=None):
+    """
+    Polls all regions concurrently with one shared HTTP session.
+
+    @param feeds: dictionary region key -> feed URL
+    @param handler: function(key, timestamp, data) called for every downloaded snapshot
+    @return: when all regions finished `cycles` ticks (never if cycles is None)
+    """
+    connector = aiohttp.TCPConnector(limit_per_host=len(feeds), keepalive_timeout=interval + timeout)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(*(
+            poll_region(session, key, url, handler, start, interval, timeout, retries, backoff, latency_log, cycles)
+            for key, url in feeds.items()
+        ))
@@ -0,0 +1,65 @@
+"""
+Local HTTP stand-in for the Waze for Cities feeds, for testing downloader.py and the ingester offline.
+
+GET /<KEY> returns the next downloaded snapshot of the region's directory (in a loop), optionally
+with an artificial delay and a share of failed (HTTP 503) responses to exercise timeouts and retries.
+
+    python feed_stand_in.py --feed JMK=./data_JMK/ --delay JMK=5 --fail-rate 0.2
+    python downloader.py --url JMK=http://127.0.0.1:8080/JMK --interval 10
+"""
+import argparse
+import glob
+import itertools
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from feed_fetcher import parse_pairs
+
+
+def make_handler(feeds, delays, fail_rate):
+    # one endless iterator of snapshot files per region, shared by the server threads
+    files = {key: itertools.cycle(sorted(glob.glob(os.path.join(folder, "*.json")))) for key, folder in feeds.items()}
+    lock = threading.Lock()
+
+    class FeedHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            key = self.path.strip("/")
+            if key not in files:
+                self.send_error(404, f"Unknown feed {key}")
+                return
+            time.sleep(delays.get(key, 0))
+            if random.random() < fail_rate:
+                self.send_error(503, "Simulated failure")
+                return
+            with lock:
+                path = next(files[key])
+            with open(path, "rb") as f:
+                body = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return FeedHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves downloaded snapshots as a local Waze feed")
+    parser.add_argument("--feed", action="append", required=True, metavar="KEY=DIR",
+                        help="region key and directory with its downloaded snapshots")
+    parser.add_argument("--delay", action="append", metavar="KEY=SECONDS", help="response delay of a region")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with HTTP 503")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_handler(parse_pairs(args.feed), parse_pairs(args.delay, float), args.fail_rate))
+    print(f"Serving {', '.join(parse_pairs(args.feed))} on http://127.0.0.1:{args.port}/<KEY>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Program terminated by user.")
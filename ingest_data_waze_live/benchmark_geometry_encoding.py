@@ -0,0 +1,167 @@
+"""
+Benchmark: WKT geometry path (to_linestring_wkt / to_point_wkt + ST_GeogFromText) vs. the EWKB path
+of geometry_encoding.py.
+
+The sample snapshots from merging_files/data_JMK are replayed through SnapshotIndex like in
+region_worker and the script measures
+- encoding time of all jam lines and alert points (WKT strings vs. EWKB),
+- how many jam lines the batch ingest sends without and with GeometryCache,
+- that both encodings give the same geometries (parsed back with shapely).
+
+With --db the server side is measured as well: EXPLAIN ANALYZE execution time of parsing the same
+lines by ST_GeogFromText, from hex EWKB (as COPY does for a GEOGRAPHY column) and by ST_GeogFromWKB.
+Nothing is written to the DB.
+
+Usage (from this directory, project root on PYTHONPATH):
+    python benchmark_geometry_encoding.py [data_dir] [--db] [--repeat 5]
+
+The target DB is taken from BENCHMARK_DSN, otherwise the Brno DB from connection_to_db is used.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import shapely
+
+from benchmark_jam_ingest import DATA_DIR, connect
+from geometry_encoding import GeometryCache, lines_ewkb_hex, line_ewkb, point_ewkb
+from ingest_jams_alerts_from_waze_live import to_linestring_wkt, to_point_wkt
+from snapshot_index import SnapshotIndex, JAM_TRACKED_FIELDS
+
+# Čas parsovania geometrií na serveri, nič sa nezapisuje
+DB_VARIANTS = {
+    "wkt": ("SELECT count(ST_GeogFromText(g)) FROM unnest(%s::text[]) AS g", "text"),
+    "ewkb hex": ("SELECT count(g::geography) FROM unnest(%s::text[]) AS g", "text"),
+    "ewkb bytea": ("SELECT count(ST_GeogFromWKB(g)) FROM unnest(%s::bytea[]) AS g", "bytea"),
+}
+
+
+def load_snapshots(data_dir):
+    snapshots = []
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".json"):
+            with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            snapshots.append((data.get("jams", []), data.get("alerts", [])))
+    return snapshots
+
+
+def best_of(repeat, func, *args):
+    """
+    :return: (shortest time of `repeat` runs in seconds, result of the last run)
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def sent_lines(snapshots):
+    """
+    Replays the snapshots through SnapshotIndex like region_worker (batch mode).
+
+    :return: (jams whose line is sent without the cache, jams whose line is sent with GeometryCache)
+    """
+    jam_index = SnapshotIndex(JAM_TRACKED_FIELDS)
+    geometry_cache = GeometryCache()
+    seen_at = datetime(2025, 3, 19, 18, 0)
+    without_cache, with_cache = [], []
+    for jams, _ in snapshots:
+        seen_at += timedelta(minutes=2)
+        changed, repeats, _ = jam_index.diff("benchmark", jams, seen_at, seen_at)
+        for batch in ([jam for jam, _, _ in repeats], changed):
+            if batch:
+                without_cache.extend(batch)
+                with_cache.extend(jam for jam, send in zip(batch, geometry_cache.missing(batch)) if send)
+                geometry_cache.add(batch)
+    return without_cache, with_cache
+
+
+def same_geometries(lines, wkt, ewkb):
+    parsed_wkt = shapely.from_wkt(wkt)
+    parsed_ewkb = shapely.from_wkb(ewkb)
+    return (all(shapely.equals_exact(parsed_wkt, parsed_ewkb, tolerance=0))
+            and set(shapely.get_srid(parsed_ewkb)) == {4326}
+            and len(parsed_ewkb) == len(lines))
+
+
+def db_times(lines, repeat):
+    """
+    :return: {variant: shortest server execution time in ms}
+    """
+    values = {
+        "text": {"wkt": [to_linestring_wkt(line) for line in lines], "ewkb hex": lines_ewkb_hex(lines)},
+        "bytea": [line_ewkb(line) for line in lines],
+    }
+    conn = connect()
+    times = {}
+    try:
+        with conn.cursor() as cur:
+            for variant, (query, kind) in DB_VARIANTS.items():
+                param = values["bytea"] if kind == "bytea" else values["text"][variant]
+                runs = []
+                for _ in range(repeat):
+                    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, (param,))
+                    runs.append(cur.fetchone()[0][0]["Execution Time"])
+                times[variant] = min(runs)
+        conn.rollback()
+    finally:
+        conn.close()
+    return times
+
+
+def main(data_dir, repeat, db):
+    snapshots = load_snapshots(data_dir)
+    lines = [jam["line"] for jams, _ in snapshots for jam in jams if jam.get("line")]
+    locations = [alert["location"] for _, alerts in snapshots for alert in alerts if alert.get("location")]
+    points = sum(len(line) for line in lines)
+    print(f"{len(snapshots)} snapshotov, {len(lines)} línií jamov ({points} bodov), {len(locations)} bodov alertov")
+
+    wkt_seconds, wkt = best_of(repeat, lambda: [to_linestring_wkt(line) for line in lines])
+    hex_seconds, ewkb_hex = best_of(repeat, lines_ewkb_hex, lines)
+    bytes_seconds, _ = best_of(repeat, lambda: [line_ewkb(line) for line in lines])
+    point_wkt_seconds, _ = best_of(repeat, lambda: [to_point_wkt(location) for location in locations])
+    point_ewkb_seconds, _ = best_of(repeat, lambda: [point_ewkb(location) for location in locations])
+
+    print(f"{'kódovanie':<32}{'spolu':>10}{'na geometriu':>16}")
+    for name, seconds, count in (("línie WKT", wkt_seconds, len(lines)),
+                                 ("línie EWKB hex (COPY)", hex_seconds, len(lines)),
+                                 ("línie EWKB bytea (po jednej)", bytes_seconds, len(lines)),
+                                 ("body WKT", point_wkt_seconds, len(locations)),
+                                 ("body EWKB bytea", point_ewkb_seconds, len(locations))):
+        print(f"{name:<32}{seconds * 1000:>8.1f}ms{seconds / max(count, 1) * 1e6:>14.2f}us")
+    print(f"zrýchlenie kódovania línií (COPY): {wkt_seconds / hex_seconds:.1f}x")
+
+    if same_geometries(lines, wkt, ewkb_hex):
+        print("Geometrie WKT a EWKB sú zhodné.")
+    else:
+        print("POZOR: geometrie WKT a EWKB sa líšia")
+
+    without_cache, with_cache = sent_lines(snapshots)
+    print(f"línie odoslané dávkovým ingestom: bez cache {len(without_cache)}, s GeometryCache {len(with_cache)}")
+    sent_wkt, _ = best_of(repeat, lambda: [to_linestring_wkt(jam["line"]) for jam in without_cache])
+    sent_ewkb, _ = best_of(repeat, lines_ewkb_hex, [jam["line"] for jam in with_cache])
+    print(f"kódovanie odoslaných línií: WKT {sent_wkt * 1000:.1f}ms, EWKB s cache {sent_ewkb * 1000:.1f}ms "
+          f"({sent_wkt / max(sent_ewkb, 1e-9):.1f}x)")
+
+    if db:
+        times = db_times(lines, repeat)
+        print(f"{'parsovanie na serveri':<32}{'čas':>10}")
+        for variant, ms in times.items():
+            print(f"{variant:<32}{ms:>8.1f}ms")
+        print(f"zrýchlenie na serveri (ewkb hex oproti wkt): {times['wkt'] / times['ewkb hex']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kódovanie geometrií: WKT oproti EWKB")
+    parser.add_argument("data_dir", nargs="?", default=DATA_DIR)
+    parser.add_argument("--repeat", type=int, default=5, help="počet opakovaní, berie sa najkratší čas")
+    parser.add_argument("--db", action="store_true", help="zmerať aj parsovanie geometrií v DB")
+    args = parser.parse_args()
+
+    main(args.data_dir, args.repeat, args.db)
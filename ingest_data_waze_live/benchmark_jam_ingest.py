@@ -0,0 +1,117 @@
+"""
+Benchmark: per-row jam ingest (process_jams) vs. set-based ingest (process_jams_batch).
+
+Both paths replay the sample snapshots from merging_files/data_JMK into their own scratch
+schema (copies of the `jams` and `segments` tables), so production data is never touched.
+The scratch schemas are dropped at the end.
+
+Usage (from this directory, project root on PYTHONPATH):
+    python benchmark_jam_ingest.py [data_dir]
+
+The target DB is taken from BENCHMARK_DSN, otherwise the Brno DB from connection_to_db is used.
+"""
+import json
+import os
+import sys
+import time
+
+import psycopg2
+
+from connection_to_db import conn_params_brno
+from ingest_jams_alerts_from_waze_live import process_jams, process_jams_batch
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "merging_files", "data_JMK")
+
+MODES = {
+    "row": process_jams,
+    "batch": process_jams_batch,
+}
+
+# Hodnoty, ktoré musia byť po oboch behoch rovnaké
+CHECK_QUERY = """
+SELECT count(*), sum(update_count),
+       round(sum(jam_level_avg)::numeric, 6), sum(jam_level_max),
+       round(sum(speed_kmh_avg)::numeric, 6), sum(speed_kmh_min),
+       round(sum(jam_length_avg)::numeric, 6), sum(jam_length_max),
+       round(sum(speed_avg)::numeric, 6), round(sum(speed_max)::numeric, 6),
+       round(sum(delay_avg)::numeric, 6), sum(delay_max)
+FROM jams
+"""
+
+
+def connect():
+    dsn = os.getenv("BENCHMARK_DSN")
+    if dsn:
+        return psycopg2.connect(dsn)
+    return psycopg2.connect(**conn_params_brno)
+
+
+def create_scratch_schema(conn, schema):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"CREATE TABLE {schema}.jams (LIKE public.jams INCLUDING ALL)")
+        cur.execute(f"CREATE TABLE {schema}.segments (LIKE public.segments INCLUDING ALL)")
+        cur.execute(f"SET search_path TO {schema}, public")
+    conn.commit()
+
+
+def load_snapshots(data_dir):
+    snapshots = []
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".json"):
+            with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+                snapshots.append((filename, json.load(f).get("jams", [])))
+    return snapshots
+
+
+def run_mode(conn, mode, snapshots):
+    schema = f"bench_ingest_{mode}"
+    create_scratch_schema(conn, schema)
+    ingest = MODES[mode]
+
+    timings = []
+    for _, jams in snapshots:
+        start = time.perf_counter()
+        ingest(conn, jams)
+        timings.append(time.perf_counter() - start)
+
+    with conn.cursor() as cur:
+        cur.execute(CHECK_QUERY)
+        check = cur.fetchone()
+        cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        cur.execute("SET search_path TO public")
+    conn.commit()
+    return timings, check
+
+
+def main():
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else DATA_DIR
+    snapshots = load_snapshots(data_dir)
+    total_jams = sum(len(jams) for _, jams in snapshots)
+    print(f"{len(snapshots)} snapshotov, {total_jams} jamov spolu")
+
+    conn = connect()
+    try:
+        results = {mode: run_mode(conn, mode, snapshots) for mode in MODES}
+    finally:
+        conn.close()
+
+    print(f"{'snapshot':<40}" + "".join(f"{mode:>12}" for mode in MODES))
+    for i, (filename, _) in enumerate(snapshots):
+        print(f"{filename:<40}" + "".join(f"{results[mode][0][i] * 1000:>10.1f}ms" for mode in MODES))
+
+    totals = {mode: sum(results[mode][0]) for mode in MODES}
+    print(f"{'SPOLU':<40}" + "".join(f"{totals[mode]:>11.2f}s" for mode in MODES))
+    for mode in MODES:
+        print(f"{mode}: {total_jams / totals[mode]:.0f} jamov/s")
+    print(f"zrýchlenie batch oproti row: {totals['row'] / totals['batch']:.1f}x")
+
+    if results["row"][1] == results["batch"][1]:
+        print("Výsledné tabuľky sú zhodné.")
+    else:
+        print(f"POZOR: výsledky sa líšia\n  row:   {results['row'][1]}\n  batch: {results['batch'][1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Binary (EWKB) encoding of jam lines and alert points for the ingester.
+
+WKT strings are built with string joins point by point and PostGIS has to parse the text again.
+Here the coordinates of a whole snapshot go into one little-endian float64 array, every geometry
+is the fixed EWKB header (byte order, type with the SRID flag, SRID 4326, number of points)
+followed by its slice of that array. The batch path sends the geometries as hex EWKB through
+COPY straight into a GEOGRAPHY column, the row path and alerts bind them as bytea for
+ST_GeogFromWKB.
+
+A jam keeps its first line in the DB (the upsert only fills a missing jam_line), so the line of a
+jam that is already stored is not encoded nor sent at all; GeometryCache remembers these jams. Jams
+are added to it only after their transaction commits, and the ingester still checks that every
+skipped line is stored (a row may be gone, e.g. by retention) and sends the line if it is not.
+"""
+import struct
+from collections import OrderedDict
+
+import numpy as np
+
+SRID = 4326
+EWKB_SRID_FLAG = 0x20000000
+EWKB_POINT = 1 | EWKB_SRID_FLAG
+EWKB_LINESTRING = 2 | EWKB_SRID_FLAG
+LITTLE_ENDIAN = 1
+
+LINE_HEADER = struct.Struct("<BIII")
+POINT_HEADER = struct.Struct("<BII")
+COORDINATE_BYTES = 16
+
+# About 10x the live jams of a large region
+GEOMETRY_CACHE_SIZE = 20_000
+
+
+def line_coordinates(lines):
+    """
+    :param lines: list of jam lines [{"x": .., "y": ..}, ...]
+    :return: (float64 array x0, y0, x1, y1, ... of all lines, list of point counts)
+    """
+    lengths = [len(line) for line in lines]
+    coords = np.fromiter((value for line in lines for pt in line for value in (pt["x"], pt["y"])),
+                         dtype="<f8", count=2 * sum(lengths))
+    return coords, lengths
+
+
+def lines_ewkb_hex(lines):
+    """
+    :param lines: list of jam lines
+    :return: list of hex EWKB strings (LINESTRING, SRID 4326), accepted by a GEOGRAPHY column in COPY
+    """
+    coords, lengths = line_coordinates(lines)
+    # one hex conversion for the whole snapshot, each line is a slice of it
+    coords_hex = coords.tobytes().hex()
+    encoded = []
+    offset = 0
+    for length in lengths:
+        end = offset + 2 * COORDINATE_BYTES * length
+        encoded.append(LINE_HEADER.pack(LITTLE_ENDIAN, EWKB_LINESTRING, SRID, length).hex() + coords_hex[offset:end])
+        offset = end
+    return encoded
+
+
+def line_ewkb(line):
+    """
+    :param line: jam line [{"x": .., "y": ..}, ...]
+    :return: EWKB bytes (LINESTRING, SRID 4326)
+    """
+    coords, lengths = line_coordinates([line])
+    return LINE_HEADER.pack(LITTLE_ENDIAN, EWKB_LINESTRING, SRID, lengths[0]) + coords.tobytes()
+
+
+def point_ewkb(location):
+    """
+    :param location: alert location {"x": .., "y": ..}
+    :return: EWKB bytes (POINT, SRID 4326)
+    """
+    return POINT_HEADER.pack(LITTLE_ENDIAN, EWKB_POINT, SRID) + struct.pack("<dd", location["x"], location["y"])
+
+
+class GeometryCache:
+    """
+    Least recently used set of jams (uuid, pubMillis) whose line is already stored in the region DB.
+    """
+
+    def __init__(self, max_size=GEOMETRY_CACHE_SIZE):
+        self.max_size = max_size
+        self.keys = OrderedDict()
+
+    def missing(self, jams):
+        """
+        Tells which jams still need their line sent.
+
+        :param jams: list of jam dictionaries
+        :return: list of booleans, True for a jam whose line has to be sent
+        """
+        missing = []
+        for jam in jams:
+            key = (jam["uuid"], jam["pubMillis"])
+            if key in self.keys:
+                self.keys.move_to_end(key)
+                missing.append(False)
+            else:
+                missing.append(True)
+        return missing
+
+    def add(self, jams):
+        """
+        Remembers the lines of the jams as stored, call it only after the transaction committed.
+
+        :param jams: list of jam dictionaries
+        """
+        for jam in jams:
+            key = (jam["uuid"], jam["pubMillis"])
+            self.keys[key] = None
+            self.keys.move_to_end(key)
+
+        while len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+
+    def clear(self):
+        """
+        Forgets everything, e.g. after a rolled back transaction.
+        """
+        self.keys.clear()
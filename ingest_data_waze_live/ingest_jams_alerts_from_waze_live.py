@@ -1,16 +1,37 @@
 import os
-from datetime import datetime
-import requests
-import time
+import asyncio
+import threading
+from datetime import datetime, timedelta
 
 from dotenv import load_dotenv
+from psycopg2 import Binary
 from psycopg2.extras import execute_values
 
-from connection_to_db import CONN_BRNO, CONN_JMK, CONN_ORP_MOST
-from queries import GET_ACTIVE_JAM, UPDATE_EXISTING_JAM, INSERT_NEW_JAM, INSERT_SEGMENTS, INSERT_NEW_ALERT
+from connection_to_db import connection
+from feed_fetcher import poll_feeds
+from geometry_encoding import GeometryCache, lines_ewkb_hex, line_ewkb, point_ewkb
+from pg_copy import copy_rows
+from region_router import RegionRouter
+from segment_cache import SegmentCache
+from segment_traffic import SegmentTraffic, CYCLE_GAP
+from queries import GET_ACTIVE_JAM, UPDATE_EXISTING_JAM, INSERT_NEW_JAM, INSERT_SEGMENTS, INSERT_NEW_ALERT, \
+    CREATE_JAMS_STAGE, CLEAR_JAMS_STAGE, JAMS_STAGE_COLUMNS, UPSERT_JAMS_FROM_STAGE, DEACTIVATE_MISSING_JAMS, \
+    DEACTIVATE_MISSING_ALERTS, DEACTIVATE_JAMS, DEACTIVATE_ALERTS, GET_ACTIVE_JAM_UUIDS, GET_ACTIVE_ALERT_UUIDS, \
+    GET_STAGE_JAMS_WITHOUT_LINE, SET_STAGE_JAM_LINES, STAGE_JAM_LINES_TEMPLATE
+from snapshot_index import SnapshotIndex, JAM_TRACKED_FIELDS, ALERT_TRACKED_FIELDS
 
 load_dotenv()
 
+# "batch" = celý snapshot cez COPY + jeden UPSERT, "row" = pôvodný SELECT + UPDATE/INSERT pre každý jam
+JAM_INGEST_MODE = os.getenv("JAM_INGEST_MODE", "batch")
+
+# Aktívna udalosť mimo indexu snapshotov bez aktualizácie dlhšie ako STALE_MINUTES sa deaktivuje (poistka)
+STALE_MINUTES = 3
+
+# Chunky jamov a alertov staršie ako toto sa môžu komprimovať (COMPRESS_AFTER v storage_policies.py),
+# deaktivácia sa ich nedotýka
+ACTIVE_WINDOW = timedelta(days=30)
+
 
 def to_linestring_wkt(line_points):
     return "LINESTRING(" + ", ".join(f"{pt['x']} {pt['y']}" for pt in line_points) + ")"
@@ -20,42 +41,65 @@ def to_point_wkt(location_dict):
     return f"POINT({location_dict['x']} {location_dict['y']})"
 
 
-def get_data(url):
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
+def deactivate_missing_records(conn, alert_uuids, jam_uuids, minutes=STALE_MINUTES):
+    """
+    Deactivates active events of the region other than the given ones.
 
+    Only active rows are visited (partial indexes idx_jams_active / idx_alerts_active), so the cost
+    follows the number of live events, not the whole history. Rows updated within the last
+    `minutes` are kept, so an event missing from a single snapshot is not ended too early. Only rows
+    published within ACTIVE_WINDOW are visited, compressed chunks are never touched.
 
-def deactivate_stale_records(conn, minutes=3):
+    :param alert_uuids: uuids of the alerts the region still has
+    :param jam_uuids: uuids of the jams the region still has
+    """
     cur = conn.cursor()
+    now = datetime.utcnow()
+    stale_before = now - timedelta(minutes=minutes)
+    active_since = now - ACTIVE_WINDOW
 
-    cur.execute("""
-        UPDATE alerts
-        SET active = FALSE
-        WHERE active = TRUE AND last_updated < now() - interval %s;
-    """, (f"{minutes} minutes",))
-
-    cur.execute("""
-        UPDATE jams
-        SET active = FALSE
-        WHERE active = TRUE AND last_updated < now() - interval %s;
-    """, (f"{minutes} minutes",))
+    cur.execute(DEACTIVATE_MISSING_ALERTS, {"active_since": active_since, "stale_before": stale_before,
+                                            "uuids": list(alert_uuids)})
+    cur.execute(DEACTIVATE_MISSING_JAMS, {"active_since": active_since, "stale_before": stale_before,
+                                          "uuids": list(jam_uuids)})
 
     conn.commit()
 
 
-def process_jams(conn, jams):
+def deactivate_records(conn, alert_uuids, jam_uuids, commit=True):
+    """
+    Deactivates the given events (found missing by the snapshot index), only within ACTIVE_WINDOW.
+
+    :param commit: commit the transaction (False = the caller commits)
+    """
+    cur = conn.cursor()
+    active_since = datetime.utcnow() - ACTIVE_WINDOW
+    if alert_uuids:
+        cur.execute(DEACTIVATE_ALERTS, {"active_since": active_since, "uuids": list(alert_uuids)})
+    if jam_uuids:
+        cur.execute(DEACTIVATE_JAMS, {"active_since": active_since, "uuids": list(jam_uuids)})
+    if commit:
+        conn.commit()
+
+
+def process_jams(conn, jams, weights=None, seen_at=None, segments=True, segment_cache=None, commit=True):
     """
     :param jams: list of jam dictionaries filtered for Brno
     :param conn: dict with db connection info {dbname, user, password, host, port}
+    :param weights: number of snapshots every jam stands for (default 1 each)
+    :param seen_at: last time every jam was seen (default now)
+    :param segments: also insert the jams' segments
+    :param segment_cache: SegmentCache of the region, segments already stored are not sent again
+    :param commit: commit the transaction (False = the caller commits)
     """
     cur = conn.cursor()
     now = datetime.utcnow()
+    weights = weights or [1] * len(jams)
+    seen_at = seen_at or [now] * len(jams)
 
-    for jam in jams:
+    for jam, weight, last_updated in zip(jams, weights, seen_at):
         uuid = jam["uuid"]
         published_at = datetime.utcfromtimestamp(jam["pubMillis"] / 1000)
-        jam_line = to_linestring_wkt(jam["line"])
 
         cur.execute(GET_ACTIVE_JAM, (uuid, published_at))
         existing = cur.fetchone()
@@ -69,14 +113,14 @@ def process_jams(conn, jams):
                 delay_avg, delay_max
             ) = existing
 
-            new_uc = update_count + 1
+            new_uc = update_count + weight
 
             # prepočet vážených priemerov
-            jam_level_avg = (jam_level_avg * update_count + jam["level"]) / new_uc
-            speed_kmh_avg = (speed_kmh_avg * update_count + jam["speedKMH"]) / new_uc
-            jam_length_avg = (jam_length_avg * update_count + jam["length"]) / new_uc
-            speed_avg = (speed_avg * update_count + jam["speed"]) / new_uc
-            delay_avg = (delay_avg * update_count + jam["delay"]) / new_uc
+            jam_level_avg = (jam_level_avg * update_count + jam["level"] * weight) / new_uc
+            speed_kmh_avg = (speed_kmh_avg * update_count + jam["speedKMH"] * weight) / new_uc
+            jam_length_avg = (jam_length_avg * update_count + jam["length"] * weight) / new_uc
+            speed_avg = (speed_avg * update_count + jam["speed"] * weight) / new_uc
+            delay_avg = (delay_avg * update_count + jam["delay"] * weight) / new_uc
 
             cur.execute(UPDATE_EXISTING_JAM, (
                 jam_level_avg, jam["level"],
@@ -84,7 +128,7 @@ def process_jams(conn, jams):
                 jam_length_avg, jam["length"],
                 speed_avg, jam["speed"],
                 delay_avg, jam["delay"],
-                new_uc, now, uuid
+                new_uc, last_updated, uuid
             ))
 
         else:
@@ -109,41 +153,130 @@ def process_jams(conn, jams):
                 "speed_avg": jam["speed"],
                 "delay_max": jam["delay"],
                 "delay_avg": jam["delay"],
-                "update_count": 1,
-                "jam_line": jam_line,
+                "update_count": weight,
+                # the line is encoded only for a new jam, an existing one keeps its stored line
+                "jam_line": Binary(line_ewkb(jam["line"])),
                 "published_at": published_at,
-                "last_updated": now,
+                "last_updated": last_updated,
                 "active": True
             }
 
             cur.execute(INSERT_NEW_JAM, jam_data)
 
         # Vloženie segmentov
-        segments = jam.get("segments", [])
-        if segments:
-            segment_values = [
-                (
-                    jam["id"],
-                    seg["fromNode"],
-                    seg["toNode"],
-                    seg["ID"],
-                    seg["isForward"]
-                ) for seg in segments
-            ]
+        segment_values = jam_segment_values(jam) if segments else []
+        if segment_cache is not None:
+            segment_values = segment_cache.new(segment_values)
+        if segment_values:
             execute_values(cur, INSERT_SEGMENTS, segment_values)
 
-    conn.commit()
+    if commit:
+        conn.commit()
+
+
+def jam_segment_values(jam):
+    return [
+        (
+            jam["id"],
+            seg["fromNode"],
+            seg["toNode"],
+            seg["ID"],
+            seg["isForward"]
+        ) for seg in jam.get("segments", [])
+    ]
 
 
-def process_alerts(conn, alerts):
+def process_jams_batch(conn, jams, weights=None, seen_at=None, segments=True, segment_cache=None,
+                       geometry_cache=None, commit=True):
+    """
+    Set-based variant of process_jams - the whole snapshot is sent in a few statements.
+
+    Jams are COPY-ed into a temporary stage table and merged into `jams` with a single
+    INSERT ... ON CONFLICT DO UPDATE, weighted averages and GREATEST/LEAST are computed by the DB.
+    Lines go as hex EWKB (geometry_encoding.py), only for jams whose line is not stored yet; a skipped
+    line that the DB does not have after all is sent before the merge, so no jam is inserted without a line.
+
+    :param jams: list of jam dictionaries filtered for the region
+    :param conn: psycopg2 connection
+    :param weights: number of snapshots every jam stands for (default 1 each)
+    :param seen_at: last time every jam was seen (default now)
+    :param segments: also insert the jams' segments
+    :param segment_cache: SegmentCache of the region, segments already stored are not sent again
+    :param geometry_cache: GeometryCache of the region, lines already stored are not sent again
+    :param commit: commit the transaction and add the lines to geometry_cache (False = the caller does both)
+    """
+    cur = conn.cursor()
+    now = datetime.utcnow()
+    weights = weights or [1] * len(jams)
+    seen_at = seen_at or [now] * len(jams)
+
+    missing = geometry_cache.missing(jams) if geometry_cache is not None else [True] * len(jams)
+    encoded = iter(lines_ewkb_hex([jam["line"] for jam, send in zip(jams, missing) if send]))
+    jam_lines = [next(encoded) if send else None for send in missing]
+
+    stage_rows = (
+        (
+            jam["id"],
+            jam["uuid"],
+            jam.get("country"),
+            jam.get("city"),
+            jam.get("turnType"),
+            jam.get("street"),
+            jam.get("endNode"),
+            None,  # start_node
+            jam.get("roadType"),
+            jam.get("blockingAlertUuid"),
+            jam["level"],
+            jam["speedKMH"],
+            jam["length"],
+            jam["speed"],
+            jam["delay"],
+            jam_line,
+            datetime.utcfromtimestamp(jam["pubMillis"] / 1000),
+            weight,
+            last_updated
+        ) for jam, jam_line, weight, last_updated in zip(jams, jam_lines, weights, seen_at)
+    )
+
+    cur.execute(CREATE_JAMS_STAGE)
+    cur.execute(CLEAR_JAMS_STAGE)
+    if copy_rows(cur, "jams_stage", JAMS_STAGE_COLUMNS, stage_rows):
+        if not all(missing):
+            cur.execute(GET_STAGE_JAMS_WITHOUT_LINE)
+            without_line = {row[0] for row in cur.fetchall()}
+            skipped = [jam for jam, send in zip(jams, missing) if not send and jam["uuid"] in without_line]
+            if skipped:
+                execute_values(cur, SET_STAGE_JAM_LINES, [
+                    (jam["uuid"], datetime.utcfromtimestamp(jam["pubMillis"] / 1000), jam_line)
+                    for jam, jam_line in zip(skipped, lines_ewkb_hex([jam["line"] for jam in skipped]))
+                ], template=STAGE_JAM_LINES_TEMPLATE)
+        cur.execute(UPSERT_JAMS_FROM_STAGE)
+
+    # Vloženie segmentov - jeden príkaz pre celý snapshot
+    segment_values = [value for jam in jams for value in jam_segment_values(jam)] if segments else []
+    if segment_cache is not None:
+        segment_values = segment_cache.new(segment_values)
+    if segment_values:
+        execute_values(cur, INSERT_SEGMENTS, segment_values, page_size=1000)
+
+    if commit:
+        conn.commit()
+        if geometry_cache is not None:
+            geometry_cache.add(jams)
+
+
+def process_alerts(conn, alerts, seen_at=None, commit=True):
     """
     :param alerts: list of alerts dicts filtered for Brno
     :param conn: dict with db connection info
+    :param seen_at: last time every alert was seen (default now)
+    :param commit: commit the transaction (False = the caller commits)
     """
     cur = conn.cursor()
     now = datetime.utcnow()
+    seen_at = seen_at or [now] * len(alerts)
 
-    for alert in alerts_brno:
+    for alert, last_updated in zip(alerts, seen_at):
         uuid = alert["uuid"]
         published_at = datetime.utcfromtimestamp(alert["pubMillis"] / 1000)
 
@@ -161,63 +294,230 @@ def process_alerts(conn, alerts):
             "magvar": alert.get("magvar"),
             "report_by_municipality_user": alert.get("reportByMunicipalityUser", "false").lower() == "true",
             "report_description": alert.get("reportDescription", None),
-            "location": to_point_wkt(alert["location"]),
+            "location": Binary(point_ewkb(alert["location"])),
             "published_at": published_at,
-            "last_updated": now,
+            "last_updated": last_updated,
             "active": True
         }
 
         cur.execute(INSERT_NEW_ALERT, alert_data)
 
+    if commit:
+        conn.commit()
+
+
+def main_loop(conn, alerts, jams, segment_cache=None, geometry_cache=None, commit=True):
+    if JAM_INGEST_MODE == "row":
+        process_jams(conn, jams, segment_cache=segment_cache, commit=commit)
+    else:
+        process_jams_batch(conn, jams, segment_cache=segment_cache, geometry_cache=geometry_cache, commit=commit)
+    process_alerts(conn, alerts, commit=commit)
+
+
+def load_indexes(conn, alert_index, jam_index):
+    """
+    Makes the snapshot indexes match the active events of the region DB (at startup and after a failed ingest,
+    when the index may no longer match the DB). Unwritten occurrences of the tracked events are kept.
+    """
+    loaded_at = datetime.utcnow()
+    with conn.cursor() as cur:
+        cur.execute(GET_ACTIVE_ALERT_UUIDS)
+        alert_index.load((row[0] for row in cur.fetchall()), loaded_at)
+        cur.execute(GET_ACTIVE_JAM_UUIDS)
+        jam_index.load((row[0] for row in cur.fetchall()), loaded_at)
+    conn.rollback()
+
+
+def write_repeats(conn, alert_repeats, jam_repeats, geometry_cache=None, commit=True):
+    """
+    Writes unchanged occurrences of events, every event once with their number as weight.
+
+    :param alert_repeats: list of (alert, unchanged occurrences, last seen) from SnapshotIndex
+    :param jam_repeats: list of (jam, unchanged occurrences, last seen) from SnapshotIndex
+    :param geometry_cache: GeometryCache of the region (batch mode)
+    :param commit: commit the transaction (False = the caller commits and adds the jams to geometry_cache)
+    """
+    if jam_repeats:
+        repeated = [jam for jam, _, _ in jam_repeats]
+        weights, seen_at = [n for _, n, _ in jam_repeats], [seen for _, _, seen in jam_repeats]
+        if JAM_INGEST_MODE == "row":
+            process_jams(conn, repeated, weights=weights, seen_at=seen_at, segments=False, commit=commit)
+        else:
+            process_jams_batch(conn, repeated, weights=weights, seen_at=seen_at, segments=False,
+                               geometry_cache=geometry_cache, commit=commit)
+    if alert_repeats:
+        process_alerts(conn, [alert for alert, _, _ in alert_repeats], seen_at=[seen for _, _, seen in alert_repeats],
+                       commit=commit)
+
+
+def ingest_changes(conn, alerts, jams, alert_repeats, jam_repeats, alert_ended, jam_ended, segment_cache=None,
+                   geometry_cache=None):
+    """
+    Writes one snapshot diff: new and changed events, the pending unchanged occurrences of the events
+    that changed or disappeared (as weights) and the ended events, all in one transaction.
+
+    :param alert_repeats: list of (alert, unchanged occurrences, last seen) from SnapshotIndex.diff
+    :param jam_repeats: list of (jam, unchanged occurrences, last seen) from SnapshotIndex.diff
+    :param segment_cache: SegmentCache of the region
+    :param geometry_cache: GeometryCache of the region (batch mode)
+    """
+    write_repeats(conn, alert_repeats, jam_repeats, geometry_cache, commit=False)
+    main_loop(conn, alerts, jams, segment_cache, geometry_cache, commit=False)
+    deactivate_records(conn, alert_ended, jam_ended, commit=False)
     conn.commit()
+    if geometry_cache is not None and JAM_INGEST_MODE != "row":
+        geometry_cache.add([jam for jam, _, _ in jam_repeats] + jams)
 
 
-def main_loop(conn, alerts, jams):
-    process_jams(conn, jams)
-    process_alerts(conn, alerts)
+# Environment variables with the feed URLs; every record of every feed is routed to the region(s)
+# whose data_sources.coverage_area contains it, so a new region needs only a row in data_sources
+FEEDS = os.getenv("WAZE_FEEDS", "DATA_JMK,DATA_ORP_MOST").split(",")
+CLEANUP_THRESHOLD = 5
 
 
-if __name__ == "__main__":
-    threshold = 5
+class SnapshotMailbox:
+    """
+    Snapshots waiting for one region's worker - at most one per feed.
+
+    When the worker is still busy with an older snapshot, a newer one of the same feed replaces
+    the waiting one (coalesced): a snapshot is the full current state, so a lagging region
+    catches up by ingesting only the latest one.
+    """
+
+    def __init__(self, region):
+        self.region = region
+        self.pending = {}
+        self.condition = threading.Condition()
+
+    def offer(self, feed, snapshot):
+        """
+        :param feed: feed the snapshot comes from
+        :param snapshot: (fetch time, alerts, jams)
+        """
+        with self.condition:
+            dropped = self.pending.get(feed)
+            if dropped is not None:
+                print(f"[{datetime.now()}] {self.region} is behind, {feed} snapshot {dropped[0]} "
+                      f"replaced by {snapshot[0]}")
+            self.pending[feed] = snapshot
+            self.condition.notify()
+
+    def take(self):
+        """
+        Waits for snapshots and returns all waiting ones as a dictionary feed -> snapshot.
+        """
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            pending, self.pending = self.pending, {}
+            return pending
+
+
+router = None
+mailboxes = {}
+# feed -> regions that ever got records from it; they get every snapshot of the feed, even an
+# empty one, so events that ended in the region are deactivated
+feed_regions = {}
+
+
+def split_snapshot(feed, now, data):
+    """
+    Called by the feed poller for every downloaded snapshot, routes its records to the regions.
+    """
+    by_region, unrouted = router.split(data.get("alerts", []), data.get("jams", []))
+    if unrouted:
+        print(f"[{datetime.now()}] {feed}: {unrouted} records outside all coverage areas skipped")
+    regions = feed_regions.setdefault(feed, set())
+    regions.update(by_region)
+    for region in regions:
+        alerts, jams = by_region.get(region, ([], []))
+        mailboxes[region].offer(feed, (now, alerts, jams))
+
+
+def region_worker(region):
+    """
+    Ingests snapshots of one region with the region's own connection, independently of the others.
+
+    Only the difference against the previous snapshots is written (see snapshot_index.py): new and
+    changed events, unchanged ones when they change or disappear (and all of them with the cleanup every
+    CLEANUP_THRESHOLD fetch cycles; snapshots of several feeds fetched within CYCLE_GAP are one cycle),
+    and the ended ones. All jams of the snapshot feed the segment traffic series (see segment_traffic.py).
+    The connection is checked before every snapshot, so the worker survives a restart of the DB
+    (the snapshots fetched while the DB is down are skipped and the index is loaded again).
+    """
     count = 0
+    cycle_fetched_at = None
+    alert_index = SnapshotIndex(ALERT_TRACKED_FIELDS)
+    jam_index = SnapshotIndex(JAM_TRACKED_FIELDS)
+    segment_cache = SegmentCache()
+    geometry_cache = GeometryCache()
+    segment_traffic = SegmentTraffic()
+    loaded = False
     while True:
-        # BRNO A JMK
-        data = get_data(os.getenv("DATA_JMK"))
-        alerts_brno_jmk = data.get("alerts", [])
-        jams_brno_jmk = data.get("jams", [])
-
-        # for Brno, filter only for city Brno
-        alerts_brno = [alert for alert in alerts_brno_jmk if alert.get('city') == 'Brno']
-        jams_brno = [jam for jam in jams_brno_jmk if jam.get('city') == 'Brno']
-        print(f"[{datetime.now()}] INGESTING DATA FOR BRNO")
-        main_loop(CONN_BRNO, alerts_brno, jams_brno)
-        print(f"="*75)
-
-        # for JMK - everything but city Brno
-        alerts_jmk = [alert for alert in alerts_brno_jmk if alert.get('city') != 'Brno']
-        jams_jmk = [jam for jam in jams_brno_jmk if jam.get('city') != 'Brno']
-        print(f"[{datetime.now()}] INGESTING DATA FOR JMK")
-        main_loop(CONN_JMK, alerts_jmk, jams_jmk)
-        print(f"="*75)
-
-        # ORP MOST
-        data = get_data(os.getenv("DATA_ORP_MOST"))
-        alerts_orp_most = data.get("alerts", [])
-        jams_orp_most = data.get("jams", [])
-        print(f"[{datetime.now()}] INGESTING DATA FOR ORP MOST")
-        main_loop(CONN_ORP_MOST, alerts_orp_most, jams_orp_most)
-        print(f"="*75)
-
-        if count >= threshold:
-            print("🧹  → Running cleanup: deactivating old alerts/jams...")
-            deactivate_stale_records(CONN_BRNO)
-            deactivate_stale_records(CONN_JMK)
-            deactivate_stale_records(CONN_ORP_MOST)
-            count = 0
-            print("🧹 → Cleanup done.")
+        for feed, (fetched_at, alerts, jams) in mailboxes[region].take().items():
+            started = datetime.now()
+            print(f"[{started}] INGESTING DATA FOR {region} ({feed} snapshot {fetched_at})")
+            new_cycle = cycle_fetched_at is None or fetched_at - cycle_fetched_at >= CYCLE_GAP
+            if new_cycle:
+                cycle_fetched_at = fetched_at
+            # (index, occurrences taken from it) until they are written
+            unwritten = []
+            try:
+                with connection(region) as conn:
+                    if not loaded:
+                        load_indexes(conn, alert_index, jam_index)
+                        loaded = True
+                    seen_at = datetime.utcnow()
+                    alerts_changed, alert_repeats, alert_ended = alert_index.diff(feed, alerts, seen_at, fetched_at)
+                    jams_changed, jam_repeats, jam_ended = jam_index.diff(feed, jams, seen_at, fetched_at)
+                    unwritten = [(alert_index, alert_repeats), (jam_index, jam_repeats)]
+                    segment_traffic.add_snapshot(jams, seen_at, fetched_at)
+                    ingest_changes(conn, alerts_changed, jams_changed, alert_repeats, jam_repeats,
+                                   alert_ended, jam_ended, segment_cache, geometry_cache)
+                    unwritten = []
+                    if segment_traffic.due():
+                        segment_traffic.flush(conn)
+                    print(f"{region}: {len(alerts_changed)}/{len(alerts)} alerts and {len(jams_changed)}/{len(jams)} "
+                          f"jams changed, {len(alert_repeats) + len(jam_repeats)} flushed, "
+                          f"{len(alert_ended) + len(jam_ended)} ended")
+
+                    if new_cycle and count >= CLEANUP_THRESHOLD:
+                        # unchanged events are written now and then, so their last_updated does not lag behind
+                        alert_flushed, jam_flushed = alert_index.flush_repeats(), jam_index.flush_repeats()
+                        unwritten = [(alert_index, alert_flushed), (jam_index, jam_flushed)]
+                        write_repeats(conn, alert_flushed, jam_flushed, geometry_cache)
+                        unwritten = []
+                        print(f"🧹  → Running cleanup ({region}): deactivating old alerts/jams...")
+                        deactivate_missing_records(conn, alert_index.keys(), jam_index.keys())
+                        count = 0
+                        print(f"🧹 → Cleanup done ({region}).")
+                    elif new_cycle:
+                        count += 1
+            except Exception as e:
+                # the index and the caches may be ahead of the DB now, they are rebuilt;
+                # occurrences that were not written go back to the index
+                for index, repeats in unwritten:
+                    index.requeue(repeats)
+                loaded = False
+                segment_cache.clear()
+                geometry_cache.clear()
+                print(f"[{datetime.now()}] {region}: ingest of snapshot {fetched_at} failed: {e}")
+            print(f"[{datetime.now()}] {region} done in {(datetime.now() - started).total_seconds():.1f} s")
+            print(f"="*75)
 
-        else:
-            print(f"🧹 → Skipping cleanup (run {count}/{threshold})")
-            count += 1
 
-        time.sleep(120)
+if __name__ == "__main__":
+    with connection("central") as central:
+        router = RegionRouter.from_database(central)
+    print(f"Regions: {', '.join(router.names)}")
+
+    for region in router.names:
+        mailboxes[region] = SnapshotMailbox(region)
+        threading.Thread(target=region_worker, args=(region,), name=f"ingest-{region}", daemon=True).start()
+
+    # feeds are fetched concurrently on a fixed 2-minute grid (latencies go to fetch_latency.csv),
+    # a slow region database delays only its own worker
+    try:
+        asyncio.run(poll_feeds({feed: os.getenv(feed) for feed in FEEDS}, split_snapshot))
+    except KeyboardInterrupt:
+        print("Program terminated by user.")
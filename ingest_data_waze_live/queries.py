@@ -47,18 +47,181 @@ INSERT INTO jams (
     %(jam_length_max)s, %(jam_length_avg)s,
     %(speed_max)s, %(speed_avg)s,
     %(delay_max)s, %(delay_avg)s,
-    %(update_count)s, ST_GeogFromText(%(jam_line)s),
+    %(update_count)s, ST_GeogFromWKB(%(jam_line)s),
     %(published_at)s, %(last_updated)s, %(active)s
 )
 """
 
+# Dočasná tabuľka pre dávkový ingest jamov (plní sa cez COPY)
+CREATE_JAMS_STAGE = """
+CREATE TEMP TABLE IF NOT EXISTS jams_stage (
+    id BIGINT,
+    uuid INTEGER,
+    country TEXT,
+    city TEXT,
+    turn_type TEXT,
+    street TEXT,
+    end_node TEXT,
+    start_node TEXT,
+    road_type INTEGER,
+    blocking_alert_uuid UUID,
+    jam_level FLOAT,
+    speed_kmh FLOAT,
+    jam_length FLOAT,
+    speed FLOAT,
+    delay FLOAT,
+    jam_line GEOGRAPHY,
+    published_at TIMESTAMPTZ,
+    weight INTEGER,
+    last_updated TIMESTAMPTZ
+) ON COMMIT DELETE ROWS
+"""
+
+# Stage sa vyprázdni pred každou dávkou - viac dávok jamov môže ísť v jednej transakcii (ingest_changes)
+CLEAR_JAMS_STAGE = "TRUNCATE jams_stage"
+
+JAMS_STAGE_COLUMNS = [
+    "id", "uuid", "country", "city", "turn_type", "street",
+    "end_node", "start_node", "road_type", "blocking_alert_uuid",
+    "jam_level", "speed_kmh", "jam_length", "speed", "delay",
+    "jam_line", "published_at", "weight", "last_updated"
+]
+
+# Výraz na dávkový UPSERT jamov zo stage tabuľky
+# - nový jam sa vloží, existujúci aktívny jam sa aktualizuje rovnako ako UPDATE_EXISTING_JAM
+# - vážené priemery a GREATEST/LEAST sa počítajú priamo v DB
+# - weight = počet snapshotov s týmito hodnotami (viac ako 1 pri zápise nezmenených výskytov naraz)
+UPSERT_JAMS_FROM_STAGE = """
+INSERT INTO jams AS j (
+    id, uuid, country, city, turn_type, street,
+    end_node, start_node, road_type, blocking_alert_uuid,
+    jam_level_max, jam_level_avg,
+    speed_kmh_min, speed_kmh_avg,
+    jam_length_max, jam_length_avg,
+    speed_max, speed_avg,
+    delay_max, delay_avg,
+    update_count, jam_line,
+    published_at, last_updated, active
+)
+SELECT DISTINCT ON (uuid, published_at)
+    id, uuid, country, city, turn_type, street,
+    end_node, start_node, road_type, blocking_alert_uuid,
+    jam_level, jam_level,
+    speed_kmh, speed_kmh,
+    jam_length, jam_length,
+    speed, speed,
+    delay, delay,
+    weight, jam_line,
+    published_at, last_updated, TRUE
+FROM jams_stage
+ORDER BY uuid, published_at
+ON CONFLICT (uuid, published_at) DO UPDATE SET
+    jam_level_avg = (j.jam_level_avg * j.update_count + EXCLUDED.jam_level_avg * EXCLUDED.update_count)
+                    / (j.update_count + EXCLUDED.update_count),
+    jam_level_max = GREATEST(j.jam_level_max, EXCLUDED.jam_level_max),
+    speed_kmh_avg = (j.speed_kmh_avg * j.update_count + EXCLUDED.speed_kmh_avg * EXCLUDED.update_count)
+                    / (j.update_count + EXCLUDED.update_count),
+    speed_kmh_min = LEAST(j.speed_kmh_min, EXCLUDED.speed_kmh_min),
+    jam_length_avg = (j.jam_length_avg * j.update_count + EXCLUDED.jam_length_avg * EXCLUDED.update_count)
+                     / (j.update_count + EXCLUDED.update_count),
+    jam_length_max = GREATEST(j.jam_length_max, EXCLUDED.jam_length_max),
+    speed_avg = (j.speed_avg * j.update_count + EXCLUDED.speed_avg * EXCLUDED.update_count)
+                / (j.update_count + EXCLUDED.update_count),
+    speed_max = GREATEST(j.speed_max, EXCLUDED.speed_max),
+    delay_avg = (j.delay_avg * j.update_count + EXCLUDED.delay_avg * EXCLUDED.update_count)
+                / (j.update_count + EXCLUDED.update_count),
+    delay_max = GREATEST(j.delay_max, EXCLUDED.delay_max),
+    update_count = j.update_count + EXCLUDED.update_count,
+    jam_line = COALESCE(j.jam_line, EXCLUDED.jam_line),
+    last_updated = EXCLUDED.last_updated
+WHERE j.active = TRUE
+"""
+
+# Jamy stage tabuľky bez línie (GeometryCache ju neposlal), ktorých riadok v DB líniu nemá
+# (riadok medzičasom zmazala retencia alebo ručný zásah) - ich línie sa doplnia pred UPSERTom
+GET_STAGE_JAMS_WITHOUT_LINE = """
+SELECT DISTINCT s.uuid
+FROM jams_stage s
+WHERE s.jam_line IS NULL
+  AND NOT EXISTS (
+      SELECT 1 FROM jams j
+      WHERE j.uuid = s.uuid AND j.published_at = s.published_at AND j.jam_line IS NOT NULL
+  )
+"""
+
+SET_STAGE_JAM_LINES = """
+UPDATE jams_stage s
+SET jam_line = v.jam_line::GEOGRAPHY
+FROM (VALUES %s) AS v (uuid, published_at, jam_line)
+WHERE s.uuid = v.uuid AND s.published_at = v.published_at AND s.jam_line IS NULL
+"""
+
+STAGE_JAM_LINES_TEMPLATE = "(%s::INTEGER, %s::TIMESTAMPTZ, %s)"
+
 # Výraz na INSERT segmentov (bulk)
+# Segment, ktorý už v DB je (rovnaký jam, segment a uzly), sa preskočí; výrazy sú tie isté ako
+# v idx_segments_unique, aby sa zhodoval aj segment bez uzla (NULL)
 INSERT_SEGMENTS = """
 INSERT INTO segments (jam_id, from_node, to_node, segment_id, is_forward)
 VALUES %s
+ON CONFLICT (jam_id, segment_id, COALESCE(from_node, -1), COALESCE(to_node, -1)) DO NOTHING
 """
 
 
+# Prírastky dopravy na segmentoch (segment_traffic.py): hodinový rad segment_traffic a týždenný profil
+# segment_weekly_profile (deň v týždni a hodina v miestnom čase) v jednom príkaze, hodnoty sa pripočítajú
+SEGMENT_TRAFFIC_TEMPLATE = "(%s::BIGINT, %s::BOOLEAN, %s::TIMESTAMPTZ, %s::INTEGER, %s::FLOAT, %s::FLOAT, %s::FLOAT, " \
+                           "%s::INTEGER)"
+UPSERT_SEGMENT_TRAFFIC = """
+WITH incoming (segment_id, is_forward, bucket, samples, jam_level_sum, speed_kmh_sum, delay_sum, jam_level_max) AS (
+    VALUES %s
+),
+hourly AS (
+    INSERT INTO segment_traffic AS t (segment_id, is_forward, bucket, samples, jam_level_sum, speed_kmh_sum,
+                                      delay_sum, jam_level_max)
+    SELECT * FROM incoming
+    ON CONFLICT (segment_id, is_forward, bucket) DO UPDATE SET
+        samples = t.samples + EXCLUDED.samples,
+        jam_level_sum = t.jam_level_sum + EXCLUDED.jam_level_sum,
+        speed_kmh_sum = t.speed_kmh_sum + EXCLUDED.speed_kmh_sum,
+        delay_sum = t.delay_sum + EXCLUDED.delay_sum,
+        jam_level_max = GREATEST(t.jam_level_max, EXCLUDED.jam_level_max)
+)
+INSERT INTO segment_weekly_profile AS p (segment_id, is_forward, dow, hour, samples, jam_level_sum, speed_kmh_sum,
+                                         delay_sum)
+SELECT segment_id, is_forward,
+       extract(isodow FROM bucket AT TIME ZONE 'Europe/Prague')::SMALLINT,
+       extract(hour FROM bucket AT TIME ZONE 'Europe/Prague')::SMALLINT,
+       sum(samples), sum(jam_level_sum), sum(speed_kmh_sum), sum(delay_sum)
+FROM incoming
+GROUP BY 1, 2, 3, 4
+ON CONFLICT (segment_id, is_forward, dow, hour) DO UPDATE SET
+    samples = p.samples + EXCLUDED.samples,
+    jam_level_sum = p.jam_level_sum + EXCLUDED.jam_level_sum,
+    speed_kmh_sum = p.speed_kmh_sum + EXCLUDED.speed_kmh_sum,
+    delay_sum = p.delay_sum + EXCLUDED.delay_sum
+"""
+
+# Počet spracovaných snapshotov po hodinách a v týždennom profile (menovateľ podielu času v zápche)
+UPSERT_TRAFFIC_SNAPSHOTS = """
+WITH incoming (bucket, snapshots) AS (
+    VALUES %s
+),
+hourly AS (
+    INSERT INTO traffic_snapshots AS s (bucket, snapshots)
+    SELECT * FROM incoming
+    ON CONFLICT (bucket) DO UPDATE SET snapshots = s.snapshots + EXCLUDED.snapshots
+)
+INSERT INTO traffic_weekly_snapshots AS w (dow, hour, snapshots)
+SELECT extract(isodow FROM bucket AT TIME ZONE 'Europe/Prague')::SMALLINT,
+       extract(hour FROM bucket AT TIME ZONE 'Europe/Prague')::SMALLINT,
+       sum(snapshots)
+FROM incoming
+GROUP BY 1, 2
+ON CONFLICT (dow, hour) DO UPDATE SET snapshots = w.snapshots + EXCLUDED.snapshots
+"""
+TRAFFIC_SNAPSHOTS_TEMPLATE = "(%s::TIMESTAMPTZ, %s::INTEGER)"
+
 # Výraz na vyhľadanie alertu podľa UUID a published_at
 GET_ALERT_BY_UUID_AND_TIMESTAMP = """
 SELECT 1 FROM alerts
@@ -76,7 +239,7 @@ INSERT INTO alerts (
     %(uuid)s, %(country)s, %(city)s, %(type)s, %(subtype)s, %(street)s,
     %(report_rating)s, %(confidence)s, %(reliability)s, %(road_type)s, %(magvar)s,
     %(report_by_municipality_user)s, %(report_description)s,
-    ST_GeogFromText(%(location)s), %(published_at)s, %(last_updated)s, %(active)s
+    ST_GeogFromWKB(%(location)s), %(published_at)s, %(last_updated)s, %(active)s
 )
 ON CONFLICT (uuid, published_at) DO UPDATE SET
     confidence = EXCLUDED.confidence,
@@ -84,3 +247,55 @@ ON CONFLICT (uuid, published_at) DO UPDATE SET
     report_rating = EXCLUDED.report_rating,
     last_updated = EXCLUDED.last_updated
 """
+
+# Deaktivácia udalostí, ktoré chýbajú v aktuálnom snapshote regiónu a neboli aktualizované
+# dlhšie ako ochranný interval (prechádza iba aktívne riadky cez idx_jams_active / idx_alerts_active).
+# Podmienka na published_at vylúči skomprimované chunky (storage_policies.py), v ktorých by UPDATE
+# podľa active / uuid musel dekomprimovať celý chunk; staršie aktívne riadky deaktivuje job kompresie
+DEACTIVATE_MISSING_JAMS = """
+UPDATE jams
+SET active = FALSE
+WHERE active = TRUE
+  AND published_at >= %(active_since)s
+  AND last_updated < %(stale_before)s
+  AND uuid <> ALL(%(uuids)s::BIGINT[])
+"""
+
+DEACTIVATE_MISSING_ALERTS = """
+UPDATE alerts
+SET active = FALSE
+WHERE active = TRUE
+  AND published_at >= %(active_since)s
+  AND last_updated < %(stale_before)s
+  AND uuid <> ALL(%(uuids)s::UUID[])
+"""
+
+# Deaktivácia udalostí, ktoré podľa indexu snapshotov ingestera zmizli (iba v neskomprimovaných chunkoch)
+DEACTIVATE_JAMS = """
+UPDATE jams
+SET active = FALSE
+WHERE active = TRUE AND published_at >= %(active_since)s AND uuid = ANY(%(uuids)s::BIGINT[])
+"""
+
+DEACTIVATE_ALERTS = """
+UPDATE alerts
+SET active = FALSE
+WHERE active = TRUE AND published_at >= %(active_since)s AND uuid = ANY(%(uuids)s::UUID[])
+"""
+
+# Aktívne udalosti regiónu pre obnovu indexu snapshotov pri štarte ingestera
+GET_ACTIVE_JAM_UUIDS = """
+SELECT DISTINCT uuid FROM jams WHERE active = TRUE
+"""
+
+GET_ACTIVE_ALERT_UUIDS = """
+SELECT DISTINCT uuid::TEXT FROM alerts WHERE active = TRUE
+"""
+
+# Územia regiónov pre smerovanie záznamov (centrálna DB)
+GET_REGION_COVERAGE = """
+SELECT name, ST_AsBinary(coverage_area)
+FROM data_sources
+WHERE active = TRUE AND coverage_area IS NOT NULL
+ORDER BY id
+"""
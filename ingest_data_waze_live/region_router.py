@@ -0,0 +1,114 @@
+"""
+Routing of alerts and jams to the region databases by data_sources.coverage_area.
+
+The polygons of all active regions are loaded once and put into a shapely STRtree, a whole
+snapshot is then routed with one bulk tree query per record type, so the cost per record does
+not grow with the number of regions. Regions may overlap (Brno lies inside JMK): by default a
+record goes only to the smallest region that contains it, which keeps Brno data in the Brno DB
+and the rest of the kraj in the JMK DB. Adding a region only needs a new row in data_sources.
+"""
+import numpy as np
+import shapely
+from shapely import STRtree
+
+from queries import GET_REGION_COVERAGE
+
+
+def jam_geometries(jams):
+    """
+    Builds jam lines for the whole snapshot at once (jams with a single point are routed as points).
+
+    :param jams: list of jam dictionaries
+    :return: numpy array of shapely geometries (None for jams without a line)
+    """
+    geometries = np.full(len(jams), None, dtype=object)
+    lengths = np.array([len(jam.get("line") or []) for jam in jams], dtype=int)
+
+    is_line = lengths >= 2
+    if is_line.any():
+        coords = np.array([(pt["x"], pt["y"]) for jam, line in zip(jams, is_line) if line
+                           for pt in jam["line"]], dtype=float)
+        geometries[is_line] = shapely.linestrings(coords, indices=np.repeat(np.arange(is_line.sum()),
+                                                                            lengths[is_line]))
+
+    is_point = lengths == 1
+    if is_point.any():
+        geometries[is_point] = shapely.points([(jam["line"][0]["x"], jam["line"][0]["y"])
+                                               for jam, point in zip(jams, is_point) if point])
+    return geometries
+
+
+def alert_geometries(alerts):
+    """
+    :param alerts: list of alert dictionaries
+    :return: numpy array of shapely points (None for alerts without a location)
+    """
+    geometries = np.full(len(alerts), None, dtype=object)
+    has_location = np.array([bool(alert.get("location")) for alert in alerts], dtype=bool)
+    if has_location.any():
+        geometries[has_location] = shapely.points([(alert["location"]["x"], alert["location"]["y"])
+                                                   for alert, located in zip(alerts, has_location) if located])
+    return geometries
+
+
+class RegionRouter:
+    """
+    Assigns records to regions by their geometry.
+    """
+
+    def __init__(self, regions, smallest_only=True):
+        """
+        :param regions: list of (data_sources name, shapely polygon) tuples
+        :param smallest_only: send a record only to the smallest containing region (False = to all)
+        """
+        self.names = [name for name, _ in regions]
+        self.tree = STRtree([polygon for _, polygon in regions])
+        self.areas = np.array([polygon.area for _, polygon in regions])
+        self.smallest_only = smallest_only
+
+    @classmethod
+    def from_database(cls, conn, smallest_only=True):
+        """
+        Loads the coverage areas of all active regions from the central DB.
+        """
+        with conn.cursor() as cur:
+            cur.execute(GET_REGION_COVERAGE)
+            rows = cur.fetchall()
+        return cls([(name, shapely.from_wkb(bytes(wkb))) for name, wkb in rows], smallest_only)
+
+    def route(self, geometries):
+        """
+        :param geometries: numpy array of shapely geometries (None = not routed)
+        :return: list with a list of region indices for every geometry
+        """
+        targets = [[] for _ in range(len(geometries))]
+        if not len(geometries):
+            return targets
+        record_idx, region_idx = self.tree.query(geometries, predicate="intersects")
+
+        if self.smallest_only and len(record_idx):
+            order = np.lexsort((self.areas[region_idx], record_idx))
+            record_idx, region_idx = record_idx[order], region_idx[order]
+            first = np.unique(record_idx, return_index=True)[1]
+            record_idx, region_idx = record_idx[first], region_idx[first]
+
+        for record, region in zip(record_idx.tolist(), region_idx.tolist()):
+            targets[record].append(region)
+        return targets
+
+    def split(self, alerts, jams):
+        """
+        Splits one snapshot by region.
+
+        :return: (dictionary region name -> (alerts, jams), number of records outside all regions)
+        """
+        by_region = {}
+        unrouted = 0
+        for records, geometries, position in ((alerts, alert_geometries(alerts), 0),
+                                              (jams, jam_geometries(jams), 1)):
+            for record, regions in zip(records, self.route(geometries)):
+                if not regions:
+                    unrouted += 1
+                for region in regions:
+                    by_region.setdefault(self.names[region], ([], []))[position].append(record)
+        return by_region, unrouted
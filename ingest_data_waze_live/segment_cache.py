@@ -0,0 +1,48 @@
+"""
+Cache of the jam segments already stored in the region DB.
+
+A jam keeps the same segments for its whole life, but it is written again whenever it changes,
+so without the cache the same rows would be sent to the DB over and over. Only segments missing
+from the cache are sent (and the unique key of `segments` drops anything that still repeats).
+The cache is bounded, the least recently seen segments are forgotten first.
+"""
+from collections import OrderedDict
+
+# About 10x the segments of all live jams of a large region
+SEGMENT_CACHE_SIZE = 200_000
+
+
+class SegmentCache:
+    """
+    Least recently used set of segment keys (jam_id, segment_id, from_node, to_node).
+    """
+
+    def __init__(self, max_size=SEGMENT_CACHE_SIZE):
+        self.max_size = max_size
+        self.keys = OrderedDict()
+
+    def new(self, values):
+        """
+        Filters out segments that were already stored and remembers the rest.
+
+        :param values: rows (jam_id, from_node, to_node, segment_id, is_forward) of INSERT_SEGMENTS
+        :return: rows not seen before
+        """
+        new_values = []
+        for value in values:
+            key = (value[0], value[3], value[1], value[2])
+            if key in self.keys:
+                self.keys.move_to_end(key)
+                continue
+            self.keys[key] = None
+            new_values.append(value)
+
+        while len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+        return new_values
+
+    def clear(self):
+        """
+        Forgets everything, e.g. after a rolled back transaction.
+        """
+        self.keys.clear()
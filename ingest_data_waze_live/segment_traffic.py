@@ -0,0 +1,102 @@
+"""
+Traffic time series of road segments, built from the jam segments of every snapshot.
+
+Every jam of a snapshot adds one sample of its level, speed and delay to each segment
+(segment ID + direction) it covers, in the hour of the snapshot. The samples are summed in memory
+and written as increments every FLUSH_SNAPSHOTS snapshots into the hypertable segment_traffic
+(one row per segment and hour) and into segment_weekly_profile (one row per segment, day of week
+and hour), together with the number of snapshots per hour, so the share of time a segment was
+jammed is known as well.
+
+A region can get snapshots of several feeds (Brno gets records of both JMK and ORP_MOST), but all
+feeds are fetched on the same 2-minute grid. Snapshots fetched less than CYCLE_GAP after the first
+snapshot of a cycle belong to that cycle: the region counts one snapshot per fetch cycle and a jam
+(uuid) delivered by two feeds in the same cycle is one sample.
+
+Nothing is lost when a flush fails: the increments stay pending and are sent with the next flush.
+"""
+from datetime import timedelta
+
+from psycopg2.extras import execute_values
+
+from queries import UPSERT_SEGMENT_TRAFFIC, SEGMENT_TRAFFIC_TEMPLATE, UPSERT_TRAFFIC_SNAPSHOTS, \
+    TRAFFIC_SNAPSHOTS_TEMPLATE
+
+# 5 snapshots = 10 minutes
+FLUSH_SNAPSHOTS = 5
+
+# Half of the poll interval of feed_fetcher.py
+CYCLE_GAP = timedelta(minutes=1)
+
+
+class SegmentTraffic:
+    """
+    Pending segment samples of one region: (segment_id, is_forward, hour) -> [samples, level sum,
+    speed sum, delay sum, max level].
+    """
+
+    def __init__(self, flush_snapshots=FLUSH_SNAPSHOTS, cycle_gap=CYCLE_GAP):
+        self.flush_snapshots = flush_snapshots
+        self.cycle_gap = cycle_gap
+        self.pending = {}
+        self.snapshots = {}
+        self.pending_snapshots = 0
+        # fetch time and hour of the current fetch cycle, jams already sampled in it
+        self.cycle_fetched_at = None
+        self.cycle_bucket = None
+        self.cycle_jams = set()
+
+    def add_snapshot(self, jams, seen_at, fetched_at):
+        """
+        :param jams: all jams of the region snapshot of one feed (not only the changed ones)
+        :param seen_at: time of the snapshot (UTC)
+        :param fetched_at: fetch time of the snapshot (the same clock for all feeds)
+        """
+        if self.cycle_fetched_at is None or fetched_at - self.cycle_fetched_at >= self.cycle_gap:
+            self.cycle_fetched_at = fetched_at
+            self.cycle_bucket = seen_at.replace(minute=0, second=0, microsecond=0)
+            self.cycle_jams.clear()
+            self.snapshots[self.cycle_bucket] = self.snapshots.get(self.cycle_bucket, 0) + 1
+            self.pending_snapshots += 1
+        bucket = self.cycle_bucket
+
+        pending = self.pending
+        for jam in jams:
+            uuid = jam.get("uuid")
+            if uuid is not None:
+                if uuid in self.cycle_jams:
+                    continue
+                self.cycle_jams.add(uuid)
+            level, speed, delay = jam["level"], jam["speedKMH"], jam["delay"]
+            # a segment listed twice in one jam is one sample
+            for segment_id, is_forward in {(seg["ID"], seg["isForward"]) for seg in jam.get("segments", [])}:
+                key = (segment_id, is_forward, bucket)
+                stats = pending.get(key)
+                if stats is None:
+                    pending[key] = [1, level, speed, delay, level]
+                else:
+                    stats[0] += 1
+                    stats[1] += level
+                    stats[2] += speed
+                    stats[3] += delay
+                    if level > stats[4]:
+                        stats[4] = level
+
+    def due(self):
+        return self.pending_snapshots >= self.flush_snapshots
+
+    def flush(self, conn):
+        """
+        Adds the pending samples and snapshot counts to the DB and commits.
+        """
+        with conn.cursor() as cur:
+            if self.pending:
+                execute_values(cur, UPSERT_SEGMENT_TRAFFIC, [(*key, *stats) for key, stats in self.pending.items()],
+                               template=SEGMENT_TRAFFIC_TEMPLATE, page_size=1000)
+            if self.snapshots:
+                execute_values(cur, UPSERT_TRAFFIC_SNAPSHOTS, list(self.snapshots.items()),
+                               template=TRAFFIC_SNAPSHOTS_TEMPLATE)
+        conn.commit()
+        self.pending.clear()
+        self.snapshots.clear()
+        self.pending_snapshots = 0
@@ -0,0 +1,185 @@
+"""
+In-memory index of the live events of one region, so the ingester writes only what changed.
+
+Every event is kept under its uuid with a hash of the fields the DB stores. For each new snapshot
+the index tells which events are new or changed (written now), which disappeared (deactivated)
+and which stayed the same. Unchanged occurrences are only counted; they are written at once with
+their count as weight when the event changes or disappears, or by flush_repeats (the ingester
+calls it with its periodic cleanup, so last_updated in the DB lags by a bounded time), so
+update_count and the averages in the DB end up the same as when every snapshot was written.
+
+At startup the index is filled with the uuids of the active rows in the DB (without hashes and
+without a feed), so the ones still live are written once and then tracked normally. An event of
+unknown feed is not missing from the snapshots of other feeds; it ends only when no snapshot has
+claimed it for UNKNOWN_FEED_AFTER (events that ended while the ingester was down). After a failed
+ingest the index is reloaded the same way, but the events it already tracks keep their feed and
+their unwritten occurrences, only their hashes are reset so they are written again. Occurrences
+taken for a write that failed are put back by requeue, so they are written with a later one.
+
+A region can get snapshots of several feeds, all fetched on the same grid. Snapshots fetched less
+than CYCLE_GAP after the first snapshot of a cycle belong to that cycle (as in segment_traffic.py),
+and an event is counted once per cycle: when a second feed delivers it in the same cycle, that
+occurrence is skipped and the event keeps the feed that delivered it first.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+# Fields written to the DB, a change in any of them means the event has to be written
+JAM_TRACKED_FIELDS = ["level", "speedKMH", "length", "speed", "delay", "street", "roadType", "turnType",
+                      "blockingAlertUuid", "endNode", "line", "segments"]
+ALERT_TRACKED_FIELDS = ["type", "subtype", "street", "reportRating", "confidence", "reliability", "roadType",
+                        "magvar", "reportDescription", "location"]
+
+# An event missing from this many consecutive snapshots of its feed is ended
+# (with 2-minute snapshots about the same as the previous 3-minute time limit)
+MISSING_SNAPSHOTS = 2
+
+# An event loaded from the DB that no snapshot claimed for this long is ended
+# (several 2-minute snapshots of every feed of the region)
+UNKNOWN_FEED_AFTER = timedelta(minutes=10)
+
+# Half of the poll interval of feed_fetcher.py
+CYCLE_GAP = timedelta(minutes=1)
+
+# Positions in an index entry
+HASH, RECORD, FEED, REPEATS, LAST_SEEN, MISSING = range(6)
+
+
+def record_hash(record, fields):
+    """
+    :return: stable digest of the tracked fields of a record
+    """
+    values = json.dumps([record.get(field) for field in fields], sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(values.encode("utf-8"), digest_size=16).digest()
+
+
+class SnapshotIndex:
+    """
+    Previous state of one record type (alerts or jams) of one region.
+    """
+
+    def __init__(self, tracked_fields, key="uuid", missing_snapshots=MISSING_SNAPSHOTS,
+                 unknown_feed_after=UNKNOWN_FEED_AFTER, cycle_gap=CYCLE_GAP):
+        self.tracked_fields = tracked_fields
+        self.key = key
+        self.missing_snapshots = missing_snapshots
+        self.unknown_feed_after = unknown_feed_after
+        self.cycle_gap = cycle_gap
+        # key -> [hash, record, feed, unchanged occurrences not written yet, last seen, missing snapshots]
+        # (an event loaded from the DB has no record nor feed and last seen = time of the load)
+        self.entries = {}
+        # fetch time of the current fetch cycle, keys already counted in it
+        self.cycle_fetched_at = None
+        self.cycle_keys = set()
+
+    def load(self, keys, loaded_at):
+        """
+        Makes the index match the given keys (the active rows of the DB): tracked events keep their
+        feed and unwritten occurrences but are written again with the next snapshot, unknown keys are
+        added without a feed and keys that are not given are dropped.
+
+        :param keys: keys of the active events
+        :param loaded_at: time of the load (UTC, the same clock as seen_at of diff)
+        """
+        entries = {}
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = [None, None, None, 0, loaded_at, 0]
+            else:
+                entry[HASH] = None
+            entries[key] = entry
+        self.entries = entries
+
+    def keys(self):
+        return self.entries.keys()
+
+    def diff(self, feed, records, seen_at, fetched_at):
+        """
+        Compares a snapshot with the index and updates the index.
+
+        :param feed: feed of the snapshot, only events of this feed can disappear from it
+        :param records: records of the region in the snapshot
+        :param seen_at: time of the snapshot
+        :param fetched_at: fetch time of the snapshot (the same clock for all feeds)
+        :return: (changed records to write now,
+                  list of (record, number of unchanged occurrences, last seen) to write as well,
+                  keys of events that ended)
+        """
+        if self.cycle_fetched_at is None or fetched_at - self.cycle_fetched_at >= self.cycle_gap:
+            self.cycle_fetched_at = fetched_at
+            self.cycle_keys.clear()
+
+        changed, repeats, ended = [], [], []
+        seen = set()
+        for record in records:
+            key = record.get(self.key)
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            if key in self.cycle_keys:
+                # already counted from another feed in this fetch cycle
+                continue
+            self.cycle_keys.add(key)
+            digest = record_hash(record, self.tracked_fields)
+            entry = self.entries.get(key)
+            if entry is not None and entry[HASH] == digest:
+                entry[FEED], entry[REPEATS], entry[LAST_SEEN], entry[MISSING] = feed, entry[REPEATS] + 1, seen_at, 0
+                continue
+            if entry is not None and entry[REPEATS]:
+                repeats.append((entry[RECORD], entry[REPEATS], entry[LAST_SEEN]))
+            self.entries[key] = [digest, record, feed, 0, seen_at, 0]
+            changed.append(record)
+
+        for key, entry in list(self.entries.items()):
+            if key in seen:
+                continue
+            if entry[FEED] is None:
+                # not claimed by any snapshot since the load, other feeds cannot tell it ended
+                if seen_at - entry[LAST_SEEN] >= self.unknown_feed_after:
+                    if entry[REPEATS]:
+                        repeats.append((entry[RECORD], entry[REPEATS], entry[LAST_SEEN]))
+                    ended.append(key)
+                    del self.entries[key]
+                continue
+            if entry[FEED] != feed:
+                continue
+            entry[MISSING] += 1
+            if entry[REPEATS]:
+                repeats.append((entry[RECORD], entry[REPEATS], entry[LAST_SEEN]))
+                entry[REPEATS] = 0
+            if entry[MISSING] >= self.missing_snapshots:
+                ended.append(key)
+                del self.entries[key]
+        return changed, repeats, ended
+
+    def flush_repeats(self):
+        """
+        Takes the unwritten unchanged occurrences of all tracked events.
+
+        :return: list of (record, number of unchanged occurrences, last seen) to write
+        """
+        repeats = []
+        for entry in self.entries.values():
+            if entry[REPEATS]:
+                repeats.append((entry[RECORD], entry[REPEATS], entry[LAST_SEEN]))
+                entry[REPEATS] = 0
+        return repeats
+
+    def requeue(self, repeats):
+        """
+        Puts back unchanged occurrences returned by diff or flush_repeats whose write failed, they are
+        written with the next change, disappearance or flush of the event. An event that ended
+        meanwhile is tracked again without a feed (its deactivation failed as well).
+
+        :param repeats: list of (record, number of unchanged occurrences, last seen)
+        """
+        for record, n, last_seen in repeats:
+            key = record.get(self.key)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = [None, record, None, n, last_seen, 0]
+            else:
+                entry[REPEATS] += n
+                entry[LAST_SEEN] = max(entry[LAST_SEEN], last_seen)
@@ -0,0 +1,436 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+
+from snapshot_reader import read_snapshot
+
+# Alert fields and how two aggregates of the same alert are combined
+ALERT_LAST_FIELDS = ["country", "city", "type", "subtype", "street", "reportDescription"]
+ALERT_MAX_FIELDS = ["reportRating", "confidence", "reliability"]
+ALERT_LAST_NUMERIC_FIELDS = ["roadType", "magvar"]
+
+# Jam fields and metrics and how two aggregates of the same jam are combined
+JAM_LAST_FIELDS = ["street", "blockingAlertUuid", "roadType", "startNode", "endNode"]
+JAM_METRICS = [("level", "max"), ("speedKMH", "min"), ("length", "max"), ("speed", "max"), ("delay", "max")]
+
+# Internal bookkeeping kept in every record, removed from the JSON outputs
+INTERNAL_FIELDS = ["_count", "_firstSeen", "_lastSeen"]
+
+
+def new_alert_record(alert, file_timestamp_millis):
+    """
+    Creates the aggregate of a single alert occurrence.
+
+    @param alert: alert data from one snapshot
+    @param file_timestamp_millis: timestamp in milliseconds from file name
+    @return: alert record
+    """
+    return {
+        "uuid": alert["uuid"],
+        "country": alert.get("country", ""),
+        "city": alert.get("city", ""),
+        "reportRating": alert.get("reportRating", -1),
+        "reportByMunicipalityUser": alert.get("reportByMunicipalityUser", ""),
+        "confidence": alert.get("confidence", -1),
+        "reliability": alert.get("reliability", -1),
+        "type": alert.get("type", ""),
+        "subtype": alert.get("subtype", ""),
+        "roadType": alert.get("roadType", -1),
+        "magvar": alert.get("magvar", -1),
+        "street": alert.get("street", ""),
+        "reportDescription": alert.get("reportDescription", ""),
+        "location": alert.get("location", None),
+        "pubMillis": alert.get("pubMillis", file_timestamp_millis),
+        "lastupdated": alert.get("pubMillis", file_timestamp_millis),
+        "finished": False,
+        "_count": 1,
+        "_firstSeen": file_timestamp_millis,
+        "_lastSeen": file_timestamp_millis
+    }
+
+
+def merge_alert(existing, later):
+    """
+    Combines two aggregates of the same alert built over disjoint time ranges.
+
+    @param existing: aggregate of the earlier range (updated in place)
+    @param later: aggregate of the later range
+    @return: the combined aggregate
+    """
+    if later["_firstSeen"] < existing["_firstSeen"]:
+        existing, later = later, existing
+    uuid = existing["uuid"]
+
+    for field in ALERT_LAST_FIELDS:
+        new_val = later.get(field, "")
+        old_val = existing.get(field, "")
+        if new_val != old_val:
+            logging.info(f"ALERT uuid={uuid} field={field}: {old_val} -> {new_val}")
+        existing[field] = new_val
+
+    for field in ALERT_MAX_FIELDS:
+        new_val = later.get(field, -1)
+        if new_val > existing.get(field, -1):
+            logging.info(f"ALERT uuid={uuid} field={field}: {existing[field]} -> {new_val}")
+            existing[field] = new_val
+
+    for field in ALERT_LAST_NUMERIC_FIELDS:
+        new_val = later.get(field, -1)
+        if new_val != existing.get(field, -1):
+            logging.info(f"ALERT uuid={uuid} field={field}: {existing[field]} -> {new_val}")
+        existing[field] = new_val
+
+    new_loc = later.get("location")
+    if new_loc != existing.get("location"):
+        logging.info(f"ALERT uuid={uuid} location updated")
+        existing["location"] = new_loc
+
+    existing["_count"] += later["_count"]
+    existing["_lastSeen"] = later["_lastSeen"]
+    existing["lastupdated"] = later["_lastSeen"]
+    existing["finished"] = False
+    return existing
+
+
+def new_jam_record(jam, file_timestamp_millis):
+    """
+    Creates the aggregate of a single jam occurrence.
+
+    @param jam: jam data from one snapshot
+    @param file_timestamp_millis: timestamp in milliseconds from file name
+    @return: jam record
+    """
+    return {
+        "id": jam["id"],
+        "uuid": jam.get("uuid", ""),
+        "country": jam.get("country", ""),
+        "city": jam.get("city", ""),
+        "turnType": jam.get("turnType", ""),
+        "street": jam.get("street", ""),
+        "blockingAlertUuid": jam.get("blockingAlertUuid", ""),
+        "roadType": jam.get("roadType", ""),
+        "startNode": jam.get("startNode", ""),
+        "endNode": jam.get("endNode", ""),
+        "line": jam.get("line", []),
+        "segments": jam.get("segments", []),
+        "updateCount": 1,
+        "pubMillis": jam.get("pubMillis", file_timestamp_millis),
+        "lastupdated": jam.get("pubMillis", file_timestamp_millis),
+        "finished": False,
+        "level_max": jam.get("level", -1),
+        "level_sum": jam.get("level", -1),
+        "level_avg": jam.get("level", -1),
+        "speedKMH_min": jam.get("speedKMH", -1),
+        "speedKMH_sum": jam.get("speedKMH", -1),
+        "speedKMH_avg": jam.get("speedKMH", -1),
+        "length_max": jam.get("length", -1),
+        "length_sum": jam.get("length", -1),
+        "length_avg": jam.get("length", -1),
+        "speed_max": jam.get("speed", -1),
+        "speed_sum": jam.get("speed", -1),
+        "speed_avg": jam.get("speed", -1),
+        "delay_max": jam.get("delay", -1),
+        "delay_sum": jam.get("delay", -1),
+        "delay_avg": jam.get("delay", -1),
+        "_firstSeen": file_timestamp_millis,
+        "_lastSeen": file_timestamp_millis
+    }
+
+
+def merge_jam_metrics(existing, later, uc):
+    """
+    Combines metric fields of two jam aggregates (max, min, sum, avg).
+
+    @param existing: aggregate of the earlier range (updated in place)
+    @param later: aggregate of the later range
+    @param uc: combined update count
+    """
+    for field, kind in JAM_METRICS:
+        if kind == "max":
+            existing[f"{field}_max"] = max(existing.get(f"{field}_max", -1), later[f"{field}_max"])
+        elif kind == "min":
+            existing[f"{field}_min"] = min(existing.get(f"{field}_min", float("inf")), later[f"{field}_min"])
+        existing[f"{field}_sum"] = existing.get(f"{field}_sum", 0) + later[f"{field}_sum"]
+        existing[f"{field}_avg"] = existing[f"{field}_sum"] / uc
+
+
+def merge_jam(existing, later):
+    """
+    Combines two aggregates of the same jam built over disjoint time ranges.
+
+    @param existing: aggregate of the earlier range (updated in place)
+    @param later: aggregate of the later range
+    @return: the combined aggregate
+    """
+    if later["_firstSeen"] < existing["_firstSeen"]:
+        existing, later = later, existing
+
+    existing["updateCount"] += later["updateCount"]
+    merge_jam_fields(existing, later, later["_lastSeen"])
+    merge_jam_metrics(existing, later, existing["updateCount"])
+    return existing
+
+
+def merge_jam_fields(existing, later, last_seen):
+    """
+    Combines the non-metric fields of two jam aggregates (last values, longest line, segments).
+
+    @param existing: aggregate of the earlier range (updated in place)
+    @param later: aggregate of the later range or raw jam data from a later snapshot
+    @param last_seen: timestamp of the last occurrence in `later`
+    """
+    jam_id = existing["id"]
+    for field in JAM_LAST_FIELDS:
+        new_val = later.get(field, "")
+        if new_val != existing.get(field, ""):
+            logging.info(f"JAM id={jam_id} field={field}: {existing[field]} -> {new_val}")
+        existing[field] = new_val
+
+    # the first of the longest lines wins
+    if len(later.get("line", [])) > len(existing.get("line", [])):
+        logging.info(f"JAM id={jam_id} line updated: longer line")
+        existing["line"] = later.get("line", [])
+
+    new_segments = later.get("segments", [])
+    old_segments = existing.get("segments", [])
+    old_ids = {s.get("ID") for s in old_segments}
+    added = [s for s in new_segments if s.get("ID") not in old_ids]
+    if added:
+        logging.info(f"JAM id={jam_id} added {len(added)} new segments")
+        old_segments.extend(added)
+    existing["segments"] = old_segments
+
+    existing["_lastSeen"] = last_seen
+    existing["lastupdated"] = last_seen
+    existing["finished"] = False
+
+
+def apply_alert(alerts, alert, file_timestamp_millis):
+    """
+    Updates or creates an alert record in the given alert store.
+
+    @param alerts: dictionary uuid -> alert record
+    @param alert: alert data from the current file
+    @param file_timestamp_millis: timestamp in milliseconds from file name
+    """
+    record = new_alert_record(alert, file_timestamp_millis)
+    existing = alerts.get(record["uuid"])
+    if existing:
+        alerts[record["uuid"]] = merge_alert(existing, record)
+    else:
+        logging.info(f"ALERT uuid={record['uuid']} added as new")
+        alerts[record["uuid"]] = record
+
+
+def apply_jam(jams, jam, file_timestamp_millis):
+    """
+    Updates or creates a jam record in the given jam store.
+
+    @param jams: dictionary id -> jam record
+    @param jam: jam data from the current file
+    @param file_timestamp_millis: timestamp in milliseconds from file name
+    """
+    record = new_jam_record(jam, file_timestamp_millis)
+    existing = jams.get(record["id"])
+    if existing:
+        jams[record["id"]] = merge_jam(existing, record)
+    else:
+        logging.info(f"JAM id={record['id']} added as new")
+        jams[record["id"]] = record
+
+
+def apply_snapshot_to_store(store, data, file_timestamp_millis):
+    """
+    Applies one decoded snapshot to a store. Snapshots must be applied in time order.
+
+    @param store: dictionary with "alerts" and "jams" record dictionaries
+    @param data: parsed snapshot dictionary
+    @param file_timestamp_millis: timestamp in milliseconds from file name
+    """
+    for alert in data.get("alerts", []):
+        apply_alert(store["alerts"], alert, file_timestamp_millis)
+
+    for jam in data.get("jams", []):
+        apply_jam(store["jams"], jam, file_timestamp_millis)
+
+
+def merge_stores(store, other):
+    """
+    Merges a partial store built over a later, disjoint time range into `store`.
+
+    Record order follows the first appearance, as in a sequential run.
+
+    @param store: store updated in place
+    @param other: partial store of a later time range
+    """
+    for uuid, alert in other["alerts"].items():
+        existing = store["alerts"].get(uuid)
+        store["alerts"][uuid] = merge_alert(existing, alert) if existing else alert
+
+    for jam_id, jam in other["jams"].items():
+        existing = store["jams"].get(jam_id)
+        store["jams"][jam_id] = merge_jam(existing, jam) if existing else jam
+
+
+def aggregate_files(files):
+    """
+    Builds a partial store from a time ordered group of snapshot files (map step).
+
+    @param files: list of (timestamp, filepath or archive entry) tuples
+    @return: partial store
+    """
+    store = {"alerts": {}, "jams": {}}
+    for ts, source in files:
+        apply_snapshot_to_store(store, read_snapshot(source), int(ts.timestamp() * 1000))
+    return store
+
+
+def _quiet_worker():
+    # per-field changes inside a partition are not logged, only the merges in the parent are
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def aggregate_by_day(store, files, workers=None):
+    """
+    Splits the files by day, aggregates the days in parallel and merges them into `store` in order.
+
+    @param store: store updated in place (may already contain older data, e.g. from a checkpoint)
+    @param files: list of (timestamp, filepath) tuples in time order
+    @param workers: number of worker processes
+    """
+    days = [list(day_files) for _, day_files in groupby(files, key=lambda f: f[0].date())]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_quiet_worker) as executor:
+        for partial in executor.map(aggregate_files, days):
+            merge_stores(store, partial)
+
+
+# Record lists of a snapshot, the field identifying a record and how a record is applied
+RECORD_TYPES = [("alerts", "uuid", apply_alert), ("jams", "id", apply_jam)]
+
+
+def repeated_alert_record(alert, first_millis, last_millis, count):
+    """
+    Creates the aggregate of an alert seen unchanged in `count` consecutive snapshots.
+
+    @param alert: alert data (the same in all the snapshots)
+    @param first_millis: timestamp of the first of the snapshots
+    @param last_millis: timestamp of the last of the snapshots
+    @param count: number of the snapshots
+    @return: alert record
+    """
+    record = new_alert_record(alert, first_millis)
+    record["_count"] = count
+    record["_lastSeen"] = last_millis
+    return record
+
+
+def repeated_jam_record(jam, first_millis, last_millis, count):
+    """
+    Creates the aggregate of a jam seen unchanged in `count` consecutive snapshots.
+
+    @param jam: jam data (the same in all the snapshots)
+    @param first_millis: timestamp of the first of the snapshots
+    @param last_millis: timestamp of the last of the snapshots
+    @param count: number of the snapshots
+    @return: jam record
+    """
+    record = new_jam_record(jam, first_millis)
+    record["updateCount"] = count
+    for field, _ in JAM_METRICS:
+        record[f"{field}_sum"] = record[f"{field}_sum"] * count
+    record["_lastSeen"] = last_millis
+    return record
+
+
+class DeltaAggregator:
+    """
+    Applies delta encoded snapshots (snapshot_delta.py in the project root) to a store.
+
+    Only added, changed and removed records are processed per snapshot. A record that stays the
+    same is not merged again on every snapshot, its unchanged occurrences are merged at once as
+    one aggregate when it changes, disappears or when flush() is called. The result is the same
+    as applying the full snapshots one by one (float sums may differ in the last digit).
+    """
+
+    def __init__(self, store, base=None):
+        """
+        @param store: store updated in place
+        @param base: snapshot already applied to the store (e.g. the last one of a checkpoint)
+        """
+        self.store = store
+        self.frame_millis = []
+        # record key -> [record data, index of the last frame already merged into the store]
+        self.live = {records: {} for records, _, _ in RECORD_TYPES}
+        for records, key, _ in RECORD_TYPES:
+            for record in (base or {}).get(records, []):
+                if key in record:
+                    self.live[records][record[key]] = [record, -1]
+
+    def _flush_record(self, records, current, until):
+        data, merged = current
+        count = until - merged
+        if count <= 0:
+            return
+        first, last = self.frame_millis[merged + 1], self.frame_millis[until]
+        if records == "alerts":
+            record = repeated_alert_record(data, first, last, count)
+            existing = self.store["alerts"].get(record["uuid"])
+            self.store["alerts"][record["uuid"]] = merge_alert(existing, record) if existing else record
+        else:
+            record = repeated_jam_record(data, first, last, count)
+            existing = self.store["jams"].get(record["id"])
+            self.store["jams"][record["id"]] = merge_jam(existing, record) if existing else record
+        current[1] = until
+
+    def _set(self, records, apply, record_key, record):
+        frame = len(self.frame_millis) - 1
+        current = self.live[records].get(record_key)
+        if current is not None:
+            self._flush_record(records, current, frame - 1)
+        apply(self.store[records], record, self.frame_millis[frame])
+        self.live[records][record_key] = [record, frame]
+
+    def _remove(self, records, record_key):
+        current = self.live[records].pop(record_key, None)
+        if current is not None:
+            self._flush_record(records, current, len(self.frame_millis) - 2)
+
+    def apply_delta(self, delta, file_timestamp_millis):
+        """
+        @param delta: delta frame produced by snapshot_delta.diff_snapshots
+        @param file_timestamp_millis: timestamp of the snapshot in milliseconds
+        """
+        self.frame_millis.append(file_timestamp_millis)
+        for records, key, apply in RECORD_TYPES:
+            changes = delta[records]
+            for record_key in changes["removed"]:
+                self._remove(records, record_key)
+            for record in changes["changed"] + changes["added"]:
+                self._set(records, apply, record[key], record)
+
+    def apply_keyframe(self, snapshot, file_timestamp_millis):
+        """
+        @param snapshot: full snapshot dictionary
+        @param file_timestamp_millis: timestamp of the snapshot in milliseconds
+        """
+        self.frame_millis.append(file_timestamp_millis)
+        for records, key, apply in RECORD_TYPES:
+            live = self.live[records]
+            seen = set()
+            for record in snapshot.get(records, []):
+                if key not in record:
+                    continue
+                seen.add(record[key])
+                current = live.get(record[key])
+                if current is None or current[0] != record:
+                    self._set(records, apply, record[key], record)
+            for record_key in [record_key for record_key in live if record_key not in seen]:
+                self._remove(records, record_key)
+
+    def flush(self):
+        """
+        Merges all pending unchanged occurrences into the store.
+        """
+        for records, _, _ in RECORD_TYPES:
+            for current in self.live[records].values():
+                self._flush_record(records, current, len(self.frame_millis) - 1)
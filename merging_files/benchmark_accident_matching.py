@@ -0,0 +1,119 @@
+"""
+Benchmark: accident -> jam matching with the time-bucketed STRtree index (accident_matching.py)
+vs. a brute-force baseline that measures every accident against every jam.
+
+Synthetic accidents are written to a CSV in the format of the nehody export (half of them close
+to a jam line, ~10 % with unknown time). With --jam-repeat the sample jams are replayed shifted by
+a week each, which simulates a longer period with more jams. The index matches the whole CSV
+(streamed in chunks), the baseline only the first --brute-force accidents; the matches of these
+accidents must be identical.
+
+Usage (from this directory):
+    python benchmark_accident_matching.py [--accidents 200000] [--jam-repeat 20] [--brute-force 2000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from accident_matching import JamIndex, load_jams, match_accidents, read_accidents, project, TIMEZONE, DISTANCE_M, \
+    BEFORE_MILLIS, AFTER_MILLIS
+
+JAMS_PATH = os.path.join("outputs_full", "jams_full.json")
+WEEK_MILLIS = 7 * 86_400_000
+UNKNOWN_TIME = 2560
+
+
+def repeat_jams(jams, repeat):
+    """
+    @return: jams replayed `repeat` times, shifted by a week and with new ids
+    """
+    repeated = []
+    for k in range(repeat):
+        for jam in jams:
+            repeated.append(dict(jam, id=jam["id"] + k * 10 ** 10, pubMillis=jam["pubMillis"] + k * WEEK_MILLIS,
+                                 lastupdated=jam["lastupdated"] + k * WEEK_MILLIS))
+    return repeated
+
+
+def write_accidents(path, jams, count, seed=0):
+    """
+    Writes `count` synthetic accidents (p1, p2a, p2b, geog) around the jams.
+    """
+    rng = np.random.default_rng(seed)
+    points = np.array([(pt["x"], pt["y"]) for jam in jams for pt in jam["line"]])
+    near = points[rng.integers(len(points), size=count)] + rng.normal(0, 0.001, size=(count, 2))
+    anywhere = rng.uniform(points.min(axis=0), points.max(axis=0), size=(count, 2))
+    lonlat = np.where((rng.random(count) < 0.5)[:, None], near, anywhere)
+
+    start = min(jam["pubMillis"] for jam in jams)
+    end = max(jam["lastupdated"] for jam in jams)
+    local = pd.to_datetime(rng.integers(start, end, size=count), unit="ms", utc=True).tz_convert(TIMEZONE)
+    p2b = np.where(rng.random(count) < 0.1, UNKNOWN_TIME, local.hour * 100 + local.minute)
+
+    geog = shapely.to_wkb(shapely.set_srid(shapely.points(lonlat), 4326), hex=True, include_srid=True)
+    pd.DataFrame({"p1": np.arange(1, count + 1), "p2a": local.strftime("%Y-%m-%d"), "p2b": p2b,
+                  "geog": geog}).to_csv(path, index=False)
+
+
+def brute_force(index, lon, lat, t0, t1):
+    """
+    Baseline without an index: every accident against all jams.
+
+    @return: set of (accident position, jam row)
+    """
+    x, y = project(lon, lat, index.lat0)
+    matches = set()
+    for i in range(len(x)):
+        distances = shapely.distance(shapely.Point(x[i], y[i]), index.geometries)
+        hits = ((distances <= index.distance_m) & (index.start <= t1[i] + index.after_millis)
+                & (index.end >= t0[i] - index.before_millis))
+        matches.update((i, int(j)) for j in np.flatnonzero(hits))
+    return matches
+
+
+def main(accidents, jam_repeat, brute_force_count):
+    jams = repeat_jams([jam for jam in load_jams(JAMS_PATH) if jam.get("line")], jam_repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, sample_path = os.path.join(tmp, "nehody.csv"), os.path.join(tmp, "nehody_sample.csv")
+        output_path = os.path.join(tmp, "nehody_jams.csv")
+        write_accidents(csv_path, jams, accidents)
+
+        start = time.perf_counter()
+        index = JamIndex(jams, DISTANCE_M, BEFORE_MILLIS, AFTER_MILLIS)
+        build_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        total, matched = match_accidents(index, csv_path, output_path)
+        index_seconds = time.perf_counter() - start
+        index_matches = pd.read_csv(output_path)
+
+        pd.read_csv(csv_path, nrows=brute_force_count).to_csv(sample_path, index=False)
+        p1, lon, lat, t0, t1 = next(read_accidents(sample_path, chunk_rows=brute_force_count))
+        start = time.perf_counter()
+        expected = brute_force(index, lon, lat, t0, t1)
+        brute_seconds = time.perf_counter() - start
+
+    print(f"{len(jams)} jams, {total} accidents, {matched} matches, index built in {build_seconds:.2f}s")
+    index_rate, brute_rate = total / index_seconds, len(p1) / brute_seconds
+    print(f"{'index':<14}{total:>10}{index_seconds:>9.2f}s{index_rate:>12.0f} accidents/s")
+    print(f"{'brute force':<14}{len(p1):>10}{brute_seconds:>9.2f}s{brute_rate:>12.0f} accidents/s")
+    print(f"speedup: {index_rate / brute_rate:.0f}x")
+
+    rows = {int(jam_id): row for row, jam_id in enumerate(index.ids)}
+    position = {int(value): i for i, value in enumerate(p1)}
+    found = {(position[p], rows[j]) for p, j in zip(index_matches["p1"], index_matches["jam_id"]) if p in position}
+    print("Matches are identical." if found == expected else "WARNING: matches differ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="STRtree index vs. brute force for accident -> jam matching")
+    parser.add_argument("--accidents", type=int, default=200_000)
+    parser.add_argument("--jam-repeat", type=int, default=20, help="replay the sample jams this many weeks")
+    parser.add_argument("--brute-force", type=int, default=2000, help="accidents matched by the baseline")
+    args = parser.parse_args()
+
+    main(args.accidents, args.jam_repeat, args.brute_force)
@@ -0,0 +1,76 @@
+"""
+Benchmark: per-dict jam updates (apply_jam) vs. columnar jam metrics (ColumnarJams).
+
+The sample snapshots are decoded once and then applied to an empty jam store by both paths
+(optionally replayed several times in a row as one longer period). Logging is switched off, so
+only the aggregation itself is measured. At the end both stores must be identical, including
+int / float types of the values.
+
+Usage (from this directory):
+    python benchmark_jam_metrics.py [data_dir] [--repeat 10]
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+from aggregate_state import apply_jam
+from columnar_jams import ColumnarJams
+from snapshot_reader import read_snapshot
+
+DATA_DIR = "data_JMK"
+SNAPSHOT_INTERVAL_MILLIS = 120_000
+
+
+def load_jams(data_dir, repeat):
+    snapshots = [read_snapshot(os.path.join(data_dir, filename))["jams"]
+                 for filename in sorted(os.listdir(data_dir)) if filename.endswith(".json")]
+    return [(i * SNAPSHOT_INTERVAL_MILLIS, jams) for i, jams in enumerate(snapshots * repeat)]
+
+
+def run_dict(snapshots):
+    jams = {}
+    start = time.perf_counter()
+    for file_timestamp_millis, snapshot in snapshots:
+        for jam in snapshot:
+            apply_jam(jams, jam, file_timestamp_millis)
+    return time.perf_counter() - start, jams
+
+
+def run_columnar(snapshots):
+    jams = {}
+    start = time.perf_counter()
+    columnar = ColumnarJams(jams)
+    for file_timestamp_millis, snapshot in snapshots:
+        columnar.apply_snapshot(snapshot, file_timestamp_millis)
+    columnar.materialize()
+    return time.perf_counter() - start, jams
+
+
+def main(data_dir, repeat):
+    logging.disable(logging.CRITICAL)
+    snapshots = load_jams(data_dir, repeat)
+    total = sum(len(jams) for _, jams in snapshots)
+    print(f"{len(snapshots)} snapshots, {total} jam occurrences")
+
+    dict_seconds, dict_jams = run_dict(snapshots)
+    columnar_seconds, columnar_jams = run_columnar(snapshots)
+
+    print(f"{'dict':<10}{dict_seconds:>8.3f}s{total / dict_seconds:>12.0f} jams/s")
+    print(f"{'columnar':<10}{columnar_seconds:>8.3f}s{total / columnar_seconds:>12.0f} jams/s")
+    print(f"speedup: {dict_seconds / columnar_seconds:.1f}x")
+
+    # json.dumps keeps the difference between 3 and 3.0
+    same = (list(dict_jams) == list(columnar_jams)
+            and all(json.dumps(dict_jams[key]) == json.dumps(columnar_jams[key]) for key in dict_jams))
+    print("Results are identical." if same else "WARNING: results differ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-dict vs. columnar jam metric updates")
+    parser.add_argument("data_dir", nargs="?", default=DATA_DIR)
+    parser.add_argument("--repeat", type=int, default=1, help="replay the snapshots this many times")
+    args = parser.parse_args()
+
+    main(args.data_dir, args.repeat)
@@ -0,0 +1,88 @@
+"""
+Benchmark: memory of the aggregator store with plain dictionaries vs. compact records (--compact).
+
+The snapshots are read one by one inside the measured region, so only what the store keeps
+is counted (tracemalloc, after garbage collection). With --repeat the sample is replayed with
+shifted ids / uuids, which simulates a longer period with more distinct alerts and jams.
+Both stores must give identical plain records.
+
+Usage (from this directory):
+    python benchmark_store_memory.py [data_dir] [--repeat 20]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+from aggregate_state import apply_snapshot_to_store
+from compact_store import compact_store, plain_records
+from snapshot_reader import read_snapshot
+
+DATA_DIR = "data_JMK"
+SNAPSHOT_INTERVAL_MILLIS = 120_000
+
+
+def shifted_snapshot(path, shift):
+    data = read_snapshot(path)
+    if shift:
+        for alert in data["alerts"]:
+            alert["uuid"] = f"{alert['uuid']}-{shift}"
+        for jam in data["jams"]:
+            jam["id"] += shift * 10 ** 10
+    return data
+
+
+def build_store(store, paths, repeat):
+    tick = 0
+    for shift in range(repeat):
+        for path in paths:
+            apply_snapshot_to_store(store, shifted_snapshot(path, shift), tick * SNAPSHOT_INTERVAL_MILLIS)
+            tick += 1
+    return store
+
+
+def measure(make_store, paths, repeat):
+    """
+    @return: (store, bytes held by the store, seconds)
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    store = build_store(make_store(), paths, repeat)
+    seconds = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return store, size, seconds
+
+
+def main(data_dir, repeat):
+    logging.disable(logging.CRITICAL)
+    paths = [os.path.join(data_dir, filename) for filename in sorted(os.listdir(data_dir))
+             if filename.endswith(".json")]
+
+    plain, plain_size, plain_seconds = measure(lambda: {"alerts": {}, "jams": {}}, paths, repeat)
+    compact, compact_size, compact_seconds = measure(compact_store, paths, repeat)
+
+    records = len(plain["alerts"]) + len(plain["jams"])
+    print(f"{len(paths) * repeat} snapshots, {len(plain['alerts'])} alerts, {len(plain['jams'])} jams")
+    print(f"{'':<10}{'MB':>10}{'B/record':>12}{'time':>10}")
+    for name, size, seconds in (("dict", plain_size, plain_seconds), ("compact", compact_size, compact_seconds)):
+        print(f"{name:<10}{size / 1024 ** 2:>10.1f}{size / records:>12.0f}{seconds:>9.2f}s")
+    print(f"memory saved: {1 - compact_size / plain_size:.0%} ({plain_size / compact_size:.1f}x less)")
+
+    same = all(json.dumps(plain_records(plain[kind].values())) == json.dumps(plain_records(compact[kind].values()))
+               for kind in ("alerts", "jams"))
+    print("Records are identical." if same else "WARNING: records differ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory of plain vs. compact aggregator records")
+    parser.add_argument("data_dir", nargs="?", default=DATA_DIR)
+    parser.add_argument("--repeat", type=int, default=1, help="replay the snapshots with shifted ids this many times")
+    args = parser.parse_args()
+
+    main(args.data_dir, args.repeat)
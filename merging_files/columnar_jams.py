@@ -0,0 +1,138 @@
+"""
+Columnar jam metrics for the sequential aggregator (--columnar).
+
+The metric part of merge_jam (max / min / sum of level, speedKMH, length, speed and delay and the
+update count) lives in preallocated NumPy columns, one row per jam id. Every snapshot is turned
+into value arrays and applied with a few array operations, instead of building and merging a
+record dictionary per jam. The other jam fields are still merged per jam (merge_jam_fields).
+
+The metrics are written back into the records by materialize() before the store is saved or
+checkpointed, with the same values and the same int / float types as the per-dict path.
+"""
+import logging
+
+import numpy as np
+
+from aggregate_state import JAM_METRICS, new_jam_record, merge_jam_fields
+
+INITIAL_ROWS = 1024
+
+
+class ColumnarJams:
+    """
+    Jam store with the metrics kept in columns (row = position of the jam id in `ids`).
+    """
+
+    def __init__(self, jams, capacity=INITIAL_ROWS):
+        """
+        @param jams: dictionary id -> jam record, updated in place (may come from a checkpoint)
+        @param capacity: initial number of rows, the columns double when full
+        """
+        self.jams = jams
+        self.rows = {}
+        self.ids = []
+        size = max(capacity, len(jams))
+        # one row per metric of JAM_METRICS, values are float64, *_float marks values that were
+        # float in the input (an int-only column is written back as ints)
+        self.count = np.zeros(size, dtype=np.int64)
+        self.extreme = np.empty((len(JAM_METRICS), size))
+        self.extreme_float = np.zeros((len(JAM_METRICS), size), dtype=bool)
+        self.sums = np.zeros((len(JAM_METRICS), size))
+        self.sums_float = np.zeros((len(JAM_METRICS), size), dtype=bool)
+        self.is_max = np.array([[kind == "max"] for _, kind in JAM_METRICS])
+
+        for jam_id, record in jams.items():
+            row = self._add_row(jam_id)
+            self.count[row] = record["updateCount"]
+            for k, (field, kind) in enumerate(JAM_METRICS):
+                extreme, total = record[f"{field}_{kind}"], record[f"{field}_sum"]
+                self.extreme[k, row], self.extreme_float[k, row] = extreme, isinstance(extreme, float)
+                self.sums[k, row], self.sums_float[k, row] = total, isinstance(total, float)
+
+    def _add_row(self, jam_id):
+        row = len(self.ids)
+        if row == len(self.count):
+            size = 2 * row
+            self.count = np.resize(self.count, size)
+            self.extreme = np.resize(self.extreme, (len(JAM_METRICS), size))
+            self.extreme_float = np.resize(self.extreme_float, (len(JAM_METRICS), size))
+            self.sums = np.resize(self.sums, (len(JAM_METRICS), size))
+            self.sums_float = np.resize(self.sums_float, (len(JAM_METRICS), size))
+        self.rows[jam_id] = row
+        self.ids.append(jam_id)
+
+        # neutral values, the first applied occurrence replaces them
+        self.count[row] = 0
+        self.extreme[:, row] = np.where(self.is_max[:, 0], -np.inf, np.inf)
+        self.extreme_float[:, row] = False
+        self.sums[:, row] = 0.0
+        self.sums_float[:, row] = False
+        return row
+
+    def apply_snapshot(self, jams, file_timestamp_millis):
+        """
+        Applies the jams of one snapshot. Snapshots must be applied in time order.
+
+        @param jams: list of jam dictionaries from the snapshot
+        @param file_timestamp_millis: timestamp in milliseconds from file name
+        """
+        if not jams:
+            return
+        for jam in jams:
+            record = self.jams.get(jam["id"])
+            if record is None:
+                logging.info(f"JAM id={jam['id']} added as new")
+                self.jams[jam["id"]] = new_jam_record(jam, file_timestamp_millis)
+                self._add_row(jam["id"])
+            else:
+                merge_jam_fields(record, jam, file_timestamp_millis)
+
+        rows = np.fromiter((self.rows[jam["id"]] for jam in jams), dtype=np.int64, count=len(jams))
+        values = np.empty((len(JAM_METRICS), len(jams)))
+        floats = np.zeros((len(JAM_METRICS), len(jams)), dtype=bool)
+        for k, (field, _) in enumerate(JAM_METRICS):
+            column = [jam.get(field, -1) for jam in jams]
+            array = np.array(column)
+            values[k] = array
+            if array.dtype.kind == "f":
+                floats[k] = [type(value) is float for value in column]
+
+        # a jam listed twice in one snapshot is applied once per pass, in snapshot order
+        positions = np.arange(len(jams))
+        while positions.size:
+            _, first = np.unique(rows[positions], return_index=True)
+            current = positions[np.sort(first)]
+            self._apply(rows[current], values[:, current], floats[:, current])
+            positions = np.setdiff1d(positions, current, assume_unique=True)
+
+    def _apply(self, rows, values, floats):
+        # rows are unique here, so plain fancy indexing updates every row exactly once
+        self.count[rows] += 1
+        current = self.extreme[:, rows]
+        # max() / min() keep the existing value on a tie
+        better = np.where(self.is_max, values > current, values < current)
+        self.extreme[:, rows] = np.where(better, values, current)
+        self.extreme_float[:, rows] = np.where(better, floats, self.extreme_float[:, rows])
+        self.sums[:, rows] += values
+        self.sums_float[:, rows] |= floats
+
+    def materialize(self):
+        """
+        Writes the metric columns back into the jam records (max / min, sum, avg, updateCount).
+        """
+        n = len(self.ids)
+        counts = self.count[:n].tolist()
+        records = [self.jams[jam_id] for jam_id in self.ids]
+        for record, uc in zip(records, counts):
+            record["updateCount"] = uc
+
+        for k, (field, kind) in enumerate(JAM_METRICS):
+            extreme_key, sum_key, avg_key = f"{field}_{kind}", f"{field}_sum", f"{field}_avg"
+            columns = zip(records, counts, self.extreme[k, :n].tolist(), self.extreme_float[k, :n].tolist(),
+                          self.sums[k, :n].tolist(), self.sums_float[k, :n].tolist())
+            for record, uc, extreme, extreme_float, total, total_float in columns:
+                total = total if total_float else int(total)
+                record[extreme_key] = extreme if extreme_float else int(extreme)
+                record[sum_key] = total
+                # a jam seen once keeps the value itself, as in new_jam_record
+                record[avg_key] = total if uc == 1 else total / uc
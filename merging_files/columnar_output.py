@@ -0,0 +1,142 @@
+"""
+Typed Parquet output for the aggregator results (optional, requires pyarrow).
+
+Columns are built straight from the in-memory records, the city filter is applied while the
+columns are filled, so no intermediate DataFrame is created. `line` and `segments` are stored
+as nested lists of structs and every column can be read on its own with read_output().
+"""
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+POINT_TYPE = pa.struct([("x", pa.float64()), ("y", pa.float64())])
+SEGMENT_TYPE = pa.struct([
+    ("fromNode", pa.int64()),
+    ("ID", pa.int64()),
+    ("toNode", pa.int64()),
+    ("isForward", pa.bool_()),
+])
+
+ALERT_SCHEMA = pa.schema([
+    ("uuid", pa.string()),
+    ("country", pa.string()),
+    ("city", pa.string()),
+    ("reportRating", pa.int64()),
+    ("reportByMunicipalityUser", pa.string()),
+    ("confidence", pa.int64()),
+    ("reliability", pa.int64()),
+    ("type", pa.string()),
+    ("subtype", pa.string()),
+    ("roadType", pa.int64()),
+    ("magvar", pa.int64()),
+    ("street", pa.string()),
+    ("reportDescription", pa.string()),
+    ("location", POINT_TYPE),
+    ("pubMillis", pa.int64()),
+    ("lastupdated", pa.int64()),
+    ("finished", pa.bool_()),
+])
+
+JAM_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("uuid", pa.int64()),
+    ("country", pa.string()),
+    ("city", pa.string()),
+    ("turnType", pa.string()),
+    ("street", pa.string()),
+    ("blockingAlertUuid", pa.string()),
+    ("roadType", pa.int64()),
+    ("startNode", pa.string()),
+    ("endNode", pa.string()),
+    ("line", pa.list_(POINT_TYPE)),
+    ("segments", pa.list_(SEGMENT_TYPE)),
+    ("updateCount", pa.int64()),
+    ("pubMillis", pa.int64()),
+    ("lastupdated", pa.int64()),
+    ("finished", pa.bool_()),
+    ("level_max", pa.int64()),
+    ("level_sum", pa.int64()),
+    ("level_avg", pa.float64()),
+    ("speedKMH_min", pa.float64()),
+    ("speedKMH_sum", pa.float64()),
+    ("speedKMH_avg", pa.float64()),
+    ("length_max", pa.int64()),
+    ("length_sum", pa.int64()),
+    ("length_avg", pa.float64()),
+    ("speed_max", pa.float64()),
+    ("speed_sum", pa.float64()),
+    ("speed_avg", pa.float64()),
+    ("delay_max", pa.int64()),
+    ("delay_sum", pa.int64()),
+    ("delay_avg", pa.float64()),
+])
+
+
+def _clean(value, field_type):
+    """
+    Adapts a record value to the column type (the records use "" / -1 as missing values).
+
+    @param value: value from the record
+    @param field_type: pyarrow type of the column
+    @return: value accepted by pyarrow
+    """
+    if pa.types.is_integer(field_type):
+        if value == "" or value is None:
+            return None
+        if isinstance(value, float):
+            return int(value) if value.is_integer() else None
+        return value
+    if hasattr(value, "unpack"):
+        # packed line / segments / location of a compact record (compact_store.py)
+        return value.unpack()
+    if pa.types.is_string(field_type) and value is not None and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def records_to_table(records, schema, city=None):
+    """
+    Builds a typed Arrow table from aggregator records.
+
+    @param records: iterable of record dictionaries
+    @param schema: target schema (ALERT_SCHEMA or JAM_SCHEMA)
+    @param city: if set, only records of this city are written
+    @return: pyarrow.Table
+    """
+    columns = {field.name: [] for field in schema}
+    types = [(field.name, field.type) for field in schema]
+    for record in records:
+        if city is not None and record.get("city") != city:
+            continue
+        for name, field_type in types:
+            columns[name].append(_clean(record.get(name), field_type))
+    return pa.table({name: pa.array(values, type=field_type) for (name, field_type), values
+                     in zip(types, columns.values())}, schema=schema)
+
+
+def save_parquet(data_store, output_dir, city=None):
+    """
+    Saves alerts and jams as alerts_full.parquet / jams_full.parquet.
+
+    @param data_store: aggregator store with "alerts" and "jams" record dictionaries
+    @param output_dir: output directory
+    @param city: if set, only records of this city are written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pq.write_table(records_to_table(data_store["alerts"].values(), ALERT_SCHEMA, city),
+                   os.path.join(output_dir, "alerts_full.parquet"), compression="zstd")
+    pq.write_table(records_to_table(data_store["jams"].values(), JAM_SCHEMA, city),
+                   os.path.join(output_dir, "jams_full.parquet"), compression="zstd")
+
+
+def read_output(path, columns=None, filters=None):
+    """
+    Reads an aggregator Parquet output, only the requested columns are decoded.
+
+    @param path: path to alerts_full.parquet or jams_full.parquet
+    @param columns: list of column names (all if None)
+    @param filters: optional pyarrow filters, e.g. [("street", "=", "Husova")]
+    @return: pyarrow.Table (use .to_pandas() for a DataFrame)
+    """
+    return pq.read_table(path, columns=columns, filters=filters)
@@ -0,0 +1,273 @@
+"""
+Compact in-memory records for the aggregator store (--compact).
+
+A plain record is a dictionary with ~30 keys and a jam keeps `line` and `segments` as lists of
+small dictionaries, which makes a month of data take several GB. Here every stored record is a
+__slots__ object with the same fields, repeated strings (street, city, type, ...) are interned,
+`line` is packed into one float array, `segments` into one integer array and the alert
+`location` into two floats.
+
+The records keep the dictionary interface used by aggregate_state.py (record["street"],
+record.get(...), assignment), so the merge code works unchanged. A CompactRecords store turns every
+plain record assigned to it into a compact one; plain_records() turns them back into the
+dictionaries of the original schema (same keys in the same order) for the JSON, Parquet and
+checkpoint outputs.
+"""
+import sys
+from array import array
+
+from aggregate_state import new_alert_record, new_jam_record
+
+# Same fields and order as the plain records
+ALERT_FIELDS = list(new_alert_record({"uuid": ""}, 0))
+JAM_FIELDS = list(new_jam_record({"id": 0}, 0))
+
+# String fields shared by many records
+INTERNED_FIELDS = {"country", "city", "type", "subtype", "street", "turnType", "roadType", "startNode", "endNode",
+                   "reportByMunicipalityUser"}
+
+SEGMENT_KEYS = ["fromNode", "ID", "toNode", "isForward"]
+
+
+class PackedLine:
+    """
+    Jam line [{"x": .., "y": ..}, ...] stored as one array of doubles.
+    """
+    __slots__ = ("coords",)
+
+    def __init__(self, coords):
+        self.coords = coords
+
+    @classmethod
+    def pack(cls, points):
+        """
+        @return: PackedLine, or None if some point is not {"x": float, "y": float}
+        """
+        coords = array("d")
+        for point in points:
+            if type(point) is not dict or len(point) != 2:
+                return None
+            x, y = point.get("x"), point.get("y")
+            if type(x) is not float or type(y) is not float or next(iter(point)) != "x":
+                return None
+            coords.append(x)
+            coords.append(y)
+        return cls(coords)
+
+    def __len__(self):
+        return len(self.coords) // 2
+
+    def __iter__(self):
+        coords = self.coords
+        for i in range(0, len(coords), 2):
+            yield {"x": coords[i], "y": coords[i + 1]}
+
+    def unpack(self):
+        return list(self)
+
+
+class PackedSegments:
+    """
+    Jam segments [{"fromNode", "ID", "toNode", "isForward"}, ...] stored as one integer array
+    (four values per segment).
+
+    Segments of another shape switch the object to a plain list, so nothing is ever lost.
+    """
+    __slots__ = ("values", "plain")
+
+    def __init__(self):
+        self.values = array("q")
+        self.plain = None
+
+    @staticmethod
+    def packable(segment):
+        return (type(segment) is dict and list(segment) == SEGMENT_KEYS and type(segment["fromNode"]) is int
+                and type(segment["ID"]) is int and type(segment["toNode"]) is int
+                and type(segment["isForward"]) is bool)
+
+    @classmethod
+    def pack(cls, segments):
+        """
+        @return: PackedSegments, or None if some segment has another shape
+        """
+        if not all(cls.packable(segment) for segment in segments):
+            return None
+        packed = cls()
+        packed.extend(segments)
+        return packed
+
+    def extend(self, segments):
+        if self.plain is None and not all(self.packable(segment) for segment in segments):
+            self.plain = list(self)
+            self.values = array("q")
+        if self.plain is not None:
+            self.plain.extend(segments)
+            return
+        for segment in segments:
+            self.values.extend((segment["fromNode"], segment["ID"], segment["toNode"], segment["isForward"]))
+
+    def __len__(self):
+        return len(self.plain) if self.plain is not None else len(self.values) // 4
+
+    def __iter__(self):
+        if self.plain is not None:
+            yield from self.plain
+            return
+        values = self.values
+        for i in range(0, len(values), 4):
+            yield {"fromNode": values[i], "ID": values[i + 1], "toNode": values[i + 2],
+                   "isForward": bool(values[i + 3])}
+
+    def unpack(self):
+        return list(self)
+
+
+class PackedPoint:
+    """
+    Alert location {"x": .., "y": ..} stored as two floats, compares equal to the dictionary.
+    """
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    @classmethod
+    def pack(cls, point):
+        """
+        @return: PackedPoint, or None if the point is not {"x": float, "y": float}
+        """
+        if len(point) != 2 or next(iter(point)) != "x":
+            return None
+        x, y = point.get("x"), point.get("y")
+        if type(x) is not float or type(y) is not float:
+            return None
+        return cls(x, y)
+
+    def __eq__(self, other):
+        if isinstance(other, PackedPoint):
+            other = other.unpack()
+        return self.unpack() == other
+
+    __hash__ = None
+
+    def unpack(self):
+        return {"x": self.x, "y": self.y}
+
+
+# field -> (type of the plain value, function packing it or returning None when it cannot be packed)
+PACKERS = {"line": (list, PackedLine.pack), "segments": (list, PackedSegments.pack),
+           "location": (dict, PackedPoint.pack)}
+PACKED_TYPES = (PackedLine, PackedSegments, PackedPoint)
+COMPACTED_FIELDS = INTERNED_FIELDS | set(PACKERS)
+
+
+def compact_value(field, value):
+    """
+    @return: interned string or packed value (the value itself if it cannot be compacted)
+    """
+    if type(value) is str:
+        return sys.intern(value) if field in INTERNED_FIELDS else value
+    if field in PACKERS and type(value) is PACKERS[field][0]:
+        packed = PACKERS[field][1](value)
+        if packed is not None:
+            return packed
+    return value
+
+
+class SlotRecord:
+    """
+    Base of the compact records, the fields are the __slots__ of the subclass.
+    """
+    __slots__ = ()
+
+    def __init__(self, record):
+        for field in self.__slots__:
+            self[field] = record[field]
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field) from None
+
+    def __setitem__(self, field, value):
+        if field in COMPACTED_FIELDS:
+            value = compact_value(field, value)
+        setattr(self, field, value)
+
+    def __contains__(self, field):
+        return hasattr(self, field)
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        """
+        @return: plain record with the fields in the original order
+        """
+        record = {}
+        for field in self.__slots__:
+            value = getattr(self, field)
+            record[field] = value.unpack() if isinstance(value, PACKED_TYPES) else value
+        return record
+
+    def __getstate__(self):
+        return [getattr(self, field) for field in self.__slots__]
+
+    def __setstate__(self, state):
+        for field, value in zip(self.__slots__, state):
+            setattr(self, field, value)
+
+
+class AlertRecord(SlotRecord):
+    __slots__ = tuple(ALERT_FIELDS)
+
+
+class JamRecord(SlotRecord):
+    __slots__ = tuple(JAM_FIELDS)
+
+
+class CompactRecords(dict):
+    """
+    Record dictionary (key -> record) that stores every assigned plain record as `record_class`.
+    """
+
+    def __init__(self, record_class):
+        super().__init__()
+        self.record_class = record_class
+
+    def __setitem__(self, key, record):
+        # records with other fields (e.g. from an older checkpoint) stay plain dictionaries
+        if type(record) is dict and len(record) == len(self.record_class.__slots__) \
+                and all(field in record for field in self.record_class.__slots__):
+            record = self.record_class(record)
+        super().__setitem__(key, record)
+
+    def __reduce__(self):
+        return _restore_records, (self.record_class, list(self.items()))
+
+
+def _restore_records(record_class, items):
+    records = CompactRecords(record_class)
+    for key, record in items:
+        records[key] = record
+    return records
+
+
+def compact_store():
+    """
+    @return: empty store with compact alert and jam records
+    """
+    return {"alerts": CompactRecords(AlertRecord), "jams": CompactRecords(JamRecord)}
+
+
+def plain_records(records):
+    """
+    @param records: iterable of plain or compact records
+    @return: list of plain record dictionaries
+    """
+    return [record.to_dict() if isinstance(record, SlotRecord) else record for record in records]
@@ -1,13 +1,26 @@
 import os
+import gzip
 import json
+import argparse
 import pandas as pd
 import re
 import logging
 from datetime import datetime, timedelta
 
+from aggregate_state import apply_alert, apply_jam, apply_snapshot_to_store, aggregate_by_day, DeltaAggregator, \
+    INTERNAL_FIELDS
+from columnar_jams import ColumnarJams
+from compact_store import compact_store, plain_records
+from snapshot_reader import iter_snapshots, DEFAULT_PREFETCH
+
 # === Constants ===
 DATA_DIR = "data_JMK"
+ARCHIVE_KEY = "JMK"
 OUTPUT_DIR = "outputs_full"
+OUTPUT_CITY = "Brno"
+OUTPUT_FORMATS = ["json", "parquet"]
+CHECKPOINT_FILE = os.path.join(OUTPUT_DIR, "aggregator_checkpoint.json.gz")
+CHECKPOINT_VERSION = 2
 FILENAME_PATTERN = re.compile(r"data_JMK_(\d{4}-\d{2}-\d{2})_(\d{2})-(\d{2})-(\d{2})")
 
 # Configure logging
@@ -23,6 +36,8 @@ logging.basicConfig(
 
 # In-memory store
 data_store = {"alerts": {}, "jams": {}}
+# Jam metrics kept in NumPy columns (--columnar), None = per-dict updates
+columnar_jams = None
 
 
 def extract_timestamp_from_filename(filename):
@@ -57,82 +72,7 @@ def update_alert(alert, file_timestamp_millis):
     @param alert: alert data from the current file
     @param file_timestamp_millis: timestamp in milliseconds from file name
     """
-    uuid = alert["uuid"]
-    existing = data_store["alerts"].get(uuid)
-
-    if existing:
-        for field in ["country", "city", "type", "subtype", "street", "reportDescription"]:
-            new_val = alert.get(field, "")
-            old_val = existing.get(field, "")
-            if new_val != old_val:
-                logging.info(f"ALERT uuid={uuid} field={field}: {old_val} -> {new_val}")
-            existing[field] = new_val
-
-        for field in ["reportRating", "confidence", "reliability"]:
-            new_val = alert.get(field, -1)
-            if new_val > existing.get(field, -1):
-                logging.info(f"ALERT uuid={uuid} field={field}: {existing[field]} -> {new_val}")
-                existing[field] = new_val
-
-        for field in ["roadType", "magvar"]:
-            new_val = alert.get(field, -1)
-            if new_val != existing.get(field, -1):
-                logging.info(f"ALERT uuid={uuid} field={field}: {existing[field]} -> {new_val}")
-            existing[field] = new_val
-
-        new_loc = alert.get("location")
-        if new_loc != existing.get("location"):
-            logging.info(f"ALERT uuid={uuid} location updated")
-            existing["location"] = new_loc
-
-        existing["lastupdated"] = file_timestamp_millis
-        existing["finished"] = False
-    else:
-        logging.info(f"ALERT uuid={uuid} added as new")
-        data_store["alerts"][uuid] = {
-            "uuid": uuid,
-            "country": alert.get("country", ""),
-            "city": alert.get("city", ""),
-            "reportRating": alert.get("reportRating", -1),
-            "reportByMunicipalityUser": alert.get("reportByMunicipalityUser", ""),
-            "confidence": alert.get("confidence", -1),
-            "reliability": alert.get("reliability", -1),
-            "type": alert.get("type", ""),
-            "subtype": alert.get("subtype", ""),
-            "roadType": alert.get("roadType", -1),
-            "magvar": alert.get("magvar", -1),
-            "street": alert.get("street", ""),
-            "reportDescription": alert.get("reportDescription", ""),
-            "location": alert.get("location", None),
-            "pubMillis": alert.get("pubMillis", file_timestamp_millis),
-            "lastupdated": alert.get("pubMillis", file_timestamp_millis),
-            ""
-            "": False
-        }
-
-
-def update_jam_metrics(existing, jam, uc):
-    """
-    Updates metric fields in a jam (max, min, avg calculations).
-
-    @param existing: existing jam record
-    @param jam: new jam data
-    @param uc: update count
-    """
-    def update(field, kind):
-        value = jam.get(field, -1)
-        if kind == "max":
-            existing[f"{field}_max"] = max(existing.get(f"{field}_max", -1), value)
-        elif kind == "min":
-            existing[f"{field}_min"] = min(existing.get(f"{field}_min", float("inf")), value)
-        existing[f"{field}_sum"] = existing.get(f"{field}_sum", 0) + value
-        existing[f"{field}_avg"] = existing[f"{field}_sum"] / uc
-
-    update("level", "max")
-    update("speedKMH", "min")
-    update("length", "max")
-    update("speed", "max")
-    update("delay", "max")
+    apply_alert(data_store["alerts"], alert, file_timestamp_millis)
 
 
 def update_jam(jam, file_timestamp_millis):
@@ -142,71 +82,7 @@ def update_jam(jam, file_timestamp_millis):
     @param jam: jam data from the current file
     @param file_timestamp_millis: timestamp in milliseconds from file name
     """
-    jam_id = jam["id"]
-    existing = data_store["jams"].get(jam_id)
-
-    if existing:
-        existing["updateCount"] += 1
-        uc = existing["updateCount"]
-
-        for field in ["street", "blockingAlertUuid", "roadType", "startNode", "endNode"]:
-            new_val = jam.get(field, "")
-            if new_val != existing.get(field, ""):
-                logging.info(f"JAM id={jam_id} field={field}: {existing[field]} -> {new_val}")
-            existing[field] = new_val
-
-        if len(jam.get("line", [])) > len(existing.get("line", [])):
-            logging.info(f"JAM id={jam_id} line updated: longer line")
-            existing["line"] = jam.get("line", [])
-
-        new_segments = jam.get("segments", [])
-        old_segments = existing.get("segments", [])
-        old_ids = {s.get("ID") for s in old_segments}
-        added = [s for s in new_segments if s.get("ID") not in old_ids]
-        if added:
-            logging.info(f"JAM id={jam_id} added {len(added)} new segments")
-            old_segments.extend(added)
-        existing["segments"] = old_segments
-
-        update_jam_metrics(existing, jam, uc)
-
-        existing["lastupdated"] = file_timestamp_millis
-        existing["finished"] = False
-    else:
-        logging.info(f"JAM id={jam_id} added as new")
-        data_store["jams"][jam_id] = {
-            "id": jam_id,
-            "uuid": jam.get("uuid", ""),
-            "country": jam.get("country", ""),
-            "city": jam.get("city", ""),
-            "turnType": jam.get("turnType", ""),
-            "street": jam.get("street", ""),
-            "blockingAlertUuid": jam.get("blockingAlertUuid", ""),
-            "roadType": jam.get("roadType", ""),
-            "startNode": jam.get("startNode", ""),
-            "endNode": jam.get("endNode", ""),
-            "line": jam.get("line", []),
-            "segments": jam.get("segments", []),
-            "updateCount": 1,
-            "pubMillis": jam.get("pubMillis", file_timestamp_millis),
-            "lastupdated": jam.get("pubMillis", file_timestamp_millis),
-            "finished": False,
-            "level_max": jam.get("level", -1),
-            "level_sum": jam.get("level", -1),
-            "level_avg": jam.get("level", -1),
-            "speedKMH_min": jam.get("speedKMH", -1),
-            "speedKMH_sum": jam.get("speedKMH", -1),
-            "speedKMH_avg": jam.get("speedKMH", -1),
-            "length_max": jam.get("length", -1),
-            "length_sum": jam.get("length", -1),
-            "length_avg": jam.get("length", -1),
-            "speed_max": jam.get("speed", -1),
-            "speed_sum": jam.get("speed", -1),
-            "speed_avg": jam.get("speed", -1),
-            "delay_max": jam.get("delay", -1),
-            "delay_sum": jam.get("delay", -1),
-            "delay_avg": jam.get("delay", -1)
-        }
+    apply_jam(data_store["jams"], jam, file_timestamp_millis)
 
 
 def process_file(filepath):
@@ -220,13 +96,22 @@ def process_file(filepath):
         return
 
     file_timestamp_millis = int(timestamp.timestamp() * 1000)
-    data = load_json_file(filepath)
+    apply_snapshot(load_json_file(filepath), file_timestamp_millis)
 
-    for alert in data.get("alerts", []):
-        update_alert(alert, file_timestamp_millis)
 
-    for jam in data.get("jams", []):
-        update_jam(jam, file_timestamp_millis)
+def apply_snapshot(data, file_timestamp_millis):
+    """
+    Applies one decoded snapshot to the in-memory store. Snapshots must be applied in time order.
+
+    @param data: parsed snapshot dictionary
+    @param file_timestamp_millis: timestamp in milliseconds from file name
+    """
+    if columnar_jams is None:
+        apply_snapshot_to_store(data_store, data, file_timestamp_millis)
+        return
+    for alert in data.get("alerts", []):
+        apply_alert(data_store["alerts"], alert, file_timestamp_millis)
+    columnar_jams.apply_snapshot(data.get("jams", []), file_timestamp_millis)
 
 
 def handle_missing_files(file_timestamps):
@@ -248,37 +133,211 @@ def handle_missing_files(file_timestamps):
                     jam["lastupdated"] = last_ts_millis
 
 
-def save_data():
+def save_data(output_format="json"):
     """
-    Saves alerts and jams filtered by city to JSON output files.
+    Saves alerts and jams filtered by city to JSON (or Parquet) output files.
+
+    @param output_format: "json" (alerts_full.json / jams_full.json) or "parquet" (typed columnar files)
     """
-    alerts_df = pd.DataFrame(data_store["alerts"].values())
-    jams_df = pd.DataFrame(data_store["jams"].values())
+    if output_format == "parquet":
+        # pyarrow is only needed for this output
+        from columnar_output import save_parquet
+        save_parquet(data_store, OUTPUT_DIR, city=OUTPUT_CITY)
+        return
+
+    alerts_df = pd.DataFrame(plain_records(data_store["alerts"].values()))
+    jams_df = pd.DataFrame(plain_records(data_store["jams"].values()))
 
-    alerts_df = alerts_df[alerts_df["city"] == "Brno"]
-    jams_df = jams_df[jams_df["city"] == "Brno"]
+    alerts_df = alerts_df[alerts_df["city"] == OUTPUT_CITY]
+    jams_df = jams_df[jams_df["city"] == OUTPUT_CITY]
+
+    alerts_df = alerts_df.drop(columns=[c for c in INTERNAL_FIELDS if c in alerts_df.columns])
+    jams_df = jams_df.drop(columns=[c for c in INTERNAL_FIELDS if c in jams_df.columns])
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     alerts_df.to_json(os.path.join(OUTPUT_DIR, "alerts_full.json"), orient="records", indent=4)
     jams_df.to_json(os.path.join(OUTPUT_DIR, "jams_full.json"), orient="records", indent=4)
 
 
-def main():
+def save_checkpoint(checkpoint_path, last_timestamp):
     """
-    Main script execution. Processes files, handles gaps and saves output.
+    Saves the aggregator state (alerts, jams, last processed file timestamp) to a gzip JSON checkpoint.
+
+    @param checkpoint_path: path to the checkpoint file
+    @param last_timestamp: timestamp of the last processed file (datetime)
     """
-    timestamps = []
+    state = {
+        "version": CHECKPOINT_VERSION,
+        "last_timestamp": last_timestamp.isoformat() if last_timestamp else None,
+        "alerts": plain_records(data_store["alerts"].values()),
+        "jams": plain_records(data_store["jams"].values()),
+    }
+    os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+    tmp_path = checkpoint_path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=5) as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp_path, checkpoint_path)
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Restores the aggregator state from a checkpoint into data_store.
+
+    @param checkpoint_path: path to the checkpoint file
+    @return: timestamp of the last processed file (datetime) or None if there is no checkpoint
+    """
+    if not os.path.exists(checkpoint_path):
+        logging.info(f"No checkpoint at {checkpoint_path}, starting from scratch")
+        return None
+
+    with gzip.open(checkpoint_path, "rt", encoding="utf-8") as f:
+        state = json.load(f)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {state.get('version')} in {checkpoint_path}")
+
+    # filled in place, so a compact store stays compact
+    for alert in state["alerts"]:
+        data_store["alerts"][alert["uuid"]] = alert
+    for jam in state["jams"]:
+        data_store["jams"][jam["id"]] = jam
+    last_timestamp = state["last_timestamp"]
+    logging.info(f"Checkpoint loaded: {len(data_store['alerts'])} alerts, {len(data_store['jams'])} jams, "
+                 f"last file {last_timestamp}")
+    return datetime.fromisoformat(last_timestamp) if last_timestamp else None
+
+
+def list_snapshot_files(after=None):
+    """
+    Lists snapshot files in DATA_DIR in timestamp order.
+
+    @param after: only files with timestamp strictly after this datetime are returned
+    @return: list of (timestamp, full path) tuples
+    """
+    files = []
     for filename in sorted(os.listdir(DATA_DIR)):
         if filename.endswith(".json") and FILENAME_PATTERN.match(filename):
-            fullpath = os.path.join(DATA_DIR, filename)
             ts = extract_timestamp_from_filename(filename)
-            if ts:
+            if ts and (after is None or ts > after):
+                files.append((ts, os.path.join(DATA_DIR, filename)))
+    return files
+
+
+def list_archive_files(archive_dir, after=None):
+    """
+    Lists snapshots of ARCHIVE_KEY stored in a compressed archive (see snapshot_archive.py).
+
+    @param archive_dir: root directory of the archive
+    @param after: only snapshots with timestamp strictly after this datetime are returned
+    @return: list of (timestamp, archive entry) tuples
+    """
+    # the archive module lives in the project root (must be on PYTHONPATH)
+    from snapshot_archive import list_archive_snapshots
+    return [(ts, entry) for ts, entry in list_archive_snapshots(archive_dir, ARCHIVE_KEY, start=after)
+            if after is None or ts > after]
+
+
+def replay_delta_archive(archive_dir, after=None):
+    """
+    Applies snapshots of ARCHIVE_KEY from a delta archive (see snapshot_delta.py) to the store.
+
+    @param archive_dir: root directory of the delta archive
+    @param after: only snapshots with timestamp strictly after this datetime are applied
+    @return: list of timestamps of the applied snapshots
+    """
+    # the delta module lives in the project root (must be on PYTHONPATH)
+    from snapshot_delta import read_frames_after, KEYFRAME
+    base, frames = read_frames_after(archive_dir, ARCHIVE_KEY, after)
+    aggregator = DeltaAggregator(data_store, base)
+
+    timestamps = []
+    for ts, kind, frame in frames:
+        file_timestamp_millis = int(ts.timestamp() * 1000)
+        if kind == KEYFRAME:
+            aggregator.apply_keyframe(frame["data"], file_timestamp_millis)
+        else:
+            aggregator.apply_delta(frame, file_timestamp_millis)
+        timestamps.append(ts)
+    aggregator.flush()
+    return timestamps
+
+
+def main(incremental=False, checkpoint_path=CHECKPOINT_FILE, workers=1, prefetch=DEFAULT_PREFETCH,
+         map_reduce=False, output_format="json", archive_dir=None, delta_archive_dir=None, columnar=False,
+         compact=False):
+    """
+    Main script execution. Processes files, handles gaps and saves output.
+
+    @param incremental: resume from the checkpoint and process only files newer than it
+    @param checkpoint_path: path to the checkpoint file used in incremental mode
+    @param workers: number of worker processes
+    @param prefetch: maximum number of decoded snapshots waiting to be applied
+    @param map_reduce: aggregate each day in its own process and merge the partial results
+    @param output_format: "json" or "parquet"
+    @param archive_dir: read snapshots from this compressed archive instead of DATA_DIR
+    @param delta_archive_dir: replay this delta archive instead of DATA_DIR (sequential only)
+    @param columnar: keep jam metrics in NumPy columns (sequential only, the same output)
+    @param compact: keep the records as compact __slots__ objects (less memory, the same output)
+    """
+    global columnar_jams
+    if columnar and (map_reduce or delta_archive_dir):
+        raise ValueError("--columnar works only with the sequential run")
+    if compact:
+        data_store.update(compact_store())
+    last_timestamp = load_checkpoint(checkpoint_path) if incremental else None
+    if columnar:
+        columnar_jams = ColumnarJams(data_store["jams"])
+
+    # the last already processed file is kept so a gap across two runs is detected too
+    timestamps = [last_timestamp] if last_timestamp else []
+    if delta_archive_dir:
+        timestamps.extend(replay_delta_archive(delta_archive_dir, after=last_timestamp))
+    else:
+        if archive_dir:
+            files = list_archive_files(archive_dir, after=last_timestamp)
+        else:
+            files = list_snapshot_files(after=last_timestamp)
+        if map_reduce:
+            aggregate_by_day(data_store, files, workers=workers)
+            timestamps.extend(ts for ts, _ in files)
+        else:
+            for ts, data in iter_snapshots(files, workers=workers, prefetch=prefetch):
                 timestamps.append(ts)
-                process_file(fullpath)
+                apply_snapshot(data, int(ts.timestamp() * 1000))
 
+    if columnar_jams is not None:
+        columnar_jams.materialize()
+    logging.info(f"Processed {len(timestamps) - (1 if last_timestamp else 0)} new files")
     handle_missing_files(timestamps)
-    save_data()
+    save_data(output_format)
+
+    if incremental and timestamps:
+        save_checkpoint(checkpoint_path, max(timestamps))
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Aggregates Waze snapshots into alerts_full.json / jams_full.json")
+    parser.add_argument("--incremental", action="store_true",
+                        help="resume from the checkpoint and apply only files that arrived since the last run")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="path to the checkpoint file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes decoding snapshot files in parallel")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH,
+                        help="maximum number of decoded snapshots waiting to be applied")
+    parser.add_argument("--map-reduce", action="store_true",
+                        help="aggregate each day in parallel (--workers processes) and merge the results")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="json",
+                        help="output format, parquet requires pyarrow")
+    parser.add_argument("--archive", metavar="DIR",
+                        help="read snapshots from a compressed archive created by downloader.py --archive")
+    parser.add_argument("--delta-archive", metavar="DIR",
+                        help="replay a delta archive created by downloader.py --delta (only changes are applied)")
+    parser.add_argument("--columnar", action="store_true",
+                        help="update jam metrics as NumPy array operations (same output, faster)")
+    parser.add_argument("--compact", action="store_true",
+                        help="keep records as compact objects with packed lines/segments (less memory, same output)")
+    args = parser.parse_args()
+
+    main(incremental=args.incremental, checkpoint_path=args.checkpoint,
+         workers=args.workers, prefetch=args.prefetch, map_reduce=args.map_reduce,
+         output_format=args.format, archive_dir=args.archive, delta_archive_dir=args.delta_archive,
+         columnar=args.columnar, compact=args.compact)
@@ -0,0 +1,60 @@
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+# How many decoded snapshots may wait for the consumer at once (caps memory use)
+DEFAULT_PREFETCH = 8
+
+
+def read_snapshot(source):
+    """
+    Loads one Waze snapshot and keeps only the parts the aggregator uses.
+
+    Runs in a worker process, so it must not depend on the aggregator's global state.
+
+    @param source: full path to the snapshot JSON file or an archive entry
+                   (container path, offset, length) from snapshot_archive.list_archive_snapshots
+    @return: dictionary with "alerts" and "jams" lists
+    """
+    if isinstance(source, tuple):
+        # the archive module lives in the project root (must be on PYTHONPATH)
+        from snapshot_archive import read_archived_snapshot
+        data = read_archived_snapshot(source)
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    return {
+        "alerts": [alert for alert in data.get("alerts", []) if "uuid" in alert],
+        "jams": [jam for jam in data.get("jams", []) if "id" in jam],
+    }
+
+
+def iter_snapshots(files, workers=1, prefetch=DEFAULT_PREFETCH):
+    """
+    Decodes snapshots (in parallel if workers > 1) and yields them in the order of `files`.
+
+    At most `prefetch` snapshots are submitted ahead of the one being consumed, so the
+    memory use stays bounded no matter how long the archive is.
+
+    @param files: list of (timestamp, filepath or archive entry) tuples in processing order
+    @param workers: number of decoding processes, 1 decodes on the calling thread
+    @param prefetch: maximum number of snapshots decoded ahead of the consumer
+    @return: generator of (timestamp, snapshot data) tuples
+    """
+    if workers <= 1:
+        for ts, source in files:
+            yield ts, read_snapshot(source)
+        return
+
+    files = iter(files)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque(
+            (ts, executor.submit(read_snapshot, source)) for ts, source in islice(files, max(prefetch, 1))
+        )
+        while pending:
+            ts, future = pending.popleft()
+            data = future.result()
+            for next_ts, next_source in islice(files, 1):
+                pending.append((next_ts, executor.submit(read_snapshot, next_source)))
+            yield ts, data
@@ -0,0 +1,52 @@
+import io
+
+
+def copy_value(value):
+    """
+    Serializes one python value into a field of the PostgreSQL COPY text format.
+
+    @param value: value to serialize (None is written as NULL)
+    @return: escaped field string
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    text = str(value)
+    return (text.replace("\\", "\\\\")
+                .replace("\t", "\\t")
+                .replace("\n", "\\n")
+                .replace("\r", "\\r"))
+
+
+def rows_to_copy_buffer(rows):
+    """
+    Builds an in-memory COPY text buffer from an iterable of tuples.
+
+    @param rows: iterable of row tuples
+    @return: (StringIO positioned at start, number of rows written)
+    """
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write("\t".join(copy_value(v) for v in row))
+        buffer.write("\n")
+        count += 1
+    buffer.seek(0)
+    return buffer, count
+
+
+def copy_rows(cur, table, columns, rows):
+    """
+    Loads rows into a table with COPY FROM STDIN.
+
+    @param cur: psycopg2 cursor
+    @param table: target table name
+    @param columns: list of column names in row order
+    @param rows: iterable of row tuples
+    @return: number of rows sent
+    """
+    buffer, count = rows_to_copy_buffer(rows)
+    if count:
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    return count
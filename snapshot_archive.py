@@ -0,0 +1,180 @@
+"""
+Append-only, compressed archive of Waze snapshots.
+
+Every region (key) has one container per day: <archive_dir>/<key>/<YYYY-MM-DD>.jsonl.gz.
+Each snapshot is appended as its own gzip member holding one compact JSON line, so the whole
+file is still a valid gzip stream (`zcat` prints JSON lines). Next to it a small text index
+<YYYY-MM-DD>.idx stores "<timestamp>\t<offset>\t<length>" for every snapshot, which lets a reader
+seek to a time range and decompress only the snapshots it needs. An optional fourth index
+column marks the frame kind for delta encoded archives (see snapshot_delta.py).
+
+Converting an existing directory of downloaded files:
+    python snapshot_archive.py ./data_JMK/ ./archive/ JMK
+"""
+import gzip
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
+DATA_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx"
+FILENAME_TIMESTAMP = re.compile(r"(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})")
+
+
+def day_paths(archive_dir, key, day):
+    """
+    @return: (container path, index path) of one region and day
+    """
+    base = os.path.join(archive_dir, key, day.strftime("%Y-%m-%d"))
+    return base + DATA_SUFFIX, base + INDEX_SUFFIX
+
+
+def append_snapshot(archive_dir, key, timestamp, data, compresslevel=6, kind=None):
+    """
+    Appends one snapshot to the day container and records it in the index.
+
+    The container is written (and fsync-ed) before the index line, so an interrupted write leaves
+    only unreferenced bytes at the end of the container, never a broken index entry.
+
+    @param archive_dir: root directory of the archive
+    @param key: region key, e.g. "JMK"
+    @param timestamp: download time of the snapshot (datetime)
+    @param data: parsed snapshot dictionary
+    @param compresslevel: gzip compression level
+    @param kind: optional frame kind stored in the index (e.g. "k" keyframe / "d" delta)
+    @return: offset of the snapshot in the container
+    """
+    data_path, index_path = day_paths(archive_dir, key, timestamp)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    line = json.dumps(data, separators=(",", ":"), ensure_ascii=False) + "\n"
+    payload = gzip.compress(line.encode("utf-8"), compresslevel=compresslevel)
+
+    with open(data_path, "ab") as f:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+    with open(index_path, "a", encoding="utf-8") as f:
+        kind_column = f"\t{kind}" if kind else ""
+        f.write(f"{timestamp.strftime(TIMESTAMP_FORMAT)}\t{offset}\t{len(payload)}{kind_column}\n")
+    return offset
+
+
+def read_index(index_path):
+    """
+    Reads a day index.
+
+    @param index_path: path to the .idx file
+    @return: list of (timestamp, offset, length, kind) tuples (kind is None for plain snapshots),
+             a partially written last line is skipped
+    """
+    entries = []
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) not in (3, 4) or not line.endswith("\n"):
+                continue
+            kind = parts[3] if len(parts) == 4 else None
+            entries.append((datetime.strptime(parts[0], TIMESTAMP_FORMAT), int(parts[1]), int(parts[2]), kind))
+    return entries
+
+
+def list_archive_snapshots(archive_dir, key, start=None, end=None):
+    """
+    Lists archived snapshots of a region in a time range without touching the containers.
+
+    @param archive_dir: root directory of the archive
+    @param key: region key, e.g. "JMK"
+    @param start: first timestamp to include (datetime, inclusive)
+    @param end: last timestamp to include (datetime, inclusive)
+    @return: time ordered list of (timestamp, (container path, offset, length)) tuples
+    """
+    return [(ts, entry) for ts, _, entry in list_archive_frames(archive_dir, key, start, end)]
+
+
+def list_archive_frames(archive_dir, key, start=None, end=None):
+    """
+    Same as list_archive_snapshots, but also returns the frame kind from the index.
+
+    @return: time ordered list of (timestamp, kind, (container path, offset, length)) tuples
+    """
+    region_dir = os.path.join(archive_dir, key)
+    if not os.path.isdir(region_dir):
+        return []
+
+    frames = []
+    for filename in sorted(os.listdir(region_dir)):
+        if not filename.endswith(INDEX_SUFFIX):
+            continue
+        day = datetime.strptime(filename[:-len(INDEX_SUFFIX)], "%Y-%m-%d").date()
+        if (start and day < start.date()) or (end and day > end.date()):
+            continue
+
+        data_path = os.path.join(region_dir, filename[:-len(INDEX_SUFFIX)] + DATA_SUFFIX)
+        for ts, offset, length, kind in read_index(os.path.join(region_dir, filename)):
+            if (start and ts < start) or (end and ts > end):
+                continue
+            frames.append((ts, kind, (data_path, offset, length)))
+
+    frames.sort(key=lambda s: s[0])
+    return frames
+
+
+def read_archived_snapshot(entry):
+    """
+    Decompresses a single snapshot from a day container.
+
+    @param entry: (container path, offset, length) as returned by list_archive_snapshots
+    @return: parsed snapshot dictionary
+    """
+    data_path, offset, length = entry
+    with open(data_path, "rb") as f:
+        f.seek(offset)
+        payload = f.read(length)
+    return json.loads(gzip.decompress(payload).decode("utf-8"))
+
+
+def iter_archive(archive_dir, key, start=None, end=None):
+    """
+    Yields archived snapshots of a region in time order.
+
+    @return: generator of (timestamp, snapshot dictionary) tuples
+    """
+    for ts, entry in list_archive_snapshots(archive_dir, key, start, end):
+        yield ts, read_archived_snapshot(entry)
+
+
+def archive_directory(json_dir, archive_dir, key):
+    """
+    Appends all downloaded snapshot files of a directory to the archive (in timestamp order).
+
+    @param json_dir: directory with data_<key>_<timestamp>.json files
+    @param archive_dir: root directory of the archive
+    @param key: region key
+    @return: number of archived snapshots
+    """
+    archived = {ts for ts, _ in list_archive_snapshots(archive_dir, key)}
+    count = 0
+    for filename in sorted(os.listdir(json_dir)):
+        match = FILENAME_TIMESTAMP.search(filename)
+        if not filename.endswith(".json") or not match:
+            continue
+        ts = datetime.strptime(match.group(1), TIMESTAMP_FORMAT)
+        if ts in archived:
+            continue
+        with open(os.path.join(json_dir, filename), "r", encoding="utf-8") as f:
+            append_snapshot(archive_dir, key, ts, json.load(f))
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Usage: python snapshot_archive.py <json_dir> <archive_dir> <key>")
+        sys.exit(1)
+    print(f"{archive_directory(sys.argv[1], sys.argv[2], sys.argv[3])} snapshotov archivovaných")
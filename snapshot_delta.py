@@ -0,0 +1,223 @@
+"""
+Delta encoding of consecutive Waze snapshots on top of the snapshot archive (snapshot_archive.py).
+
+A region's delta archive holds a keyframe (full snapshot) now and then and, for every other
+snapshot, only the alerts/jams that were added, changed or removed since the previous one
+(alerts keyed by `uuid`, jams by `id`). Every day container starts with a keyframe, so a day
+can be read without the previous one.
+
+Replaying a delta archive reconstructs the same records for every snapshot. The order of
+records inside a snapshot is not kept (records present before come first, added ones after)
+and duplicated keys within one snapshot collapse into one record. Records without the key field
+(which the aggregator ignores too) survive only in keyframes.
+
+Converting a directory of downloaded files:
+    python snapshot_delta.py ./data_JMK/ ./archive_delta/ JMK
+"""
+import json
+import os
+import sys
+from datetime import datetime
+
+from snapshot_archive import append_snapshot, list_archive_frames, read_archived_snapshot, \
+    FILENAME_TIMESTAMP, TIMESTAMP_FORMAT
+
+# One keyframe per hour with 2-minute snapshots
+KEYFRAME_INTERVAL = 30
+
+KEYFRAME = "k"
+DELTA = "d"
+
+# Record lists in a snapshot and the field identifying a record
+RECORD_KEYS = [("alerts", "uuid"), ("jams", "id")]
+
+
+def diff_records(old_records, new_records, key):
+    """
+    @param old_records: dictionary key -> record of the previous snapshot
+    @param new_records: list of records of the current snapshot
+    @param key: field identifying a record
+    @return: {"added": [...], "changed": [...], "removed": [keys]}
+    """
+    added, changed, seen = [], [], set()
+    for record in new_records:
+        record_key = record.get(key)
+        if record_key is None:
+            continue
+        seen.add(record_key)
+        old = old_records.get(record_key)
+        if old is None:
+            added.append(record)
+        elif old != record:
+            changed.append(record)
+    removed = [record_key for record_key in old_records if record_key not in seen]
+    return {"added": added, "changed": changed, "removed": removed}
+
+
+def diff_snapshots(previous, current):
+    """
+    Encodes `current` as a delta against `previous`.
+
+    @param previous: previous snapshot dictionary
+    @param current: current snapshot dictionary
+    @return: delta dictionary
+    """
+    delta = {"meta": {k: v for k, v in current.items() if k not in ("alerts", "jams")}}
+    for records, key in RECORD_KEYS:
+        old_records = {record[key]: record for record in previous.get(records, []) if key in record}
+        delta[records] = diff_records(old_records, current.get(records, []), key)
+    return delta
+
+
+def apply_delta(previous, delta):
+    """
+    Reconstructs a snapshot from the previous one and a delta.
+
+    @param previous: previous snapshot dictionary
+    @param delta: delta produced by diff_snapshots
+    @return: reconstructed snapshot dictionary
+    """
+    snapshot = dict(delta["meta"])
+    for records, key in RECORD_KEYS:
+        changes = delta[records]
+        changed = {record[key]: record for record in changes["changed"]}
+        removed = set(changes["removed"])
+        snapshot[records] = [changed.get(record[key], record) for record in previous.get(records, [])
+                             if key in record and record[key] not in removed]
+        snapshot[records].extend(changes["added"])
+    return snapshot
+
+
+class DeltaArchiveWriter:
+    """
+    Appends snapshots of one region to a delta archive.
+
+    A keyframe is written for the first snapshot of the writer, of every day and after
+    KEYFRAME_INTERVAL deltas, all other snapshots are stored as deltas.
+    """
+
+    def __init__(self, archive_dir, key, keyframe_interval=KEYFRAME_INTERVAL):
+        self.archive_dir = archive_dir
+        self.key = key
+        self.keyframe_interval = keyframe_interval
+        self.previous = None
+        self.previous_day = None
+        self.since_keyframe = 0
+
+    def append(self, timestamp, snapshot):
+        """
+        @param timestamp: download time of the snapshot (datetime)
+        @param snapshot: parsed snapshot dictionary
+        @return: frame kind written (KEYFRAME or DELTA)
+        """
+        if (self.previous is None or timestamp.date() != self.previous_day
+                or self.since_keyframe >= self.keyframe_interval):
+            append_snapshot(self.archive_dir, self.key, timestamp, {"data": snapshot}, kind=KEYFRAME)
+            kind = KEYFRAME
+            self.since_keyframe = 0
+        else:
+            append_snapshot(self.archive_dir, self.key, timestamp, diff_snapshots(self.previous, snapshot),
+                            kind=DELTA)
+            kind = DELTA
+            self.since_keyframe += 1
+
+        self.previous = snapshot
+        self.previous_day = timestamp.date()
+        return kind
+
+
+def _frames_from_keyframe(archive_dir, key, start, end):
+    """
+    Lists frames in [start, end], extended back to the last keyframe at or before `start`.
+    """
+    if start is None:
+        return list_archive_frames(archive_dir, key, None, end)
+
+    day_start = datetime.combine(start.date(), datetime.min.time())
+    frames = list_archive_frames(archive_dir, key, day_start, end)
+    first = 0
+    for i, (ts, kind, _) in enumerate(frames):
+        if ts > start:
+            break
+        if kind == KEYFRAME:
+            first = i
+    return frames[first:]
+
+
+def iter_frames(archive_dir, key, start=None, end=None):
+    """
+    Yields decoded frames starting at the keyframe needed to reconstruct `start`.
+
+    @return: generator of (timestamp, kind, frame dictionary) tuples
+    """
+    for ts, kind, entry in _frames_from_keyframe(archive_dir, key, start, end):
+        yield ts, kind, read_archived_snapshot(entry)
+
+
+def iter_delta_archive(archive_dir, key, start=None, end=None):
+    """
+    Replays a delta archive and yields full snapshots in [start, end].
+
+    @return: generator of (timestamp, snapshot dictionary) tuples
+    """
+    snapshot = None
+    for ts, kind, frame in iter_frames(archive_dir, key, start, end):
+        if kind == KEYFRAME:
+            snapshot = frame["data"]
+        elif snapshot is None:
+            raise ValueError(f"Delta frame {ts} in {archive_dir}/{key} without a preceding keyframe")
+        else:
+            snapshot = apply_delta(snapshot, frame)
+        if start is None or ts >= start:
+            yield ts, snapshot
+
+
+def read_frames_after(archive_dir, key, after=None):
+    """
+    Splits a delta archive at `after` for consumers that continue from a known point.
+
+    @param after: timestamp of the last already consumed snapshot (None = from the beginning)
+    @return: (snapshot at `after` or None, generator of (timestamp, kind, frame) with timestamp > after)
+    """
+    frames = iter_frames(archive_dir, key, after)
+    base = None
+    pending = None
+    for ts, kind, frame in frames:
+        if after is not None and ts <= after:
+            base = frame["data"] if kind == KEYFRAME else apply_delta(base, frame)
+            continue
+        pending = (ts, kind, frame)
+        break
+
+    def remaining():
+        if pending is not None:
+            yield pending
+            yield from frames
+
+    return base, remaining()
+
+
+def delta_archive_directory(json_dir, archive_dir, key, keyframe_interval=KEYFRAME_INTERVAL):
+    """
+    Writes all downloaded snapshot files of a directory to a new delta archive.
+
+    @return: (number of keyframes, number of deltas)
+    """
+    writer = DeltaArchiveWriter(archive_dir, key, keyframe_interval)
+    counts = {KEYFRAME: 0, DELTA: 0}
+    for filename in sorted(os.listdir(json_dir)):
+        match = FILENAME_TIMESTAMP.search(filename)
+        if not filename.endswith(".json") or not match:
+            continue
+        with open(os.path.join(json_dir, filename), "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        counts[writer.append(datetime.strptime(match.group(1), TIMESTAMP_FORMAT), snapshot)] += 1
+    return counts[KEYFRAME], counts[DELTA]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("Usage: python snapshot_delta.py <json_dir> <archive_dir> <key>")
+        sys.exit(1)
+    keyframes, deltas = delta_archive_directory(sys.argv[1], sys.argv[2], sys.argv[3])
+    print(f"{keyframes} keyframe, {deltas} delta snapshotov archivovaných")